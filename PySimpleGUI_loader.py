@@ -1,17 +1,41 @@
 # pylint: disable=E1101  # Module 'PySimpleGUIQt' has no 'XXXX' member (no-member)
 # pylint: disable=C0103 #  Module name "PySimpleGUIXX_loader" doesn't conform to snake_case naming style (invalid-name)
 
-""" Load specific version of PySimpleGUI. """
+""" Load specific version of PySimpleGUI.
+The library (and Qt with it) is only imported the first time `sg` is used so
+processes that never display a GUI don't pay the cost of loading it. """
 
+from typing import Any, Optional
 import sys
 import os
-BASEDIR = os.path.dirname(os.path.abspath(sys.modules['__main__'].__file__))
-sys.path.insert(0, os.path.join(BASEDIR, "PySimpleGUI/PySimpleGUIQt/"))
-
-# pylint: disable=C0413 #  Import "import PySimpleGUIQt as sg" should be placed at the top of the module (wrong-import-position)
-import PySimpleGUIQt as sg
-#import PySimpleGUI as sg
-if hasattr(sg, "__version__"):
-    print("%s version: %s" % (sg.__name__, sg.__version__))
-elif hasattr(sg, "version"):
-    print("%s version: %s" % (sg.__name__, sg.version))
+from types import ModuleType
+
+
+def _load() -> ModuleType:
+    """ Import the PySimpleGUI library. """
+    basedir = os.path.dirname(os.path.abspath(sys.modules['__main__'].__file__))
+    sys.path.insert(0, os.path.join(basedir, "PySimpleGUI/PySimpleGUIQt/"))
+
+    # pylint: disable=C0415 #  Import outside toplevel (import-outside-toplevel)
+    import PySimpleGUIQt as module
+    #import PySimpleGUI as module
+    if hasattr(module, "__version__"):
+        print("%s version: %s" % (module.__name__, module.__version__))
+    elif hasattr(module, "version"):
+        print("%s version: %s" % (module.__name__, module.version))
+    return module
+
+
+class _LazyModule:
+    """ Stands in for the PySimpleGUI module until something is accessed on it. """
+
+    def __init__(self) -> None:
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._module is None:
+            self._module = _load()
+        return getattr(self._module, name)
+
+
+sg: Any = _LazyModule()
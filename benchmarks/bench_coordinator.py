@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+""" Throughput of a headless Coordinator.
+Builds a Coordinator with a configurable number of fake components alongside
+real JogWidget, CoreGcode and DebugController instances then times whole ticks
+of the main loop.
+Reports ticks/s, events/s, time per tick spent in each phase and memory
+allocated while ticking. Results are printed as JSON and can be compared
+against a previously saved baseline.
+
+Usage:
+    python3 bench_coordinator.py [-scenario NAME ...] [-components N]
+        [-subscriptions N] [-events N] [-ticks N] [-output FILE]
+        [-baseline FILE] [-tolerance FRACTION]
+
+Exits with status 1 if any scenario's ticks/s is more than FRACTION below the
+baseline.
+"""
+
+#pylint: disable=protected-access
+
+from typing import Any, Dict, Tuple
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import loader  # pylint: disable=E0401,W0611
+from core.coordinator import Coordinator
+from core.instrumentation import Instrumentation
+from controllers.debug import DebugController
+from controllers.mock_controller import MockController
+from interfaces.jog import JogWidget
+from bench_event_dispatch import FakeComponent, BenchCoordinator
+
+SRCDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# {name: (fake components, subscriptions per component, events per tick)}
+SCENARIOS: Dict[str, Tuple[int, int, int]] = {
+    "idle": (50, 4, 0),
+    "typical": (50, 4, 50),
+    "busy": (300, 4, 3000),
+    }
+
+WARMUP_TICKS = 10
+
+
+def build(component_count: int, subscription_count: int) -> Coordinator:
+    """ Coordinator with `component_count` fake components each subscribed to
+    `subscription_count` of `component_count` distinct events plus the real
+    components. """
+    components: list = [
+        FakeComponent("fake%s" % index,
+                      ["fake%s:event" % ((index + offset) % component_count)
+                       for offset in range(subscription_count)])
+        for index in range(component_count)]
+    components.append(JogWidget())
+    coordinator = BenchCoordinator([], components, [DebugController, MockController])
+    coordinator.activate_controller(label="debug")
+    return coordinator
+
+
+def tick(coordinator: Coordinator, component_count: int, event_count: int) -> None:
+    """ Publish a tick's worth of events then run the main loop once. """
+    for index in range(event_count):
+        coordinator.publish("fake%s:event" % (index % component_count), index)
+    # Machine position updates as a connected controller would send them.
+    for axis in "xyz":
+        coordinator.publish("debug:machine_pos:%s" % axis, 1.0, coalesce=True)
+    coordinator.update_components()
+
+
+def run_scenario(component_count: int,
+                 subscription_count: int,
+                 event_count: int,
+                 ticks: int) -> Dict[str, Any]:
+    """ Time one scenario. """
+    component_count = max(component_count, 1)
+    coordinator = build(component_count, subscription_count)
+    for _ in range(WARMUP_TICKS):
+        tick(coordinator, component_count, event_count)
+
+    # Throughput with no instrumentation overhead.
+    start = time.perf_counter()
+    for _ in range(ticks):
+        tick(coordinator, component_count, event_count)
+    elapsed = time.perf_counter() - start
+
+    # Where the time goes.
+    instrumentation = Instrumentation()
+    coordinator.instrumentation = instrumentation
+    for _ in range(ticks):
+        tick(coordinator, component_count, event_count)
+    coordinator.instrumentation = None
+    phases: Dict[str, float] = {}
+    for (_, phase), stats in instrumentation.phases.items():
+        phases[phase] = phases.get(phase, 0.0) + stats.total
+    phases = {phase: round(1000000 * total / ticks, 3) for phase, total in sorted(phases.items())}
+
+    # Memory allocated while ticking.
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    peak = 0
+    for _ in range(ticks):
+        tracemalloc.reset_peak()
+        tick_start, _ = tracemalloc.get_traced_memory()
+        tick(coordinator, component_count, event_count)
+        _, tick_peak = tracemalloc.get_traced_memory()
+        peak = max(peak, tick_peak - tick_start)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    coordinator.close()
+
+    return {
+        "components": component_count,
+        "subscriptions": subscription_count,
+        "events_per_tick": event_count,
+        "ticks": ticks,
+        "ticks_per_sec": round(ticks / elapsed, 1),
+        "events_per_sec": round((event_count + 3) * ticks / elapsed, 1),
+        "phases_us_per_tick": phases,
+        "alloc_peak_kb_per_tick": round(peak / 1024, 1),
+        "retained_kb": round((after - before) / 1024, 1),
+        }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """ Print the change in ticks/s against the baseline.
+    Returns:
+        True if no scenario regressed by more than `tolerance`. """
+    passed = True
+    for name, result in results["scenarios"].items():
+        if name not in baseline.get("scenarios", {}):
+            print("%-10s no baseline" % name, file=sys.stderr)
+            continue
+        expected = baseline["scenarios"][name]["ticks_per_sec"]
+        change = result["ticks_per_sec"] / expected - 1
+        regressed = change < -tolerance
+        passed = passed and not regressed
+        print("%-10s %10.1f ticks/s  baseline %10.1f  %+6.1f%%%s" %
+              (name, result["ticks_per_sec"], expected, 100 * change,
+               "  REGRESSION" if regressed else ""),
+              file=sys.stderr)
+    return passed
+
+
+def main() -> None:
+    """ Run the requested scenarios. """
+    parser = argparse.ArgumentParser(description="Coordinator throughput benchmark.")
+    parser.add_argument("-scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run. May be repeated. Default: all.")
+    parser.add_argument("-components", type=int,
+                        help="Run a custom scenario with this many fake components.")
+    parser.add_argument("-subscriptions", type=int, default=4,
+                        help="Subscriptions per fake component in a custom scenario.")
+    parser.add_argument("-events", type=int, default=50,
+                        help="Events published per tick in a custom scenario.")
+    parser.add_argument("-ticks", type=int, default=200,
+                        help="Ticks to time in each pass.")
+    parser.add_argument("-output", help="Also write the JSON results to this file.")
+    parser.add_argument("-baseline", help="JSON results to compare against.")
+    parser.add_argument("-tolerance", type=float, default=0.2,
+                        help="Allowed fractional drop in ticks/s. (default 0.2)")
+    args = parser.parse_args()
+
+    # Plugins and config are found relative to the source directory.
+    os.chdir(SRCDIR)
+
+    scenarios = {name: SCENARIOS[name] for name in (args.scenario or SCENARIOS)}
+    if args.components is not None:
+        scenarios = {"custom": (args.components, args.subscriptions, args.events)}
+
+    # Keep stdout for the results. Components print as they start up.
+    with contextlib.redirect_stdout(sys.stderr):
+        results = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scenarios": {name: run_scenario(*scenario, args.ticks)
+                          for name, scenario in scenarios.items()},
+            }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+""" Compare scanning the event queue from every component against the
+Coordinator's index of event subscribers.
+
+Usage:
+    python3 bench_event_dispatch.py [components] [events_per_tick] [ticks]
+"""
+
+#pylint: disable=protected-access
+
+from typing import List
+import sys
+import time
+
+import loader  # pylint: disable=E0401,W0611
+from core.component import _ComponentBase
+from core.coordinator import Coordinator
+from controllers.mock_controller import MockController
+
+
+class FakeComponent(_ComponentBase):
+    """ A component subscribing to a handful of events. """
+
+    # Only acts on delivered events, like most plugins.
+    needs_tick = False
+
+    def __init__(self, label: str, event_names: List[str]) -> None:
+        super().__init__(label)
+        self.event_subscriptions = {name: ("received", None) for name in event_names}
+        self.received = None
+
+
+class BenchCoordinator(Coordinator):
+    """ Coordinator that does not read config from disk. """
+
+    def _load_config(self, filename: str) -> None:
+        self.config = {"controllers": {"mock": {"type": "MockController"}}}
+
+
+def build(component_count: int) -> BenchCoordinator:
+    """ Coordinator with `component_count` components, each subscribed to 4 of
+    `component_count` distinct events. """
+    components = [
+        FakeComponent("fake%s" % index,
+                      ["fake%s:event" % ((index + offset) % component_count)
+                       for offset in range(4)])
+        for index in range(component_count)]
+    return BenchCoordinator([], components, [MockController])
+
+
+def publish(coordinator: Coordinator, component_count: int, event_count: int) -> None:
+    """ Fill the event queue. """
+    for index in range(event_count):
+        coordinator.publish("fake%s:event" % (index % component_count), index)
+
+
+def scan(coordinator: Coordinator) -> None:
+    """ The old delivery method: every component walks the whole queue. """
+    coordinator.receive()
+    for component in coordinator.all_components:
+        component.receive()
+
+
+def run(component_count: int, event_count: int, ticks: int) -> None:
+    """ Time both delivery methods. """
+    coordinator = build(component_count)
+
+    for name, deliver in (("scan", scan), ("indexed", Coordinator._deliver_events)):
+        elapsed = 0.0
+        for _ in range(ticks):
+            publish(coordinator, component_count, event_count)
+            start = time.perf_counter()
+            deliver(coordinator)
+            elapsed += time.perf_counter() - start
+            coordinator._clear_events()
+            for component in coordinator.all_components:
+                component._delivered.clear()
+            coordinator._delivered.clear()
+
+        print("%-8s components: %s  events/tick: %s  ms/tick: %.3f" %
+              (name, component_count, event_count, 1000 * elapsed / ticks))
+
+
+if __name__ == "__main__":
+    ARGS = [int(arg) for arg in sys.argv[1:]]
+    run(*(ARGS + [300, 3000, 20][len(ARGS):]))
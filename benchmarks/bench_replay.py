@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+""" Replay a recorded journal (see `main.py -journal FILENAME`) through a
+headless Coordinator as fast as possible.
+The Coordinator is populated with the controllers and interfaces main.py
+would load but no terminals so recorded GUI input drives it.
+
+Usage:
+    python3 bench_replay.py JOURNAL [repeats]
+"""
+
+import os
+import sys
+import time
+
+import loader  # pylint: disable=E0401,W0611
+import core.common
+from core.coordinator import Coordinator
+from core.journal import read_journal, replay
+
+SRCDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main() -> None:
+    """ Replay the journal `repeats` times and report the throughput. """
+    filename = os.path.abspath(sys.argv[1])
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    # Plugins and config.yaml are found relative to the source directory.
+    os.chdir(SRCDIR)
+
+    controllers = [controller for active, controller in core.common.load_plugins("controllers")
+                   if active]
+    interfaces = [interface() for active, interface in core.common.load_plugins("interfaces")
+                  if active]
+    coordinator = Coordinator([], interfaces, controllers)
+
+    events = sum(1 for _ in read_journal(filename))
+
+    ticks = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        ticks += replay(filename, coordinator)
+    elapsed = time.perf_counter() - start
+    coordinator.close()
+
+    print("%s: %d recorded events" % (filename, events))
+    print("ticks: %d  %.0f ticks/s  %.0f recorded events/s" %
+          (ticks, ticks / elapsed, events * repeats / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+""" Run a gcode job against the DebugController on a simulated clock.
+The Coordinator's main loop runs as fast as possible while the controller's
+CONNECT_DELAY and PUSH_DELAY pass in simulated time, so a job that would take
+hours in real time finishes in seconds.
+Reports the simulated job duration against the expected ETA and how much faster
+than real time the simulation ran.
+
+Usage:
+    python3 bench_simulated_job.py [-lines N] [-gcode FILE]
+"""
+
+from typing import List
+import argparse
+import contextlib
+import sys
+import time
+
+import loader  # pylint: disable=E0401,W0611
+from pygcode import Line
+
+from definitions import ConnectionState
+from core.clock import VirtualClock
+from core.component import _ComponentBase
+from core.coordinator import Coordinator
+from controllers import debug
+from controllers.debug import DebugController
+
+# Two hours at one line per PUSH_DELAY.
+DEFAULT_LINES = 7200
+
+
+class SimulationCoordinator(Coordinator):
+    """ Coordinator with only the DebugController. Does not read config from disk. """
+
+    def _load_config(self, filename: str) -> None:
+        self.config = {"controllers": {"debug": {"type": "DebugController"}}}
+
+
+def generate_job(line_count: int) -> List[str]:
+    """ A job that zig-zags back and forth across the work. """
+    return ["G01 X%s Y%s F1000" % (10 * (index % 2), index // 2)
+            for index in range(line_count)]
+
+
+def run_job(job: List[str]) -> None:
+    """ Stream `job` to a DebugController one line at a time. """
+    clock = VirtualClock()
+    original_clock = _ComponentBase.set_clock(clock)
+    wall_start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            coordinator = SimulationCoordinator([], [], [DebugController])
+            coordinator.activate_controller(label="debug")
+            controller = coordinator.active_controller
+            coordinator.publish("debug:connect", None)
+            while controller.connection_status is not ConnectionState.CONNECTED:
+                coordinator.update_components()
+                coordinator.wait()
+
+            # The controller holds commands until it is ready for them. Send
+            # the next line once the last has appeared in the controller's
+            # log, as a sender streaming to hardware would.
+            accepted_at: List[float] = []
+            for line in job:
+                logged = len(controller.log)
+                coordinator.publish("command:gcode", Line(line).block)
+                while True:
+                    coordinator.update_components()
+                    if len(controller.log) > logged:
+                        break
+                    coordinator.wait()
+                accepted_at.append(clock.monotonic())
+            coordinator.close()
+    finally:
+        _ComponentBase.set_clock(original_clock)
+    wall = time.perf_counter() - wall_start
+
+    job_start, job_end = accepted_at[0], accepted_at[-1]
+    simulated = job_end - job_start
+    eta = (len(job) - 1) * debug.PUSH_DELAY
+    print("lines:          %d" % len(job))
+    print("connect time:   %.1f s (simulated)" % job_start)
+    print("job time:       %.1f s (simulated)" % simulated)
+    print("expected ETA:   %.1f s  error %+.1f s" % (eta, simulated - eta))
+    print("wall time:      %.3f s  %.0fx real time" % (wall, job_end / wall))
+
+
+def main() -> None:
+    """ Run the job. """
+    parser = argparse.ArgumentParser(description="Simulated gcode job benchmark.")
+    parser.add_argument("-lines", type=int, default=DEFAULT_LINES,
+                        help="Lines in the generated job. (default %s)" % DEFAULT_LINES)
+    parser.add_argument("-gcode", help="Run this gcode file instead of a generated job.")
+    args = parser.parse_args()
+
+    if args.gcode:
+        with open(args.gcode) as gcode_file:
+            job = [line.strip() for line in gcode_file if line.strip()]
+    else:
+        job = generate_job(args.lines)
+
+    run_job(job)
+
+
+if __name__ == "__main__":
+    main()
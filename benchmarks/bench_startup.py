@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+""" Measure startup cost.
+Reports the time taken to import each plugin module in a fresh interpreter and
+whether doing so loads the GUI libraries, followed by the time taken and peak
+memory used to start a headless (no terminal) process and a daemon
+(`main.py -daemon`) process the way main.py does.
+
+Usage:
+    python3 bench_startup.py
+"""
+
+from typing import Tuple
+import json
+import os
+import subprocess
+import sys
+
+import loader  # pylint: disable=E0401,W0611
+import core.common
+
+SRCDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PLUGIN_DIRECTORIES = ("terminals", "controllers", "interfaces", "core_components")
+
+GUI_MODULES = ("PySimpleGUIQt", "PySide2")
+
+# Last line printed by each snippet.
+REPORT = """
+import resource
+print(json.dumps([time.perf_counter() - start,
+                  [name for name in %r if name in sys.modules],
+                  resource.getrusage(resource.RUSAGE_SELF).ru_maxrss]))
+""" % (GUI_MODULES,)
+
+IMPORT_PLUGIN = """
+import json, sys, time
+start = time.perf_counter()
+import %s
+""" + REPORT
+
+HEADLESS_STARTUP = """
+import json, sys, time
+start = time.perf_counter()
+import core.common
+from core.coordinator import Coordinator
+controllers = [controller for active, controller in core.common.load_plugins("controllers")
+               if active]
+interfaces = [interface() for active, interface in core.common.load_plugins("interfaces")
+              if active]
+Coordinator([], interfaces, controllers)
+""" + REPORT
+
+DAEMON_STARTUP = """
+import json, sys, time, tempfile, os
+start = time.perf_counter()
+import core.common
+from core.coordinator import Coordinator
+from terminals.socket_api import SocketApi
+controllers = [controller for active, controller in core.common.load_plugins("controllers")
+               if active]
+socket_api = SocketApi()
+socket_api.socket_path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+coordinator = Coordinator([socket_api], [], controllers)
+coordinator.close()
+""" + REPORT
+
+
+def run(code: str) -> Tuple[float, list, int]:
+    """ Run `code` in a fresh interpreter from the source directory.
+    Returns the (seconds, modules, max_rss_kb) printed as the last line of output. """
+    output = subprocess.run([sys.executable, "-c", code],
+                            cwd=SRCDIR,
+                            stdout=subprocess.PIPE,
+                            check=True).stdout.decode("utf-8")
+    seconds, modules, max_rss = json.loads(output.strip().split("\n")[-1])
+    return seconds, modules, max_rss
+
+
+def main() -> None:
+    """ Time importing each plugin then a headless startup. """
+    os.chdir(SRCDIR)
+    for directory in PLUGIN_DIRECTORIES:
+        for _, spec in sorted(core.common.load_plugins(directory),
+                              key=lambda plugin: plugin[1].get_classname()):
+            seconds, modules, max_rss = run(IMPORT_PLUGIN % (spec._module_name,))
+            print("import  %-40s %8.1f ms %7.1f MB  gui: %s" %
+                  (spec._module_name, 1000 * seconds, max_rss / 1024,
+                   ", ".join(modules) or "-"))
+
+    for name, code in (("headless startup", HEADLESS_STARTUP),
+                       ("daemon startup", DAEMON_STARTUP)):
+        seconds, modules, max_rss = run(code)
+        print("%-47s %8.1f ms %7.1f MB  gui: %s" %
+              (name, 1000 * seconds, max_rss / 1024, ", ".join(modules) or "-"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+""" Time StateMachineGrbl parsing status reports with the single pass parser
+against parsing each field in turn.
+By default two sets of reports are generated: Grbl running a job, where the
+position changes every report and WCO and Ov are included periodically as
+Grbl does, and Grbl sitting idle. Pass a capture of Grbl's serial output to
+use recorded traffic instead. Only lines starting with "<" are used.
+
+Usage:
+    python3 bench_status_parser.py [-traffic FILE] [-reports N] [-repeats N]
+"""
+
+#pylint: disable=protected-access
+
+from typing import Callable, Dict, List
+import argparse
+import contextlib
+import os
+import time
+
+import loader  # pylint: disable=E0401,W0611
+from controllers.state_machine import StateMachineGrbl
+
+DEFAULT_REPORTS = 2000
+
+
+def generate_traffic(count: int) -> List[bytes]:
+    """ Status reports from a zig-zag job. """
+    reports = []
+    for index in range(count):
+        report = b"<Run|MPos:%.3f,%.3f,-1.000|Bf:15,128|FS:1000,8000" % (
+            (index % 200) * 0.05, (index // 200) * 0.5)
+        # Grbl includes the work offset every 10 to 30 reports and the
+        # overrides every 10 to 20.
+        if index % 30 == 0:
+            report += b"|WCO:10.000,20.000,0.000"
+        elif index % 20 == 0:
+            report += b"|Ov:100,100,100"
+        reports.append(report + b">")
+    return reports
+
+
+def generate_idle(count: int) -> List[bytes]:
+    """ Status reports from a stationary machine. """
+    return [b"<Idle|MPos:10.000,20.000,-1.000|Bf:15,128|FS:0,0>"] * count
+
+
+def load_traffic(filename: str) -> List[bytes]:
+    """ Status reports from a capture of Grbl's serial output. """
+    with open(filename, "rb") as traffic_file:
+        return [line.strip() for line in traffic_file if line.startswith(b"<")]
+
+
+def time_parser(reports: List[bytes],
+                parse: Callable[[StateMachineGrbl, bytes], None],
+                repeats: int) -> float:
+    """ Best time in seconds to parse every report. """
+    best = float("inf")
+    for _ in range(repeats):
+        state = StateMachineGrbl(lambda name, value: None)
+        start = time.perf_counter()
+        for report in reports:
+            parse(state, report)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    """ Time both parsers. """
+    parser = argparse.ArgumentParser(description="Grbl status report parsing benchmark.")
+    parser.add_argument("-traffic", help="Capture of Grbl serial output.")
+    parser.add_argument("-reports", type=int, default=DEFAULT_REPORTS,
+                        help="Generated reports. (default %s)" % DEFAULT_REPORTS)
+    parser.add_argument("-repeats", type=int, default=5, help="Take the best of N runs.")
+    args = parser.parse_args()
+
+    if args.traffic:
+        scenarios: Dict[str, List[bytes]] = {"recorded": load_traffic(args.traffic)}
+    else:
+        scenarios = {"job": generate_traffic(args.reports), "idle": generate_idle(args.reports)}
+
+    for name, reports in scenarios.items():
+        recognised = sum(1 for report in reports
+                         if StateMachineGrbl.STATUS_REPORT.fullmatch(report))
+
+        # The field by field parser prints fields it does not use.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            fields = time_parser(reports, StateMachineGrbl._parse_status_fields, args.repeats)
+            fast = time_parser(reports, StateMachineGrbl._parse_incoming_status, args.repeats)
+
+        print("%s: %d reports  (%d on the fast path)" % (name, len(reports), recognised))
+        print("  field by field: %7.2f us/report" % (1000000 * fields / len(reports)))
+        print("  single pass:    %7.2f us/report  %.2fx" %
+              (1000000 * fast / len(reports), fields / fast))
+
+if __name__ == "__main__":
+    main()
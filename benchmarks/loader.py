@@ -0,0 +1,8 @@
+""" Add code to be benchmarked to the path so includes can find it. """
+
+import sys
+import os
+
+BENCHDIR = os.path.dirname(__file__)
+SRCDIR = '../'
+sys.path.insert(0, os.path.abspath(os.path.join(BENCHDIR, SRCDIR)))
@@ -1,21 +1,31 @@
 """ Base class for all CNC machine control hardware. """
 
-from typing import Any, Deque, Set, Optional, List, Dict
+from __future__ import annotations
+
+from typing import Any, Deque, Set, Optional, Dict, Mapping
 try:
     from typing import Literal              # type: ignore
 except ImportError:
     from typing_extensions import Literal
 from collections import deque
+import time
 
 from pygcode import Block, GCode, Line
 
-# pylint: disable=E1101  # Module 'PySimpleGUIQt' has no 'XXXX' member (no-member)
-from PySimpleGUI_loader import sg
-
 from core.component import _ComponentBase
+from core.payloads import Move, StateDelta
 from definitions import ConnectionState
 from controllers.state_machine import StateMachineBase, keys_to_lower
 
+# Safety critical commands. Published with `priority=True` and handled by
+# the active controller as soon as they arrive.
+# {event_name: handler_suffix}
+PRIORITY_COMMANDS = {
+    "command:feed_hold": "feed_hold",
+    "command:jog_cancel": "jog_cancel",
+    "command:soft_reset": "soft_reset",
+    }
+
 class _ControllerBase(_ComponentBase):
     """ Base class for all CNC machine control hardware. """
 
@@ -25,12 +35,19 @@ class _ControllerBase(_ComponentBase):
     # Type of component. Used by the plugin loader.
     plugin_type = "controller"
 
+    # `update()` only processes delivered events. Periodic work belongs in
+    # `early_update()`, which is still called every iteration.
+    needs_tick = False
+
     data_to_sync = (
         "connection_status",
         "desired_connection_status",
         "label"
         )
 
+    # Replaces the shared clock for this controller only. Set when testing.
+    _time_override: Any = None
+
     def __init__(self, label: str) -> None:
         super().__init__(label)
 
@@ -42,9 +59,13 @@ class _ControllerBase(_ComponentBase):
         self._new_move_absolute = None
         self._new_move_relative = None
         self._queued_updates: Deque[Any] = deque()
+        # Commands delivered while not `ready_for_data`. Processed in order
+        # once it is.
+        self._pending_commands: Deque[Any] = deque()
+        # Drop commands delivered with the next update. See `_discard_commands()`.
+        self._discarding_commands: bool = False
         self.state = StateMachineBase(self.publish_from_here)
         self._pending_config: Dict[str, Any] = {}
-        self.__edit_buttons: List[sg.Button] = []
 
         # Map incoming events to local member variables and callback methods.
         self.label = label
@@ -56,78 +77,55 @@ class _ControllerBase(_ComponentBase):
             "command:gcode": ("_new_gcode", None),
             "command:move_absolute": ("_new_move_absolute", None),
             "command:move_relative": ("_new_move_relative", None),
+            self.key_gen("label_edit"): ("_modify_controller", None),
+            self.key_gen("cancel_edit"): ("_undo_modify_controller", None),
+            self.key_gen("enable_state_delta"): ("enable_state_delta", True),
             }
+        for event_name in PRIORITY_COMMANDS:
+            self.event_subscriptions[event_name] = ("_on_priority_command", None)
 
         self.set_connection_status(ConnectionState.UNKNOWN)
         self.set_desired_connection_status(ConnectionState.NOT_CONNECTED)
 
         self.sync()
 
-    def gui_layout_view(self) -> List[List[sg.Element]]:
-        """ Layout information for the PySimpleGUI interface. """
-        return []
-
-    def gui_layout_edit(self) -> List[List[sg.Element]]:
-        """ Layout information for the PySimpleGUI interface. """
-
-        return []
-
-    def gui_layout(self) -> List[List[sg.Element]]:
-        """ Layout information for the PySimpleGUI interface. """
-        tabs = []
-        if self.label != "new":
-            tabs.append(sg.Tab("View", self.gui_layout_view(), key=self.key_gen("view")))
-
-        tabs.append(sg.Tab("Edit", self.gui_layout_edit(), key=self.key_gen("edit")))
-
-        return [[sg.TabGroup([tabs], key="controller_%s_tabs" % self.label)]]
-
-    def gui_layout_components(self) -> Dict[str, List[sg.Element]]:
-        """ Return a dict of GUI widgets to be included in controller related pages. """
-        button_col = sg.LOOK_AND_FEEL_TABLE[sg.theme()]["BUTTON"]
-        disabled_button_col = ("grey", button_col[1])
-
-        components = {}
-        components["view_label"] = [
-            sg.Text("Title:", size=(12, 1)),
-            sg.Text(self.label, key=self.key_gen("label"), size=(20, 1)),
-            ]
-        components["edit_label"] = [
-            sg.Text("Title:", size=(12, 1)),
-            sg.InputText(self.label, key=self.key_gen("label_edit"), size=(20, 1)),
-            ]
-        components["view_buttons"] = [
-            sg.Button("Connect", key=self.key_gen("connect"), size=(10, 1), pad=(2, 2)),
-            sg.Button('Disconnect', key=self.key_gen("disconnect"), size=(10, 1), pad=(2, 2)),
-            ]
-        components["edit_buttons"] = [
-            sg.Button("Save",
-                      key=self.key_gen("save_edit"),
-                      size=(10, 1),
-                      pad=(2, 2),
-                      disabled=True,
-                      button_color=disabled_button_col),
-            sg.Button("Cancel",
-                      key=self.key_gen("cancel_edit"),
-                      size=(10, 1),
-                      pad=(2, 2),
-                      disabled=True,
-                      button_color=disabled_button_col),
-            sg.Button("Delete", size=(10, 1), pad=(2, 2)),
-            ]
-        components["view_connection"] = [
-            sg.Text("Connection state (desired/actual):", size=(24, 1)),
-            sg.Text(key=self.key_gen("desired_connection_status"), size=(15, 1), pad=(0, 0)),
-            sg.Text(key=self.key_gen("connection_status"), size=(15, 1), pad=(0, 0), justification="left"),
-            ]
-
-        self.__edit_buttons = components["edit_buttons"]
-
-        self.event_subscriptions[self.key_gen("label_edit")] = ("_modify_controller", None)
-        self.event_subscriptions[self.key_gen("cancel_edit")] = ("_undo_modify_controller", None)
-        return components
+    @property
+    def dirty(self) -> bool:
+        """ Also True once the controller is ready for commands it has been
+        holding, so `update()` is called to process them. Not while it is still
+        waiting, which would keep the main loop from sleeping. """
+        return self._dirty or (self.ready_for_data and bool(self._pending_commands))
+
+    @dirty.setter
+    def dirty(self, value: bool) -> None:
+        self._dirty = value
+
+    @property
+    def _time(self) -> Any:
+        """ Provides `time()` and `sleep()`.
+        The clock shared by all components unless replaced. """
+        if self._time_override is not None:
+            return self._time_override
+        return self._clock[0]
+
+    @_time.setter
+    def _time(self, value: Any) -> None:
+        self._time_override = value
+
+    @property
+    def axes(self) -> str:
+        """ The machine's axes in the order the controller reports them. eg: "xyza".
+        Set from the "axes" parameter in the config file. """
+        return "".join(self.state.axes)
+
+    @axes.setter
+    def axes(self, axes: str) -> None:
+        self.state.set_axes(axes)
+        self.state.sync()
 
     def _modify_controller(self, event: str, value: Any) -> None:
+        """ Stage a change to a controller parameter until it is saved.
+        Publishes "<label>:edit_pending" so any GUI can offer Save/Cancel. """
         print("_modify_controller", event, value)
         event_label, parameter = event.split(":")
         parameter = parameter.rsplit("_edit")[0]
@@ -144,21 +142,17 @@ class _ControllerBase(_ComponentBase):
         self._pending_config[parameter] = value
         print("_modify_controller", self._pending_config)
 
-        button_col = sg.LOOK_AND_FEEL_TABLE[sg.theme()]["BUTTON"]
-        self.__edit_buttons[0].Update(button_color=button_col, disabled=False)
-        self.__edit_buttons[1].Update(button_color=button_col, disabled=False)
+        self.publish(self.key_gen("edit_pending"), True)
 
     def _undo_modify_controller(self, _: str, __: Any) -> None:
+        """ Discard staged changes to controller parameters. """
         for parameter in self._pending_config:
             key = "%s_edit" % self.key_gen(parameter)
             self.publish(key, getattr(self, parameter))
 
         self._pending_config = {}
 
-        button_col = sg.LOOK_AND_FEEL_TABLE[sg.theme()]["BUTTON"]
-        disabled_button_col = ("grey", button_col[1])
-        self.__edit_buttons[0].Update(button_color=disabled_button_col, disabled=True)
-        self.__edit_buttons[1].Update(button_color=disabled_button_col, disabled=True)
+        self.publish(self.key_gen("edit_pending"), False)
 
     def sync(self) -> None:
         """ Publish all paramiters listed in self.data_to_sync. """
@@ -169,8 +163,19 @@ class _ControllerBase(_ComponentBase):
 
     def publish_from_here(self, variable_name: str, variable_value: Any) -> None:
         """ A method wrapper to pass on to the StateMachineBase so it can
-        publish events. """
-        self.publish(self.key_gen(variable_name), variable_value)
+        publish events.
+        These describe machine state so only the latest value matters. """
+        self.publish(self.key_gen(variable_name), variable_value, coalesce=True)
+
+    def enable_state_delta(self, enable: bool = True) -> None:
+        """ Also publish "<label>:state_delta" carrying every machine property
+        changed by each status report in one payload.
+        Enabled by the "<label>:enable_state_delta" event. """
+        self.state.on_delta_callback = self._publish_state_delta if enable else None
+
+    def _publish_state_delta(self, delta: StateDelta) -> None:
+        """ Not coalesced. Each delta only holds what changed in one report. """
+        self.publish(self.key_gen("state_delta"), delta)
 
     @property
     def active(self) -> bool:
@@ -232,29 +237,82 @@ class _ControllerBase(_ComponentBase):
 
     def update(self) -> None:
         self._queued_updates.clear()
-        if(self._delivered and
-           self.connection_status is ConnectionState.CONNECTED and
-           self.active and
-           self.ready_for_data):
-            # Process incoming events.
-            for event, value in self._delivered:
-                ## TODO: Flags.
-                if event in ("command:gcode",
-                             "command:move_absolute",
-                             "command:move_relative"):
-
-                    # Make a copy of events processes for derived classes that
-                    # need a record of work done here.
-                    self._queued_updates.append((event, value))
-
-                    # Call handler functions for incoming events.
-                    action = event.split(":", 1)[1]
-                    assert hasattr(self, "_handle_%s" % action),\
-                           "Missing handler for %s event." % action
-                    if isinstance(value, dict):
-                        getattr(self, "_handle_%s" % action)(**keys_to_lower(value))
-                    else:
-                        getattr(self, "_handle_%s" % action)(value)
+        discarding = self._discarding_commands
+        self._discarding_commands = False
+        if (self.connection_status is not ConnectionState.CONNECTED or
+                not self.active or discarding):
+            # Commands are only for a connected, active controller.
+            self._pending_commands.clear()
+            return
+
+        for event, value in self._delivered:
+            ## TODO: Flags.
+            if event in ("command:gcode",
+                         "command:move_absolute",
+                         "command:move_relative"):
+                self._pending_commands.append((event, value))
+
+        if not self.ready_for_data:
+            # Keep the commands until the controller can take them.
+            # See `dirty`.
+            return
+
+        # Process incoming events.
+        while self._pending_commands:
+            event, value = self._pending_commands.popleft()
+
+            # Make a copy of events processes for derived classes that
+            # need a record of work done here.
+            self._queued_updates.append((event, value))
+
+            # Call handler functions for incoming events.
+            action = event.split(":", 1)[1]
+            assert hasattr(self, "_handle_%s" % action),\
+                   "Missing handler for %s event." % action
+            if isinstance(value, Move):
+                getattr(self, "_handle_%s" % action)(**value)
+            elif isinstance(value, Mapping):
+                getattr(self, "_handle_%s" % action)(**keys_to_lower(value))
+            else:
+                getattr(self, "_handle_%s" % action)(value)
+
+    def receive_priority(self, event_name: str, event_value: Any, published_at: float) -> None:
+        """ Act on safety critical commands as soon as they arrive. """
+        if event_name not in PRIORITY_COMMANDS:
+            super().receive_priority(event_name, event_value, published_at)
+            return
+
+        if self.connection_status is ConnectionState.CONNECTED and self.active:
+            getattr(self, "_handle_%s" % PRIORITY_COMMANDS[event_name])(published_at)
+
+    def _discard_commands(self) -> None:
+        """ Drop every command not yet processed. Includes commands published
+        before now that are delivered with the next update. eg: After a soft
+        reset. """
+        self._pending_commands.clear()
+        self._discarding_commands = True
+
+    def _on_priority_command(self, event_name: str, event_value: Any) -> None:
+        """ A priority command that was published without `priority=True`. """
+        self.receive_priority(event_name, event_value, time.perf_counter())
+
+    def _handle_feed_hold(self, published_at: float) -> None:
+        """ Handler for the "command:feed_hold" event.
+        Pause motion as quickly as possible.
+        Args:
+            published_at: time.perf_counter() when the command was issued. """
+
+    def _handle_jog_cancel(self, published_at: float) -> None:
+        """ Handler for the "command:jog_cancel" event.
+        Stop any jog in progress.
+        Args:
+            published_at: time.perf_counter() when the command was issued. """
+
+    def _handle_soft_reset(self, published_at: float) -> None:
+        """ Handler for the "command:soft_reset" event.
+        Stop all motion and reset the controller.
+        Args:
+            published_at: time.perf_counter() when the command was issued. """
 
     def _handle_gcode(self, gcode_block: Block) -> None:
         """ Handler for the "command:gcode" event. """
@@ -3,7 +3,9 @@
 # overridden (abstract-method)
 """ Base class for hardware controllers that use a serial port to connect. """
 
-from typing import Optional, List, Set, Dict
+from __future__ import annotations
+
+from typing import Optional, List, Set
 try:
     from typing import Literal              # type: ignore
 except ImportError:
@@ -11,12 +13,10 @@ except ImportError:
 
 import os.path
 import threading
+import asyncio
 import serial
 import serial.tools.list_ports
 
-# pylint: disable=E1101  # Module 'PySimpleGUIQt' has no 'XXXX' member (no-member)
-from PySimpleGUI_loader import sg
-
 from controllers._controller_base import _ControllerBase
 from definitions import ConnectionState
 
@@ -30,6 +30,9 @@ class _SerialControllerBase(_ControllerBase):
 
     _serial_port_in_use: Set[str] = set()
 
+    # `update()` polls for serial ports until one is found.
+    needs_tick = True
+
     def __init__(self, label: str = "serialController") -> None:
         super().__init__(label)
         #self.serial_port = "spy:///tmp/ttyFAKE?file=/tmp/serialspy.txt"
@@ -38,41 +41,16 @@ class _SerialControllerBase(_ControllerBase):
         self._serial = None
         self.testing: bool = False  # Prevent _periodic_io() from blocking during tests.
         self._serial_thread: Optional[threading.Thread] = None
+        self._serial_task: Optional[asyncio.Task] = None  # type: ignore
+        # Set to wake the serial port thread when there is data to be written.
+        self._io_wakeup = threading.Event()
+        self._io_wakeup_async: Optional[asyncio.Event] = None
 
         self.event_subscriptions[self.key_gen("device_picker")] = ("set_device", None)
         self.event_subscriptions[self.key_gen("serial_port_edit")] = ("set_device", None)
         self.event_subscriptions[self.key_gen("device_scan")] = ("search_device", None)
 
         self.ports: List[str] = []
-        self.device_picker: sg.Combo = None
-
-    def gui_layout_components(self) -> Dict[str, List[sg.Element]]:
-        """ GUI layout common to all derived classes. """
-        components = super().gui_layout_components()
-
-        self.device_picker = sg.Combo(values=["to_populate"],
-                                      size=(25, 1),
-                                      key=self.key_gen("device_picker"),
-                                      default_value=self.serial_port,
-                                      enable_events=True,
-                                      )
-        device_scan = sg.Button("Scan",
-                                size=(5, 1),
-                                key=self.key_gen("device_scan"),
-                                tooltip="Scan for serial ports.",
-                                )
-
-        self.search_device()
-
-        components["view_serial_port"] = [sg.Text("Serial port:",
-                                                  size=(12, 1)),
-                                          sg.Text(self.serial_port,
-                                                  key=self.key_gen("serial_port"))]
-        components["edit_serial_port"] = [sg.Text("Serial port:",
-                                                  size=(12, 1)),
-                                          self.device_picker, device_scan]
-
-        return components
 
     def set_device(self, device: str) -> None:
         """ Set serial port when selected by menu. """
@@ -84,12 +62,11 @@ class _SerialControllerBase(_ControllerBase):
         # TODO: Move this to the Save method?
         self.disconnect()
 
-        if self.device_picker:
-            self.device_picker.Update(value=device)
         self._modify_controller(self.key_gen("serial_port_edit"), device)
 
     def search_device(self, _: str = "", __: None = None) -> None:
-        """ Search system for serial ports. """
+        """ Search system for serial ports.
+        Publishes the result as "<label>:ports". """
         self.ports = [x.device for x in serial.tools.list_ports.comports() \
                   if x.vid is not None \
                   and  x.pid is not None \
@@ -110,15 +87,7 @@ class _SerialControllerBase(_ControllerBase):
         if not self.serial_port:
             self.serial_port = self.ports[0]
 
-        if self.device_picker:
-            try:
-                self.device_picker.Update(values=self.ports,
-                                          value=self.serial_port
-                                          )
-                print("search_device", self.serial_port)
-            except AttributeError:
-                # self.device_picker not configured.
-                pass
+        self.publish(self.key_gen("ports"), list(self.ports))
 
     def connect(self) -> Literal[ConnectionState]:
         """ Try to open serial port. Set connection_status to CONNECTING. """
@@ -170,7 +139,13 @@ class _SerialControllerBase(_ControllerBase):
         else:
             self.set_connection_status(ConnectionState.DISCONNECTING)
 
-            self._serial_thread.join()
+            self._wake_io()
+            if self._serial_thread:
+                self._serial_thread.join()
+                self._serial_thread = None
+            # An asyncio task will see connection_status has changed and exit
+            # next time it runs.
+            self._serial_task = None
             self._serial.close()
 
         self.ready_for_data = False
@@ -196,9 +171,19 @@ class _SerialControllerBase(_ControllerBase):
         while self._serial.readline():
             pass
 
-        self._serial_thread = threading.Thread(target=self._periodic_io)
-        self._serial_thread.daemon = True
-        self._serial_thread.start()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop:
+            # Running under the AsyncCoordinator so no need for a thread.
+            self._io_wakeup_async = asyncio.Event()
+            self._serial_task = loop.create_task(self._periodic_io_async())
+        else:
+            self._serial_thread = threading.Thread(target=self._periodic_io)
+            self._serial_thread.daemon = True
+            self._serial_thread.start()
 
     def on_disconnected(self) -> None:
         """ Executed when serial port is confirmed closed.
@@ -252,6 +237,12 @@ class _SerialControllerBase(_ControllerBase):
             self.set_connection_status(ConnectionState.FAIL)
         return line
 
+    def next_update_in(self) -> Optional[float]:
+        """ Keep polling while transitioning between connection states. """
+        if self.connection_status != self.desired_connection_status:
+            return SERIAL_INTERVAL
+        return None
+
     def early_update(self) -> bool:
         """ Called early in the event loop, before events have been received. """
         if self.connection_status != self.desired_connection_status:
@@ -285,18 +276,67 @@ class _SerialControllerBase(_ControllerBase):
 
         return True
 
+    def _io_iteration(self) -> bool:
+        """ Read from and write to serial port once.
+            Returns:
+                True if any data was read or written. """
+        return False
+
     def _periodic_io(self) -> None:
         """ Read from and write to serial port.
             Called from a separate thread.
             Blocks while serial port remains connected. """
-        # while self.connection_status is ConnectionState.CONNECTED:
-        #     print("do read and write here.")
-        #     self._time.sleep(SERIAL_INTERVAL)
-        #     if self.testing:
-        #         break
+        while self.connection_status is ConnectionState.CONNECTED:
+            # Cleared before the queues are drained so a `_wake_io()` from here
+            # on is still set when we come to wait.
+            self._io_wakeup.clear()
+            busy = self._io_iteration()
+
+            if self.testing:
+                break
+
+            if not busy:
+                # Nothing happened this time around so sleep until new data is
+                # queued for writing or it's time to poll the serial port again.
+                # When busy we go straight round again so the next command is
+                # sent as soon as the controller is ready for it.
+                self._io_wakeup.wait(SERIAL_INTERVAL)
+
+    async def _periodic_io_async(self) -> None:
+        """ Read from and write to serial port.
+            Used in place of `_periodic_io()` when running on an asyncio loop.
+            Runs as a task on the loop while serial port remains connected. """
+        assert self._io_wakeup_async, "Missing asyncio.Event."
+        while self.connection_status is ConnectionState.CONNECTED:
+            # See `_periodic_io()`.
+            self._io_wakeup_async.clear()
+            busy = self._io_iteration()
+
+            if self.testing:
+                break
+
+            if busy:
+                # Let other tasks run before going straight round again.
+                await asyncio.sleep(0)
+                continue
+
+            try:
+                await asyncio.wait_for(self._io_wakeup_async.wait(), SERIAL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _wake_io(self) -> None:
+        """ Wake the serial port thread or task. """
+        self._io_wakeup.set()
+        if self._io_wakeup_async:
+            self._io_wakeup_async.set()
 
     def update(self) -> None:
         super().update()
 
+        if self._queued_updates:
+            # New data for the serial port thread.
+            self._wake_io()
+
         if not self.ports:
             self.search_device()
@@ -1,20 +1,17 @@
-# Pylint seems to be looking at python2.7's PySimpleGUI libraries so we need the following:
-# pylint: disable=E1101  # Module 'PySimpleGUIQt' has no 'XXXX' member (no-member)
-
 """ A controller for use when testing which mimics an actual hardware controller. """
 
-from typing import List, Callable, Any, Deque, Tuple
+from __future__ import annotations
+
+from typing import Callable, Any, Deque, Tuple, Optional
 try:
     from typing import Literal              # type: ignore
 except ImportError:
     from typing_extensions import Literal   # type: ignore
-import time
 from collections import deque
 
 from pygcode import Machine, GCodeCoordSystemOffset, \
                     GCodeResetCoordSystemOffset, Block
 
-from PySimpleGUI_loader import sg
 
 from definitions import ConnectionState
 from controllers._controller_base import _ControllerBase
@@ -22,6 +19,8 @@ from controllers.state_machine import StateMachineBase
 
 CONNECT_DELAY = 4   # seconds
 PUSH_DELAY = 1      # seconds
+# Most recent lines of gcode shown in the GUI.
+DEBUG_OUTPUT_LINES = 200
 
 class DebugController(_ControllerBase):
     """ A controller for use when testing which mimics an actual hardware controller. """
@@ -53,6 +52,8 @@ class DebugController(_ControllerBase):
 
         # A record of all gcode ever sent to this controller.
         self.log: Deque[Tuple[str, str, Any]] = deque()
+        # The most recent entries in self.log formatted for display.
+        self._debug_output: Deque[str] = deque(maxlen=DEBUG_OUTPUT_LINES)
 
         self._connect_time: float = 0
         self._last_receive_data_at: float = 0
@@ -60,37 +61,6 @@ class DebugController(_ControllerBase):
         # State machine reflecting _virtual_cnc state.
         self.state: StateMachinePygcode = StateMachinePygcode(self.publish_from_here)
 
-        # Allow replacing with a mock version when testing.
-        self._time: Any = time
-
-    def gui_layout_view(self) -> List[List[sg.Element]]:
-        """ Layout information for the PySimpleGUI interface. """
-
-        components = self.gui_layout_components()
-        layout = [
-            components["view_label"],
-            [sg.Multiline(default_text="gcode",
-                          size=(60, 10),
-                          key=self.key_gen("gcode"),
-                          autoscroll=True,
-                          disabled=True,
-                          enable_events=False,
-                          ),],
-            components["view_connection"],
-            components["view_buttons"],
-            ]
-        return layout
-
-    def gui_layout_edit(self) -> List[List[sg.Element]]:
-        """ Layout information for the PySimpleGUI interface. """
-
-        components = self.gui_layout_components()
-        layout = [
-            components["edit_label"],
-            components["edit_buttons"],
-            ]
-        return layout
-
     def connect(self) -> Literal[ConnectionState]:
         if self.connection_status in [
                 ConnectionState.CONNECTING,
@@ -115,6 +85,14 @@ class DebugController(_ControllerBase):
 
         return self.connection_status
 
+    def next_update_in(self) -> Optional[float]:
+        """ Wake up when the simulated connection or data delays expire. """
+        if self.connection_status != self.desired_connection_status:
+            return max(0, CONNECT_DELAY - (self._time.time() - self._connect_time))
+        if self.connection_status == ConnectionState.CONNECTED and not self.ready_for_data:
+            return max(0, PUSH_DELAY - (self._time.time() - self._last_receive_data_at))
+        return None
+
     def early_update(self) -> bool:
         if self.connection_status != self.desired_connection_status:
             if self._time.time() - self._connect_time >= CONNECT_DELAY:
@@ -129,8 +107,9 @@ class DebugController(_ControllerBase):
                 self.disconnect()
 
         if self.connection_status == ConnectionState.CONNECTED:
-            if self._time.time() - self._last_receive_data_at >= PUSH_DELAY:
-                self.ready_for_data = True
+            # Accept more data PUSH_DELAY after the last lot.
+            self.ready_for_data = \
+                self._time.time() - self._last_receive_data_at >= PUSH_DELAY
         else:
             self.ready_for_data = False
         
@@ -145,12 +124,12 @@ class DebugController(_ControllerBase):
             for event, data in self._queued_updates:
                 # Generate output for debug log.
                 component_name, action = event.split(":", 1)
-                self.log.append((component_name, action, data))
+                log_line = (component_name, action, data)
+                self.log.append(log_line)
+
+                self._debug_output.append("%s\t%s\t%s\n" % log_line)
 
-                debug_output = ""
-                for log_line in self.log:
-                    debug_output += "%s\t%s\t%s\n" % log_line
-                self.publish(self.key_gen("gcode"), debug_output)
+            self.publish(self.key_gen("gcode"), "".join(self._debug_output))
 
             # Update the state machine to reflect the pygcode virtual machine.
             self.state.update()
@@ -168,7 +147,7 @@ class DebugController(_ControllerBase):
                 self.state.work_offset = work_offset
                 return
             if isinstance(gcode, GCodeResetCoordSystemOffset):
-                self.state.work_offset = {"x": 0, "y": 0, "z": 0, "a": 0, "b": 0}
+                self.state.work_offset = dict.fromkeys(self.state.axes, 0)
                 return
             # TODO Check for more gcode in same block.
 
@@ -186,9 +165,10 @@ class StateMachinePygcode(StateMachineBase):
 
     def update(self) -> None:
         """ Populate this state machine values from self._virtual_cnc. """
-        self._parse_modal()
-        self.machine_pos = self._virtual_cnc.pos.values
-        self.feed_rate = self._virtual_cnc.mode.feed_rate.word.value
+        with self.batch():
+            self._parse_modal()
+            self.machine_pos = self._virtual_cnc.pos.values
+            self.feed_rate = self._virtual_cnc.mode.feed_rate.word.value
 
     def _parse_modal(self) -> None:
         """ Update current modal group values. """
@@ -196,13 +176,13 @@ class StateMachinePygcode(StateMachineBase):
             modal_bytes = str(modal).encode('utf-8')
             if modal_bytes in self.MODAL_COMMANDS:
                 modal_group = self.MODAL_COMMANDS[modal_bytes]
-                self.gcode_modal[modal_group] = modal_bytes
+                self._modal[modal_group] = modal_bytes
             elif chr(modal_bytes[0]).encode('utf-8') in self.MODAL_COMMANDS:
                 modal_group = self.MODAL_COMMANDS[chr(modal_bytes[0]).encode('utf-8')]
-                self.gcode_modal[modal_group] = modal_bytes
+                self._modal[modal_group] = modal_bytes
             else:
                 print("TODO: ", modal)
-        # print(self.gcode_modal)
+        self._publish_modal()
 
     def proces_gcode(self, gcode_block: Block) -> None:
         """ Have the pygcode VM parse incoming gcode. """
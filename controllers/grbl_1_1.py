@@ -1,25 +1,78 @@
-# Pylint seems to be looking at python2.7's PySimpleGUI libraries so we need the following:
-# pylint: disable=E1101  # Module 'PySimpleGUIQt' has no 'XXXX' member (no-member)
-
 """ A plugin to support Grbl 1.1 controller hardware. """
 
-from typing import List, Any, Optional, Deque, Tuple, Dict
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional, Deque, Tuple
 
+import json
+import re
 import time
 from queue import Queue, Empty
 from collections import deque
 
 from pygcode import GCode, Block
-from PySimpleGUI_loader import sg
 
 from definitions import ConnectionState
 from controllers._controller_serial_base import _SerialControllerBase
 from controllers.state_machine import StateMachineGrbl as State
 
 REPORT_INTERVAL = 1.0 # seconds
-SERIAL_INTERVAL = 0.02 # seconds
+# Number of realtime command latency measurements to keep.
+LATENCY_HISTORY = 100
+
+# Grbl realtime commands.
+FEED_HOLD = b"!"
+JOG_CANCEL = b"\x85"
+SOFT_RESET = b"\x18"
 RX_BUFFER_SIZE = 127
 
+# Grbl settings are cached in this file, keyed by machine. See `settings_cache`.
+# Bump SETTINGS_CACHE_VERSION if the cache format changes.
+SETTINGS_CACHE = "grbl_settings.json"
+SETTINGS_CACHE_VERSION = 1
+# Seconds before cached settings are refreshed from the machine.
+SETTINGS_CACHE_MAX_AGE = 24 * 60 * 60
+
+# Not sent by Grbl. Added to the received data when Grbl acknowledges "$I",
+# "$$" and commands that change settings.
+INFO_RECEIVED = b"[sentInfo:]"
+SETTINGS_RECEIVED = b"[sentSettings:]"
+SETTINGS_CHANGED = b"[sentSettingsChange:]"
+# Commands that change Grbl's settings. eg: "$110=500"
+SETTINGS_WRITE = re.compile(rb"\$(\d+|RST)=")
+
+
+def read_settings_cache(filename: str) -> Dict[str, Any]:
+    """ Cached Grbl settings.
+    Returns:
+        {machine_identity: {"saved_at": time.time(), "settings": {register: value}}} """
+    try:
+        with open(filename) as cache_file:
+            cache = json.load(cache_file)
+        if cache["version"] == SETTINGS_CACHE_VERSION:
+            return dict(cache["machines"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return {}
+
+
+def write_settings_cache(filename: str, machines: Dict[str, Any]) -> None:
+    """ Replace the cached Grbl settings. """
+    try:
+        with open(filename, "w") as cache_file:
+            json.dump({"version": SETTINGS_CACHE_VERSION, "machines": machines},
+                      cache_file, indent=1, sort_keys=True)
+    except OSError as error:
+        print("Could not save Grbl settings cache: %s" % error)
+
+def clear_queue(command_queue: Queue[Any]) -> None:
+    """ Discard everything in a queue. """
+    try:
+        while True:
+            command_queue.get(block=False)
+    except Empty:
+        pass
+
 def sort_gcode(block: Block) -> str:
     """ Reorder gcode to a manner that is friendly to clients.
     eg: Feed rate should proceed "G01" and "G00". """
@@ -57,26 +110,58 @@ class Grbl1p1Controller(_SerialControllerBase):
         b"F", b"T", b"S"
         ))
 
+    # "$I" and "$#" only read so are not included. They are sent on every
+    # connect and would otherwise stall streaming.
     SLOWCOMMANDS = (b"G10L2", b"G10L20", b"G28.1", b"G30.1", b"$x=", b"$I=",
                     b"$Nx=", b"$RST=", b"G54", b"G55", b"G56", b"G57", b"G58",
-                    b"G59", b"G28", b"G30", b"$$", b"$I", b"$N", b"$#")
+                    b"G59", b"G28", b"G30", b"$$", b"$N")
 
-    def __init__(self, label: str = "grbl1.1", _time = time) -> None:
+    def __init__(self, label: str = "grbl1.1", _time: Any = None) -> None:
         # pylint: disable=E1136  # Value 'Queue' is unsubscriptable
 
         super().__init__(label)
 
-        # Allow replacing with a mock version when testing.
-        self._time: Any = _time
+        # Allow replacing the shared clock with a mock version when testing.
+        self._time = _time
 
         # State machine to track current GRBL state.
         self.state: State = State(self.publish_from_here)
 
+        # File Grbl settings are cached in so "$$" need not be sent every time
+        # the controller is activated or connects. None to disable.
+        self.settings_cache: Optional[str] = SETTINGS_CACHE
+        # Timestamps in settings_cache outlive this process so are wall clock
+        # time even when self._time is simulated. Replaced when testing.
+        self._wall_time: Callable[[], float] = time.time
+        # Send "$$" next time Grbl is idle.
+        self._settings_refresh_due: bool = False
+
+        # Keep Grbl's state when the serial port reconnects rather than soft
+        # resetting it. Grbl keeps running while the port is closed so its
+        # modal state and offsets are probed and reconciled with `state`
+        # instead. Only applies once Grbl has been identified during this
+        # session; the first connection always resets.
+        self.resume_on_reconnect: bool = True
+        # State from before the reconnect while resuming. See `_on_resumed()`.
+        self._resume_from: Optional[Dict[str, Any]] = None
+        # Set while resuming until Grbl reports Idle. Lines sent before the
+        # reconnect may still be buffered in Grbl and their "ok"s may have been
+        # lost while the port was closed, so the bytes in flight are unknown.
+        # Nothing is streamed until then. See `_on_resume_drained()`.
+        self._resume_in_flight: bool = False
+
         # Populate with GRBL commands that are processed immediately and don't need queued.
         self._command_immediate: Queue[bytes] = Queue()
         # Populate with GRBL commands that are processed sequentially.
         self._command_streaming: Queue[bytes] = Queue()
 
+        # Safety critical GRBL realtime commands and the time.perf_counter() they
+        # were issued. Written before anything else.
+        self._command_realtime: Queue[Tuple[bytes, float]] = Queue()
+        # Seconds between a realtime command being issued and being written to
+        # the serial port.
+        self.realtime_latency: Deque[float] = deque(maxlen=LATENCY_HISTORY)
+
         # Data received from GRBL that does not need processed immediately.
         self._received_data: Queue[bytes] = Queue()
 
@@ -109,35 +194,6 @@ class Grbl1p1Controller(_SerialControllerBase):
                 return True
         return False
 
-    def gui_layout_view(self) -> List[List[sg.Element]]:
-        """ Layout information for the PySimpleGUI interface. """
-
-        components: Dict[str, Any] = self.gui_layout_components()
-        layout: List[Any] = [
-            components["view_label"],
-            components["view_serial_port"],
-            [sg.Multiline(default_text="Machine state",
-                          size=(60, 10),
-                          key=self.key_gen("state"),
-                          autoscroll=True,
-                          disabled=True,
-                          ),],
-            components["view_connection"],
-            components["view_buttons"],
-            ]
-        return layout
-
-    def gui_layout_edit(self) -> List[List[sg.Element]]:
-        """ Layout information for the PySimpleGUI interface. """
-
-        components = self.gui_layout_components()
-        layout = [
-            components["edit_label"],
-            components["edit_serial_port"],
-            components["edit_buttons"],
-            ]
-        return layout
-
     def parse_incoming(self, incoming: Optional[bytes]) -> None:
         """ Process data received from serial port.
         Handles urgent updates here and puts the rest in _received_data buffer for
@@ -170,22 +226,33 @@ class Grbl1p1Controller(_SerialControllerBase):
         elif incoming.startswith(b"ok"):
             self._incoming_ok()
         else:
+            if self._resume_in_flight and incoming.startswith((b"<Idle", b"<Alarm")):
+                self._on_resume_drained()
             self._received_data.put(incoming)
 
+        # Have the main thread process _received_data.
+        self.wake()
+
         if self.first_receive:
             # Since we are definitely connected, let's request a status report.
 
             self.first_receive = False
             # Request a report on the modal state of the GRBL controller.
             self._command_streaming.put(b"$G")
-            # Grbl settings report.
-            self._command_streaming.put(b"$$")
+            # Request the coordinate systems and offsets. Compared with the
+            # previous values when resuming after a reconnect.
+            self._command_streaming.put(b"$#")
+            # Identify the machine. Settings then come from the cache or "$$".
+            # See `_on_identified()`.
+            self._command_streaming.put(b"$I")
 
     def _incoming_error(self, incoming: bytes) -> None:
         """ Called when GRBL returns an "error:". """
         self._error_count += 1
-        self._send_buf_lens.popleft()
-        action = self._send_buf_actns.popleft()
+        action: Tuple[bytes, Any] = (b"unknown", None)
+        if self._send_buf_lens:
+            self._send_buf_lens.popleft()
+            action = self._send_buf_actns.popleft()
         print("error: '%s' due to '%s' " % (incoming.decode("utf-8"), action[0].decode("utf-8")))
         # Feed Hold:
         self._command_immediate.put(b"!")
@@ -202,6 +269,34 @@ class Grbl1p1Controller(_SerialControllerBase):
         if isinstance(action[1], GCode):
             self._received_data.put(b"[sentGcode:%s]" % \
                                     str(action[1].modal_copy()).encode("utf-8"))
+        elif action[0] == b"$$":
+            # Apply the settings report in one go now it is complete.
+            self._received_data.put(SETTINGS_RECEIVED)
+        elif action[0] == b"$I":
+            self._received_data.put(INFO_RECEIVED)
+        elif SETTINGS_WRITE.match(action[0]):
+            self._received_data.put(SETTINGS_CHANGED)
+
+    def _write_realtime(self) -> bool:
+        """ Write all entries in the _command_realtime buffer to serial port.
+        Returns:
+            True if anything was written. """
+        written = False
+        while True:
+            try:
+                command, published_at = self._command_realtime.get(block=False)
+            except Empty:
+                return written
+
+            if not self._serial_write(command):
+                return written
+            written = True
+            self.realtime_latency.append(time.perf_counter() - published_at)
+
+            if command == JOG_CANCEL:
+                self._on_jog_cancelled()
+            elif command == SOFT_RESET:
+                self._on_soft_reset()
 
     def _write_immediate(self) -> bool:
         """ Write entries in the _command_immediate buffer to serial port. """
@@ -239,6 +334,10 @@ class Grbl1p1Controller(_SerialControllerBase):
         assert not (self.running_gcode and self.running_jog), \
                "Invalid state: Jog and Gcode modes active at same time."
 
+        if self._resume_in_flight:
+            # Can't count the space in Grbl's buffer until it is idle.
+            return False
+
         if self.flush_before_continue:
             if sum(self._send_buf_lens) > 0:
                 # Currently processing a task that must be completed before
@@ -304,30 +403,30 @@ class Grbl1p1Controller(_SerialControllerBase):
             return True
         return False
 
-    def _periodic_io(self) -> None:
-        """ Read from and write to serial port.
-            Called from a separate thread.
-            Blocks while serial port remains connected. """
-        while self.connection_status is ConnectionState.CONNECTED:
-            # Read
+    def _io_iteration(self) -> bool:
+        """ Read from and write to serial port once.
+            Returns:
+                True if any data was read or written. """
+        # Safety critical commands first.
+        busy = self._write_realtime()
+
+        # Read
+        read = self._serial_read()
+        while read or (b"\r\n" in self._partial_read):
+            busy = True
+            self.parse_incoming(read)
             read = self._serial_read()
-            while read or (b"\r\n" in self._partial_read):
-                self.parse_incoming(read)
-                read = self._serial_read()
 
-            #Write
-            if not self._write_immediate():
-                self._write_streaming()
+        #Write
+        if self._write_immediate() or self._write_streaming():
+            busy = True
 
-            # Request status update periodically.
-            if self._last_write < self._time.time() - REPORT_INTERVAL:
-                self._command_immediate.put(b"?")
-                self._last_write = self._time.time()
+        # Request status update periodically.
+        if self._last_write < self._time.time() - REPORT_INTERVAL:
+            self._command_immediate.put(b"?")
+            self._last_write = self._time.time()
 
-            self._time.sleep(SERIAL_INTERVAL)
-
-            if self.testing:
-                break
+        return busy
 
     def _handle_gcode(self, gcode_block: Block) -> None:
         """ Handler for the "command:gcode" event. """
@@ -391,11 +490,14 @@ class Grbl1p1Controller(_SerialControllerBase):
         self._command_streaming.put(jog_command_string)
 
     def cancel_jog(self) -> None:
-        """ Cancel currently running Jog action. """
+        """ Cancel currently running Jog action.
+        Called from the serial port thread. """
+        self._command_realtime.put((JOG_CANCEL, time.perf_counter()))
+        self._write_realtime()
+
+    def _on_jog_cancelled(self) -> None:
+        """ Called from the serial port thread once a jog cancel has been sent. """
         print("Cancel jog")
-        self._command_immediate.put(b"\x85")
-        while self._write_immediate():
-            pass
         self.state.machine_state = b"ClearJog"
 
         # All Grbl internal buffers are cleared of Jog commands and we should
@@ -404,57 +506,222 @@ class Grbl1p1Controller(_SerialControllerBase):
         self._send_buf_actns.clear()
         self.running_jog = False
 
+    def _on_soft_reset(self) -> None:
+        """ Called from the serial port thread once a soft reset has been sent.
+        Grbl discards everything it had buffered. """
+        # Anything queued since `_handle_soft_reset()`.
+        clear_queue(self._command_streaming)
+        self._resume_in_flight = False
+        self._clear_in_flight()
+
+    def _handle_feed_hold(self, published_at: float) -> None:
+        """ Handler for the "command:feed_hold" event. """
+        self._command_realtime.put((FEED_HOLD, published_at))
+        self._wake_io()
+
+    def _handle_jog_cancel(self, published_at: float) -> None:
+        """ Handler for the "command:jog_cancel" event. """
+        self._command_realtime.put((JOG_CANCEL, published_at))
+        self._wake_io()
+
+    def _handle_soft_reset(self, published_at: float) -> None:
+        """ Handler for the "command:soft_reset" event.
+        Nothing queued before the reset is sent after it. """
+        self._discard_commands()
+        clear_queue(self._command_streaming)
+        clear_queue(self._command_immediate)
+        self._command_realtime.put((SOFT_RESET, published_at))
+        self._wake_io()
+
+    def next_update_in(self) -> Optional[float]:
+        """ Keep updating while there is received data to be processed. """
+        if not self._received_data.empty():
+            return 0
+        return super().next_update_in()
+
     def early_update(self) -> bool:
         """ Called early in the event loop, before events have been received. """
         super().early_update()
 
-        # Process data received over serial port.
-        received_line = None
-        try:
-            received_line = self._received_data.get(block=False)
-        except Empty:
-            pass
-        if received_line is not None:
+        # Process all data received over serial port since last time.
+        # Parsed here rather than in the serial port thread as other
+        # components read self.state from the main thread.
+        while True:
+            try:
+                received_line = self._received_data.get(block=False)
+            except Empty:
+                break
             #print("received_line:", received_line)
+            if received_line == INFO_RECEIVED:
+                self._on_identified()
+                if self._resume_from is not None:
+                    self._on_resumed()
+                continue
+            if self._resume_from is not None and received_line.startswith(b"Grbl "):
+                # Welcome message. Grbl restarted anyway. eg: The serial port
+                # toggling DTR resets most Arduinos.
+                self._resume_from["restarted"] = True
+            if received_line == SETTINGS_CHANGED:
+                self._forget_settings()
+                continue
             self.state.parse_incoming(received_line)
+            if received_line == SETTINGS_RECEIVED:
+                self._save_settings()
+
+        if self._settings_refresh_due and self._idle():
+            # "$$" is one of the SLOWCOMMANDS so stalls streaming. Only send it
+            # when there is nothing else to do.
+            self._settings_refresh_due = False
+            self._command_streaming.put(b"$$")
 
         # Display debug info: Summary of machine state.
         if self.connection_status is ConnectionState.CONNECTED:
             if self.state.changes_made:
-                self.publish(self.key_gen("state"), self.state)
+                self.publish(self.key_gen("state"), self.state, coalesce=True)
                 self.state.changes_made = False
 
         return True
 
+    def _idle(self) -> bool:
+        """ Connected with nothing running or waiting to be sent. """
+        return (self.connection_status is ConnectionState.CONNECTED and
+                self.state.machine_state == b"Idle" and
+                not (self.running_gcode or self.running_jog) and
+                self._command_streaming.empty())
+
+    def _on_identified(self) -> None:
+        """ Grbl has reported which machine it is. Use cached settings for it if
+        there are any. Refresh them from the machine if there aren't or they
+        are stale. """
+        identity = self.state.identity
+        entry = None
+        if identity and self.settings_cache:
+            entry = read_settings_cache(self.settings_cache).get(identity)
+        try:
+            self.state.load_settings(entry["settings"])
+            saved_at = float(entry["saved_at"])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            self._settings_refresh_due = True
+            return
+        if self._wall_time() - saved_at > SETTINGS_CACHE_MAX_AGE:
+            self._settings_refresh_due = True
+
+    def _save_settings(self) -> None:
+        """ A "$$" report has been received. Cache it for this machine. """
+        identity = self.state.identity
+        if not identity or not self.settings_cache:
+            return
+        machines = read_settings_cache(self.settings_cache)
+        machines[identity] = {"saved_at": self._wall_time(),
+                              "settings": dict(self.state.setting_registers)}
+        write_settings_cache(self.settings_cache, machines)
+
+    def _forget_settings(self) -> None:
+        """ Grbl's settings have been changed. Drop the cached copy and read
+        them again. """
+        self._settings_refresh_due = True
+        identity = self.state.identity
+        if not identity or not self.settings_cache:
+            return
+        machines = read_settings_cache(self.settings_cache)
+        if machines.pop(identity, None) is not None:
+            write_settings_cache(self.settings_cache, machines)
+
     def on_connected(self) -> None:
         """ Executed when serial port first comes up. """
         super().on_connected()
+        if self.connection_status is not ConnectionState.CONNECTED:
+            # Port not open yet. Called again next update.
+            return
         self.ready_for_data = True
 
-        # Clear any state from before a disconnect.
+        self._resume_from = None
+        if self.resume_on_reconnect and self.state.identity:
+            self._resume_from = self._reconciled_state()
+            self._resume_from["identity"] = self.state.identity
+
+        self.first_receive = True
+        self._settings_refresh_due = False
+        if self._resume_from is not None:
+            # Grbl may still be executing lines sent before the disconnect.
+            # Keep the send buffer so their "ok"s are matched and wait for
+            # Grbl to report Idle before streaming anything else.
+            self._resume_in_flight = True
+        else:
+            # Clear any state from before a disconnect.
+            self._resume_in_flight = False
+            self._clear_in_flight()
+
+        # Could be a different machine on this port now.
+        self.state.version.clear()
+
+        if self._resume_from is not None:
+            # Ask for a status report straight away. The reply triggers
+            # "$G", "$#" and "$I". See `parse_incoming()`.
+            self._command_immediate.put(b"?")
+        else:
+            # Perform a soft reset of Grbl.
+            self._command_immediate.put(SOFT_RESET)
+
+    def _clear_in_flight(self) -> None:
+        """ Forget lines sent to Grbl that have not been acknowledged. """
         self.running_jog = False
         self.running_gcode = False
         self.running_mode_at = self._time.time()
         self.flush_before_continue = False
         self._send_buf_lens.clear()
         self._send_buf_actns.clear()
-        self.first_receive = True
 
-        # Perform a soft reset of Grbl.
-        # With a lot of testing we could avoid needing this reset and keep state
-        # between disconnect/connect cycles.
-        self._command_immediate.put(b"\x18")
+    def _on_resume_drained(self) -> None:
+        """ Grbl has reported Idle (or Alarm) after a reconnect without reset.
+        Everything sent before the reconnect has been executed or discarded so
+        its buffers are empty. Start counting from zero again. """
+        self._resume_in_flight = False
+        self._clear_in_flight()
+
+    def _reconciled_state(self) -> Dict[str, Any]:
+        """ The parts of `state` compared when resuming after a reconnect. """
+        values = dict(self.state.snapshot())
+        values["machine_state"] = self.state.machine_state
+        values["gcode_modal"] = self.state.gcode_modal
+        values["offsets"] = self.state.offsets
+        return values
+
+    def _on_resumed(self) -> None:
+        """ Grbl has answered the probes sent after reconnecting without a reset.
+        Fresh values have already replaced the ones from before the reconnect.
+        Report what differs. """
+        previous = self._resume_from
+        assert previous is not None
+        self._resume_from = None
+
+        if previous.pop("identity") != self.state.identity:
+            message = "Reconnected to a different machine: %s" % self.state.identity
+        elif previous.pop("restarted", False):
+            message = "Grbl restarted while disconnected. State was reset."
+        else:
+            current = self._reconciled_state()
+            changed = sorted(name for name, value in current.items()
+                             if previous.get(name) != value)
+            message = "Reconnected without reset."
+            if changed:
+                message += " Changed while disconnected: %s" % ", ".join(changed)
+        print(message)
+        self.publish("user_feedback:command_state", message + "\n")
 
     def on_activate(self) -> None:
         """ Called whenever self.active is set True. """
         if self.connection_status is ConnectionState.CONNECTED:
-            # The easiest way to replay the following events is to just request
-            # the data from the Grbl controller again.
+            # The easiest way to replay the modal state is to just request
+            # it from the Grbl controller again.
             # This way the events get re-sent when fresh data arrives.
-            # (The alternative would be to have the StateMachine re-send the
-            # cached data but it is possible the StateMachine is stale.)
 
             # Request a report on the modal state of the GRBL controller.
             self._command_streaming.put(b"$G")
-            # Grbl settings report.
-            self._command_streaming.put(b"$$")
+            # Settings rarely change so come from the cache rather than "$$",
+            # which would stall streaming. Refreshed in the background if stale.
+            if self.state.identity:
+                self._on_identified()
+                self.publish_from_here("settings", self.state.settings)
+            else:
+                self._command_streaming.put(b"$I")
@@ -2,8 +2,16 @@
 Typically each hardware controller type will have it's own SM class inheriting
 from StateMachineBase. """
 
-from typing import Dict, List, Callable, Optional, Any
+from typing import Dict, List, Callable, Optional, Any, Mapping, Iterator, Sequence, Tuple
+from collections import namedtuple
+from contextlib import contextmanager
+import itertools
+import re
 
+import numpy as np
+
+from core.payloads import AXES, ModalGroups, Position, Offsets, Overrides, Settings, \
+        StateDelta, StateSnapshot
 from definitions import MODAL_GROUPS, MODAL_COMMANDS
 
 
@@ -11,6 +19,20 @@ def keys_to_lower(dict_: Dict[str, Any]) -> Dict[str, Any]:
     """ Translate a dict's keys to lower case. """
     return {k.lower(): v for k, v in dict_.items()}
 
+# Properties with a value for each axis. Stored as rows of
+# `StateMachineBase._axis_values` in this order.
+AXIS_PROPERTIES: Tuple[str, ...] = (
+    "machine_pos",
+    "machine_pos_max",
+    "machine_pos_min",
+    "work_pos",
+    "work_offset",
+    "feed_rate_max",
+    "feed_rate_accel",
+    )
+(MACHINE_POS, MACHINE_POS_MAX, MACHINE_POS_MIN, WORK_POS, WORK_OFFSET,
+ FEED_RATE_MAX, FEED_RATE_ACCEL) = range(len(AXIS_PROPERTIES))
+
 class StateMachineBase:
     """ Base class for State Machines reflecting the state of hardware controllers. """
 
@@ -40,21 +62,30 @@ class StateMachineBase:
         "door",
         ]
 
+    # Shared by all state machines so a revision is never reused even when
+    # consumers switch between controllers.
+    _revisions = itertools.count(1)
+
     # Cheaper than global lookups
     MODAL_GROUPS: Dict[str, Any] = MODAL_GROUPS
     MODAL_COMMANDS = MODAL_COMMANDS
 
-    def __init__(self, on_update_callback: Callable[[str, Any], None]) -> None:
+    def __init__(self,
+                 on_update_callback: Callable[[str, Any], None],
+                 axes: Sequence[str] = AXES) -> None:
         self.on_update_callback = on_update_callback
 
-        self.__machine_pos: Dict[str, float] = {"x": 0, "y": 0, "z": 0, "a": 0, "b": 0}
-        self.__machine_pos_max: Dict[str, float] = {"x": 0, "y": 0, "z": 0, "a": 0, "b": 0}
-        self.__machine_pos_min: Dict[str, float] = {"x": 0, "y": 0, "z": 0, "a": 0, "b": 0}
-        self.__work_pos: Dict[str, float] = {"x": 0, "y": 0, "z": 0, "a": 0, "b": 0}
-        self.__work_offset: Dict[str, float] = {"x": 0, "y": 0, "z": 0, "a": 0, "b": 0}
+        # Set to also receive a single StateDelta for each `batch()`.
+        self.on_delta_callback: Optional[Callable[[StateDelta], None]] = None
+        self._delta: Optional[Dict[str, Any]] = None
+
+        # Changes whenever any property changes.
+        self.revision: int = next(self._revisions)
+        self._snapshot: Optional[StateSnapshot] = None
+
+        self.set_axes(axes)
+
         self.__feed_rate: float = 0
-        self.__feed_rate_max: Dict[str, float] = {"x": 0, "y": 0, "z": 0, "a": 0, "b": 0}
-        self.__feed_rate_accel: Dict[str, float] = {"x": 0, "y": 0, "z": 0, "a": 0, "b": 0}
         self.__feed_override: float = 100
         self.__rapid_override: float = 100
         self.__spindle_rate: float = 0
@@ -66,35 +97,95 @@ class StateMachineBase:
         self.__limit_b: float = False
         self.__probe: bool = False
         self.__pause: bool = False
-        self.pause_reason: List[str] = []
+        self.pause_reason: Tuple[str, ...] = ()
         self.__pause_park: bool = False
         self.__parking: bool = False
         self.__halt: bool = False
-        self.halt_reason: List[str] = []
+        self.halt_reason: Tuple[str, ...] = ()
         self.__door: bool = False
 
-        self.gcode_modal: Dict[bytes, bytes] = {}
+        self.__gcode_modal: ModalGroups = ModalGroups({})
+        # Updated in place while parsing then published as `gcode_modal`.
+        # See `_publish_modal()`.
+        self._modal: Dict[bytes, bytes] = {}
 
         self.version: List[str] = []  # Up to the controller how this is populated.
         self.machine_identifier: List[str] = []  # Up to the controller how this is populated.
 
         self.changes_made: bool = True
 
+    def set_axes(self, axes: Sequence[str]) -> None:
+        """ Set which axes the machine has, in the order the controller reports
+        them. eg: "xyzabc" for a 6 axis machine.
+        All per axis properties are reset to 0. """
+        self.axes: Tuple[str, ...] = tuple(axis.lower() for axis in axes)
+        assert self.axes and len(set(self.axes)) == len(self.axes), \
+               "Invalid axes: %s" % (axes,)
+        self._axis_index: Dict[str, int] = \
+                {axis: index for index, axis in enumerate(self.axes)}
+        # "machine_pos:x", etc. Saves formatting event names on every update.
+        self._axis_event_names: List[Tuple[str, ...]] = [
+            tuple("%s:%s" % (name, axis) for axis in self.axes) for name in AXIS_PROPERTIES]
+
+        # One row for each of AXIS_PROPERTIES, one column for each axis.
+        self._axis_values = np.zeros((len(AXIS_PROPERTIES), len(self.axes)))
+        # Rows as immutable Positions. Created when first needed after a change.
+        self._positions: List[Optional[Position]] = [None] * len(AXIS_PROPERTIES)
+        # Comma separated values each row was last loaded from by `_load_bytes()`.
+        # Lets a controller skip parsing coordinates that have not changed.
+        self._row_bytes: List[Optional[bytes]] = [None] * len(AXIS_PROPERTIES)
+
+        # Preallocated so updates don't allocate.
+        # New values waiting to be stored and which axes they are for.
+        self._incoming = np.zeros(len(self.axes))
+        self._incoming_set = np.zeros(len(self.axes), dtype=bool)
+        # Axes changed by the last `_store()`.
+        self._changed = np.zeros(len(self.axes), dtype=bool)
+
+        self.revision = next(self._revisions)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """ Group the changes made inside this context. eg: Those from one status
+        report.
+        Each change is still published as it is made. If `on_delta_callback`
+        is set, it is also passed a StateDelta of every property that changed
+        when the outermost batch ends. """
+        if self.on_delta_callback is None or self._delta is not None:
+            yield
+            return
+
+        delta: Dict[str, Any] = {}
+        self._delta = delta
+        callback = self.on_update_callback
+
+        def record(name: str, value: Any) -> None:
+            callback(name, value)
+            if ":" not in name:
+                # Whole properties only. Not the individual axes.
+                delta[name] = value
+
+        self.on_update_callback = record
+        try:
+            yield
+        finally:
+            self.on_update_callback = callback
+            self._delta = None
+        if delta:
+            self.on_delta_callback(StateDelta(delta))
+
     def __str__(self) -> str:
-        output = ("Pause: {self.pause}\tHalt: {self.halt}\n")
-        output += ("machine_pos x: {self.machine_pos[x]} y: {self.machine_pos[y]} "
-                   "z: {self.machine_pos[z]} a: {self.machine_pos[a]} "
-                   "b: {self.machine_pos[b]}\r\n")
+        def axes(position: Position) -> str:
+            return " ".join("%s: %s" % item for item in position.items())
+
+        output = "Pause: {self.pause}\tHalt: {self.halt}\n".format(self=self)
+        output += "machine_pos %s\r\n" % axes(self.machine_pos)
         if self.machine_pos != self.work_pos:
-            output += ("work_pos x: {self.work_pos[x]} y: {self.work_pos[y]} "
-                       "z: {self.work_pos[z]} a: {self.work_pos[a]} "
-                       "b: {self.work_pos[b]}\r\n")
-            output += ("work_offset x: {self.work_offset[x]} y: {self.work_offset[y]} "
-                       "z: {self.work_offset[z]} a: {self.work_offset[a]} "
-                       "b: {self.work_offset[b]}\r\n")
-        output += "feed_rate: {self.feed_rate}\r\n"
-        output += "gcode_modalGroups: {self.gcode_modal}\r\n"
-        return output.format(self=self)
+            output += "work_pos %s\r\n" % axes(self.work_pos)
+            output += "work_offset %s\r\n" % axes(self.work_offset)
+        output += "feed_rate: {self.feed_rate}\r\n".format(self=self)
+        output += "gcode_modalGroups: {self.gcode_modal}\r\n".format(self=self)
+        return output
 
     def sync(self) -> None:
         """ Publish all machine properties. """
@@ -105,262 +196,212 @@ class StateMachineBase:
             self.on_update_callback(prop, value)
 
             # Also publish component parts if property is a dict.
-            if isinstance(value, dict):
+            if isinstance(value, Mapping):
                 for sub_prop, sub_value in value.items():
                     self.on_update_callback("%s:%s" % (prop, sub_prop), sub_value)
 
+    def snapshot(self) -> StateSnapshot:
+        """ All machine properties at the current revision. """
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.revision != self.revision:
+            values = {prop: getattr(self, prop) for prop in self.machine_properties}
+            values["overrides"] = self.overrides
+            snapshot = StateSnapshot(self.revision, values)
+            self._snapshot = snapshot
+        return snapshot
+
+    def snapshot_if_changed(self, revision: int) -> Optional[StateSnapshot]:
+        """ For consumers that poll the state rather than subscribing to events.
+        Args:
+            revision: `revision` of the last snapshot the caller received.
+        Returns:
+            A snapshot if anything has changed since `revision`, otherwise None. """
+        if revision == self.revision:
+            return None
+        return self.snapshot()
+
+    @property
+    def gcode_modal(self) -> ModalGroups:
+        """ The gcode last used in each modal group. {group: gcode} """
+        return self.__gcode_modal
+
+    def _publish_modal(self, force: bool = False) -> None:
+        """ Publish `gcode_modal` if `_modal` has changed since it was last
+        published.
+        Args:
+            force: Publish even if nothing changed. """
+        changed = self._modal != self.__gcode_modal
+        if changed:
+            self.__gcode_modal = ModalGroups(self._modal)
+        if changed or force:
+            self._publish("gcode_modal", self.__gcode_modal)
+
+    def _publish(self, name: str, value: Any) -> None:
+        """ Publish a changed property. """
+        self.revision = next(self._revisions)
+        self.on_update_callback(name, value)
+
+    def _position(self, row: int) -> Position:
+        """ One of AXIS_PROPERTIES as a Position. """
+        position = self._positions[row]
+        if position is None:
+            position = Position._new(  # pylint: disable=W0212  # protected-access
+                tuple(self._axis_values[row].tolist()), self.axes)
+            self._positions[row] = position
+        return position
+
+    def _load(self, values: Mapping[str, Optional[float]]) -> bool:
+        """ Copy {axis: value} into the incoming buffer ready for `_store()`.
+        Axis names are case insensitive. Unknown axes and None are ignored.
+        Returns:
+            True if there was a value for any axis. """
+        incoming = self._incoming
+        incoming_set = self._incoming_set
+        incoming_set.fill(False)
+        index = self._axis_index
+        for axis, value in values.items():
+            if value is None:
+                continue
+            column = index.get(axis.lower())
+            if column is not None:
+                incoming[column] = value
+                incoming_set[column] = True
+        return bool(incoming_set.any())
+
+    def _load_bytes(self, values: bytes) -> None:
+        """ Copy comma separated values for the first axes into the incoming
+        buffer ready for `_store()`. eg: b"1.000,-2.500,0.000" """
+        parts = values.split(b",")
+        count = len(parts)
+        assert 0 < count <= len(self.axes), \
+               "Expected up to %s coordinates: %s" % (len(self.axes), values.decode('utf-8'))
+        # numpy parses the bytes without creating intermediate floats.
+        self._incoming[:count] = parts
+        self._incoming_set[:count] = True
+        self._incoming_set[count:] = False
+
+    def _store(self, row: int) -> bool:
+        """ Copy the incoming buffer into one of AXIS_PROPERTIES.
+        Sets `_changed` to the axes whose value changed.
+        Returns:
+            True if any axis changed. """
+        current = self._axis_values[row]
+        changed = self._changed
+        np.not_equal(self._incoming, current, out=changed)
+        changed &= self._incoming_set
+        if not changed.any():
+            return False
+        np.copyto(current, self._incoming, where=changed)
+        self._invalidate(row)
+        return True
+
+    def _invalidate(self, row: int) -> None:
+        """ Clear anything cached for one of AXIS_PROPERTIES after it changes. """
+        self._positions[row] = None
+        self._row_bytes[row] = None
+
+    def _publish_row(self, row: int) -> None:
+        """ Publish the axes of one of AXIS_PROPERTIES listed in `_changed`
+        followed by the whole property. """
+        self.revision = next(self._revisions)
+        callback = self.on_update_callback
+        names = self._axis_event_names[row]
+        values = self._axis_values[row]
+        for column, changed in enumerate(self._changed.tolist()):
+            if changed:
+                callback(names[column], float(values[column]))
+        callback(AXIS_PROPERTIES[row], self._position(row))
+
+    def _set_row(self, row: int, values: Mapping[str, Optional[float]]) -> None:
+        """ Set and publish a per axis property with no derived properties. """
+        if self._load(values) and self._store(row):
+            self._publish_row(row)
+
+    def _update_machine_pos(self) -> None:
+        """ Store incoming machine position and the work position derived from it. """
+        if not self._store(MACHINE_POS):
+            return
+        values = self._axis_values
+        np.subtract(values[MACHINE_POS], values[WORK_OFFSET],
+                    out=values[WORK_POS], where=self._changed)
+        self._invalidate(WORK_POS)
+        self._publish_row(MACHINE_POS)
+        self._publish_row(WORK_POS)
+
+    def _update_work_pos(self) -> None:
+        """ Store incoming work position and the machine position derived from it. """
+        if not self._store(WORK_POS):
+            return
+        values = self._axis_values
+        np.add(values[WORK_POS], values[WORK_OFFSET],
+               out=values[MACHINE_POS], where=self._changed)
+        self._invalidate(MACHINE_POS)
+        self._publish_row(MACHINE_POS)
+        self._publish_row(WORK_POS)
+
+    def _update_work_offset(self) -> None:
+        """ Store incoming work offset and the work position derived from it. """
+        if not self._store(WORK_OFFSET):
+            return
+        values = self._axis_values
+        np.subtract(values[MACHINE_POS], values[WORK_OFFSET],
+                    out=values[WORK_POS], where=self._changed)
+        self._invalidate(WORK_POS)
+        self._publish_row(WORK_OFFSET)
+        self._publish_row(WORK_POS)
+
     @property
-    def work_offset(self) -> Dict[str, float]:
+    def work_offset(self) -> Position:
         """ Getter. """
-        return self.__work_offset
+        return self._position(WORK_OFFSET)
 
     @work_offset.setter
-    def work_offset(self, pos: Dict[str, float]) -> None:
+    def work_offset(self, pos: Mapping[str, float]) -> None:
         """ Setter. """
-        pos = keys_to_lower(pos)
-        data_changed = False
-        pos_x = pos.get("x")
-        pos_y = pos.get("y")
-        pos_z = pos.get("z")
-        pos_a = pos.get("a")
-        pos_b = pos.get("b")
-        if pos_x is not None:
-            if self.__work_offset["x"] != pos_x:
-                data_changed = True
-                self.__work_offset["x"] = pos_x
-                self.__work_pos["x"] = self.machine_pos["x"] - pos_x
-        if pos_y is not None:
-            if self.__work_offset["y"] != pos_y:
-                data_changed = True
-                self.__work_offset["y"] = pos_y
-                self.__work_pos["y"] = self.machine_pos["y"] - pos_y
-        if pos_z is not None:
-            if self.__work_offset["z"] != pos_z:
-                data_changed = True
-                self.__work_offset["z"] = pos_z
-                self.__work_pos["z"] = self.machine_pos["z"] - pos_z
-        if pos_a is not None:
-            if self.__work_offset["a"] != pos_a:
-                data_changed = True
-                self.__work_offset["a"] = pos_a
-                self.__work_pos["a"] = self.machine_pos["a"] - pos_a
-        if pos_b is not None:
-            if self.__work_offset["b"] != pos_b:
-                data_changed = True
-                self.__work_offset["b"] = pos_b
-                self.__work_pos["b"] = self.machine_pos["b"] - pos_b
-
-        if data_changed:
-            self.on_update_callback("work_offset:x", self.work_offset["x"])
-            self.on_update_callback("work_offset:y", self.work_offset["y"])
-            self.on_update_callback("work_offset:z", self.work_offset["z"])
-            self.on_update_callback("work_offset:a", self.work_offset["a"])
-            self.on_update_callback("work_offset:b", self.work_offset["b"])
-            self.on_update_callback("work_offset", self.work_offset)
-            self.on_update_callback("work_pos:x", self.work_pos["x"])
-            self.on_update_callback("work_pos:y", self.work_pos["y"])
-            self.on_update_callback("work_pos:z", self.work_pos["z"])
-            self.on_update_callback("work_pos:a", self.work_pos["a"])
-            self.on_update_callback("work_pos:b", self.work_pos["b"])
-            self.on_update_callback("work_pos", self.work_pos)
+        if self._load(pos):
+            self._update_work_offset()
 
     @property
-    def machine_pos_max(self) -> Dict[str, float]:
+    def machine_pos_max(self) -> Position:
         """ Getter. """
-        return self.__machine_pos_max
+        return self._position(MACHINE_POS_MAX)
 
     @machine_pos_max.setter
-    def machine_pos_max(self, pos: Dict[str, float]) -> None:
+    def machine_pos_max(self, pos: Mapping[str, float]) -> None:
         """ Setter. """
-        pos = keys_to_lower(pos)
-        data_changed = False
-        pos_x = pos.get("x")
-        pos_y = pos.get("y")
-        pos_z = pos.get("z")
-        pos_a = pos.get("a")
-        pos_b = pos.get("b")
-        if pos_x is not None:
-            if self.machine_pos_max["x"] != pos_x:
-                data_changed = True
-                self.machine_pos_max["x"] = pos_x
-        if pos_y is not None:
-            if self.machine_pos_max["y"] != pos_y:
-                data_changed = True
-                self.machine_pos_max["y"] = pos_y
-        if pos_z is not None:
-            if self.machine_pos_max["z"] != pos_z:
-                data_changed = True
-                self.machine_pos_max["z"] = pos_z
-        if pos_a is not None:
-            if self.machine_pos_max["a"] != pos_a:
-                data_changed = True
-                self.machine_pos_max["a"] = pos_a
-        if pos_b is not None:
-            if self.machine_pos_max["b"] != pos_b:
-                data_changed = True
-                self.machine_pos_max["b"] = pos_b
-
-        if data_changed:
-            self.on_update_callback("machine_pos_max:x", self.machine_pos_max["x"])
-            self.on_update_callback("machine_pos_max:y", self.machine_pos_max["y"])
-            self.on_update_callback("machine_pos_max:z", self.machine_pos_max["z"])
-            self.on_update_callback("machine_pos_max:a", self.machine_pos_max["a"])
-            self.on_update_callback("machine_pos_max:b", self.machine_pos_max["b"])
-            self.on_update_callback("machine_pos_max", self.machine_pos_max)
+        self._set_row(MACHINE_POS_MAX, pos)
 
     @property
-    def machine_pos_min(self) -> Dict[str, float]:
+    def machine_pos_min(self) -> Position:
         """ Getter. """
-        return self.__machine_pos_min
+        return self._position(MACHINE_POS_MIN)
 
     @machine_pos_min.setter
-    def machine_pos_min(self, pos: Dict[str, float]) -> None:
+    def machine_pos_min(self, pos: Mapping[str, float]) -> None:
         """ Setter. """
-        pos = keys_to_lower(pos)
-        data_changed = False
-        pos_x = pos.get("x")
-        pos_y = pos.get("y")
-        pos_z = pos.get("z")
-        pos_a = pos.get("a")
-        pos_b = pos.get("b")
-        if pos_x is not None:
-            if self.machine_pos_min["x"] != pos_x:
-                data_changed = True
-                self.machine_pos_min["x"] = pos_x
-        if pos_y is not None:
-            if self.machine_pos_min["y"] != pos_y:
-                data_changed = True
-                self.machine_pos_min["y"] = pos_y
-        if pos_z is not None:
-            if self.machine_pos_min["z"] != pos_z:
-                data_changed = True
-                self.machine_pos_min["z"] = pos_z
-        if pos_a is not None:
-            if self.machine_pos_min["a"] != pos_a:
-                data_changed = True
-                self.machine_pos_min["a"] = pos_a
-        if pos_b is not None:
-            if self.machine_pos_min["b"] != pos_b:
-                data_changed = True
-                self.machine_pos_min["b"] = pos_b
-
-        if data_changed:
-            self.on_update_callback("machine_pos_min:x", self.machine_pos_min["x"])
-            self.on_update_callback("machine_pos_min:y", self.machine_pos_min["y"])
-            self.on_update_callback("machine_pos_min:z", self.machine_pos_min["z"])
-            self.on_update_callback("machine_pos_min:a", self.machine_pos_min["a"])
-            self.on_update_callback("machine_pos_min:b", self.machine_pos_min["b"])
-            self.on_update_callback("machine_pos_min", self.machine_pos_min)
+        self._set_row(MACHINE_POS_MIN, pos)
 
     @property
-    def machine_pos(self) -> Dict[str, float]:
+    def machine_pos(self) -> Position:
         """ Getter. """
-        return self.__machine_pos
+        return self._position(MACHINE_POS)
 
     @machine_pos.setter
-    def machine_pos(self, pos: Dict[str, float]) -> None:
+    def machine_pos(self, pos: Mapping[str, float]) -> None:
         """ Setter. """
-        pos = keys_to_lower(pos)
-        data_changed = False
-        pos_x = pos.get("x")
-        pos_y = pos.get("y")
-        pos_z = pos.get("z")
-        pos_a = pos.get("a")
-        pos_b = pos.get("b")
-        if pos_x is not None:
-            if self.machine_pos["x"] != pos_x:
-                data_changed = True
-                self.machine_pos["x"] = pos_x
-                self.work_pos["x"] = pos_x - self.work_offset.get("x", 0)
-        if pos_y is not None:
-            if self.machine_pos["y"] != pos_y:
-                data_changed = True
-                self.machine_pos["y"] = pos_y
-                self.work_pos["y"] = pos_y - self.work_offset.get("y", 0)
-        if pos_z is not None:
-            if self.machine_pos["z"] != pos_z:
-                data_changed = True
-                self.machine_pos["z"] = pos_z
-                self.work_pos["z"] = pos_z - self.work_offset.get("z", 0)
-        if pos_a is not None:
-            if self.machine_pos["a"] != pos_a:
-                data_changed = True
-                self.machine_pos["a"] = pos_a
-                self.work_pos["a"] = pos_a - self.work_offset.get("a", 0)
-        if pos_b is not None:
-            if self.machine_pos["b"] != pos_b:
-                data_changed = True
-                self.machine_pos["b"] = pos_b
-                self.work_pos["b"] = pos_b - self.work_offset.get("b", 0)
-
-        if data_changed:
-            self.on_update_callback("machine_pos:x", self.machine_pos["x"])
-            self.on_update_callback("machine_pos:y", self.machine_pos["y"])
-            self.on_update_callback("machine_pos:z", self.machine_pos["z"])
-            self.on_update_callback("machine_pos:a", self.machine_pos["a"])
-            self.on_update_callback("machine_pos:b", self.machine_pos["b"])
-            self.on_update_callback("machine_pos", self.machine_pos)
-            self.on_update_callback("work_pos:x", self.work_pos["x"])
-            self.on_update_callback("work_pos:y", self.work_pos["y"])
-            self.on_update_callback("work_pos:z", self.work_pos["z"])
-            self.on_update_callback("work_pos:a", self.work_pos["a"])
-            self.on_update_callback("work_pos:b", self.work_pos["b"])
-            self.on_update_callback("work_pos", self.work_pos)
+        if self._load(pos):
+            self._update_machine_pos()
 
     @property
-    def work_pos(self) -> Dict[str, float]:
+    def work_pos(self) -> Position:
         """ Getter. """
-        return self.__work_pos
+        return self._position(WORK_POS)
 
     @work_pos.setter
-    def work_pos(self, pos: Dict[str, float]) -> None:
+    def work_pos(self, pos: Mapping[str, float]) -> None:
         """ Setter. """
-        pos = keys_to_lower(pos)
-        data_changed = False
-        pos_x = pos.get("x")
-        pos_y = pos.get("y")
-        pos_z = pos.get("z")
-        pos_a = pos.get("a")
-        pos_b = pos.get("b")
-        if pos_x is not None:
-            if self.work_pos["x"] != pos_x:
-                data_changed = True
-                self.work_pos["x"] = pos_x
-                self.machine_pos["x"] = pos_x + self.__work_offset.get("x", 0)
-        if pos_y is not None:
-            if self.work_pos["y"] != pos_y:
-                data_changed = True
-                self.work_pos["y"] = pos_y
-                self.machine_pos["y"] = pos_y + self.__work_offset.get("y", 0)
-        if pos_z is not None:
-            if self.work_pos["z"] != pos_z:
-                data_changed = True
-                self.work_pos["z"] = pos_z
-                self.machine_pos["z"] = pos_z + self.__work_offset.get("z", 0)
-        if pos_a is not None:
-            if self.work_pos["a"] != pos_a:
-                data_changed = True
-                self.work_pos["a"] = pos_a
-                self.machine_pos["a"] = pos_a + self.__work_offset.get("a", 0)
-        if pos_b is not None:
-            if self.work_pos["b"] != pos_b:
-                data_changed = True
-                self.work_pos["b"] = pos_b
-                self.machine_pos["b"] = pos_b + self.__work_offset.get("b", 0)
-
-        if data_changed:
-            self.on_update_callback("machine_pos:x", self.machine_pos["x"])
-            self.on_update_callback("machine_pos:y", self.machine_pos["y"])
-            self.on_update_callback("machine_pos:z", self.machine_pos["z"])
-            self.on_update_callback("machine_pos:a", self.machine_pos["a"])
-            self.on_update_callback("machine_pos:b", self.machine_pos["b"])
-            self.on_update_callback("machine_pos", self.machine_pos)
-            self.on_update_callback("work_pos:x", self.work_pos["x"])
-            self.on_update_callback("work_pos:y", self.work_pos["y"])
-            self.on_update_callback("work_pos:z", self.work_pos["z"])
-            self.on_update_callback("work_pos:a", self.work_pos["a"])
-            self.on_update_callback("work_pos:b", self.work_pos["b"])
-            self.on_update_callback("work_pos", self.work_pos)
+        if self._load(pos):
+            self._update_work_pos()
 
     @property
     def feed_rate(self) -> float:
@@ -371,89 +412,33 @@ class StateMachineBase:
     def feed_rate(self, feed_rate: float) -> None:
         """ Setter. """
         if self.__feed_rate != feed_rate:
-            self.on_update_callback("feed_rate", feed_rate)
+            self._publish("feed_rate", feed_rate)
         self.__feed_rate = feed_rate
 
     @property
-    def feed_rate_max(self) -> Dict[str, float]:
+    def feed_rate_max(self) -> Position:
         """ Getter. """
-        return self.__feed_rate_max
+        return self._position(FEED_RATE_MAX)
 
     @feed_rate_max.setter
-    def feed_rate_max(self, feedrate: Dict[str, float]) -> None:
+    def feed_rate_max(self, feedrate: Mapping[str, float]) -> None:
         """ Setter. """
-        data_changed = False
-        pos_x = feedrate.get("x")
-        pos_y = feedrate.get("y")
-        pos_z = feedrate.get("z")
-        pos_a = feedrate.get("a")
-        pos_b = feedrate.get("b")
-        if pos_x is not None:
-            if self.feed_rate_max["x"] != pos_x:
-                data_changed = True
-                self.feed_rate_max["x"] = pos_x
-        if pos_y is not None:
-            if self.feed_rate_max["y"] != pos_y:
-                data_changed = True
-                self.feed_rate_max["y"] = pos_y
-        if pos_z is not None:
-            if self.feed_rate_max["z"] != pos_z:
-                data_changed = True
-                self.feed_rate_max["z"] = pos_z
-        if pos_a is not None:
-            if self.feed_rate_max["a"] != pos_a:
-                data_changed = True
-                self.feed_rate_max["a"] = pos_a
-        if pos_b is not None:
-            if self.feed_rate_max["b"] != pos_b:
-                data_changed = True
-                self.feed_rate_max["b"] = pos_b
-
-        if data_changed:
-            self.on_update_callback("feed_rate_max:x", self.feed_rate_max["x"])
-            self.on_update_callback("feed_rate_max:y", self.feed_rate_max["y"])
-            self.on_update_callback("feed_rate_max:z", self.feed_rate_max["z"])
-            self.on_update_callback("feed_rate_max:a", self.feed_rate_max["a"])
-            self.on_update_callback("feed_rate_max:b", self.feed_rate_max["b"])
-            self.on_update_callback("feed_rate_max", self.feed_rate_max)
+        self._set_row(FEED_RATE_MAX, feedrate)
 
     @property
-    def feed_rate_accel(self) -> Dict[str, float]:
+    def feed_rate_accel(self) -> Position:
         """ Getter. """
-        return self.__feed_rate_accel
+        return self._position(FEED_RATE_ACCEL)
 
     @feed_rate_accel.setter
-    def feed_rate_accel(self, feedrate: Dict[str, float]) -> None:
+    def feed_rate_accel(self, feedrate: Mapping[str, float]) -> None:
         """ Setter. """
-        data_changed = False
-        pos_x = feedrate.get("x")
-        pos_y = feedrate.get("y")
-        pos_z = feedrate.get("z")
-        pos_a = feedrate.get("a")
-        pos_b = feedrate.get("b")
-        if pos_x is not None and self.feed_rate_accel["x"] != pos_x:
-            data_changed = True
-            self.feed_rate_accel["x"] = pos_x
-        if pos_y is not None and self.feed_rate_accel["y"] != pos_y:
-            data_changed = True
-            self.feed_rate_accel["y"] = pos_y
-        if pos_z is not None and self.feed_rate_accel["z"] != pos_z:
-            data_changed = True
-            self.feed_rate_accel["z"] = pos_z
-        if pos_a is not None and self.feed_rate_accel["a"] != pos_a:
-            data_changed = True
-            self.feed_rate_accel["a"] = pos_a
-        if pos_b is not None and self.feed_rate_accel["b"] != pos_b:
-            data_changed = True
-            self.feed_rate_accel["b"] = pos_b
-
-        if data_changed:
-            self.on_update_callback("feed_rate_accel:x", self.feed_rate_accel["x"])
-            self.on_update_callback("feed_rate_accel:y", self.feed_rate_accel["y"])
-            self.on_update_callback("feed_rate_accel:z", self.feed_rate_accel["z"])
-            self.on_update_callback("feed_rate_accel:a", self.feed_rate_accel["a"])
-            self.on_update_callback("feed_rate_accel:b", self.feed_rate_accel["b"])
-            self.on_update_callback("feed_rate_accel", self.feed_rate_accel)
+        self._set_row(FEED_RATE_ACCEL, feedrate)
+
+    @property
+    def overrides(self) -> Overrides:
+        """ Feed, rapid and spindle overrides together. """
+        return Overrides(self.__feed_override, self.__rapid_override, self.__spindle_override)
 
     @property
     def feed_override(self) -> float:
@@ -465,7 +450,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__feed_override != feed_override:
             self.__feed_override = feed_override
-            self.on_update_callback("feed_override", self.feed_override)
+            self._publish("feed_override", self.feed_override)
 
     @property
     def rapid_override(self) -> float:
@@ -477,7 +462,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__rapid_override != rapid_override:
             self.__rapid_override = rapid_override
-            self.on_update_callback("rapid_override", self.rapid_override)
+            self._publish("rapid_override", self.rapid_override)
 
     @property
     def spindle_rate(self) -> float:
@@ -489,7 +474,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__spindle_rate != spindle_rate:
             self.__spindle_rate = spindle_rate
-            self.on_update_callback("spindle_rate", self.spindle_rate)
+            self._publish("spindle_rate", self.spindle_rate)
 
     @property
     def spindle_override(self) -> float:
@@ -501,7 +486,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__spindle_override != spindle_override:
             self.__spindle_override = spindle_override
-            self.on_update_callback("spindle_override", self.spindle_override)
+            self._publish("spindle_override", self.spindle_override)
 
     @property
     def limit_x(self) -> float:
@@ -513,7 +498,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__limit_x != limit_x:
             self.__limit_x = limit_x
-            self.on_update_callback("limit_x", self.limit_x)
+            self._publish("limit_x", self.limit_x)
 
     @property
     def limit_y(self) -> float:
@@ -525,7 +510,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__limit_y != limit_y:
             self.__limit_y = limit_y
-            self.on_update_callback("limit_y", self.limit_y)
+            self._publish("limit_y", self.limit_y)
 
     @property
     def limit_z(self) -> float:
@@ -537,7 +522,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__limit_z != limit_z:
             self.__limit_z = limit_z
-            self.on_update_callback("limit_z", self.limit_z)
+            self._publish("limit_z", self.limit_z)
 
     @property
     def limit_a(self) -> float:
@@ -549,7 +534,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__limit_a != limit_a:
             self.__limit_a = limit_a
-            self.on_update_callback("limit_a", self.limit_a)
+            self._publish("limit_a", self.limit_a)
 
     @property
     def limit_b(self) -> float:
@@ -561,7 +546,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__limit_b != limit_b:
             self.__limit_b = limit_b
-            self.on_update_callback("limit_b", self.limit_b)
+            self._publish("limit_b", self.limit_b)
 
     @property
     def probe(self) -> bool:
@@ -573,7 +558,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__probe != probe:
             self.__probe = probe
-            self.on_update_callback("probe", self.probe)
+            self._publish("probe", self.probe)
 
     @property
     def pause(self) -> bool:
@@ -585,10 +570,10 @@ class StateMachineBase:
         """ Setter. """
         if self.__pause != pause:
             self.__pause = pause
-            self.on_update_callback("pause", self.pause)
+            self._publish("pause", self.pause)
             if not pause:
-                self.pause_reason.clear()
-                self.on_update_callback("pause_reason", self.pause_reason)
+                self.pause_reason = ()
+                self._publish("pause_reason", self.pause_reason)
 
     @property
     def pause_park(self) -> bool:
@@ -600,7 +585,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__pause_park != pause_park:
             self.__pause_park = pause_park
-            self.on_update_callback("pause_park", self.pause_park)
+            self._publish("pause_park", self.pause_park)
 
     @property
     def parking(self) -> bool:
@@ -612,7 +597,7 @@ class StateMachineBase:
         """ Setter. """
         if self.__parking != parking:
             self.__parking = parking
-            self.on_update_callback("parking", self.parking)
+            self._publish("parking", self.parking)
 
     @property
     def halt(self) -> bool:
@@ -624,10 +609,10 @@ class StateMachineBase:
         """ Setter. """
         if self.__halt != halt:
             self.__halt = halt
-            self.on_update_callback("halt", self.halt)
+            self._publish("halt", self.halt)
             if not halt:
-                self.halt_reason.clear()
-                self.on_update_callback("halt_reason", self.halt_reason)
+                self.halt_reason = ()
+                self._publish("halt_reason", self.halt_reason)
 
     @property
     def door(self) -> bool:
@@ -639,7 +624,63 @@ class StateMachineBase:
         """ Setter. """
         if self.__door != door:
             self.__door = door
-            self.on_update_callback("door", self.door)
+            self._publish("door", self.door)
+
+
+def _grbl_int(value: bytes) -> int:
+    """ Parse an integer or mask setting. """
+    return int(float(value))
+
+def _grbl_bool(value: bytes) -> bool:
+    """ Parse a boolean setting. """
+    return bool(int(value))
+
+# A Grbl "$" setting. `parse` converts the value Grbl reports.
+GrblSetting = namedtuple("GrblSetting", ["name", "parse", "unit"])
+
+# Grbl 1.1 settings. {register: GrblSetting}
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Configuration
+GRBL_SETTINGS: Dict[int, GrblSetting] = {
+    0: GrblSetting("step_pulse", _grbl_int, "microseconds"),
+    1: GrblSetting("step_idle_delay", _grbl_int, "milliseconds"),
+    2: GrblSetting("step_port_invert", _grbl_int, "mask"),
+    3: GrblSetting("direction_port_invert", _grbl_int, "mask"),
+    4: GrblSetting("step_enable_invert", _grbl_bool, "boolean"),
+    5: GrblSetting("limit_pins_invert", _grbl_bool, "boolean"),
+    6: GrblSetting("probe_pin_invert", _grbl_bool, "boolean"),
+    10: GrblSetting("status_report", _grbl_int, "mask"),
+    11: GrblSetting("junction_deviation", float, "mm"),
+    12: GrblSetting("arc_tolerance", float, "mm"),
+    13: GrblSetting("report_inches", _grbl_bool, "boolean"),
+    20: GrblSetting("soft_limits", _grbl_bool, "boolean"),
+    21: GrblSetting("hard_limits", _grbl_bool, "boolean"),
+    22: GrblSetting("homing_cycle", _grbl_bool, "boolean"),
+    23: GrblSetting("homing_dir_invert", _grbl_int, "mask"),
+    24: GrblSetting("homing_feed", float, "mm/min"),
+    25: GrblSetting("homing_seek", float, "mm/min"),
+    26: GrblSetting("homing_debounce", _grbl_int, "milliseconds"),
+    27: GrblSetting("homing_pull_off", float, "mm"),
+    30: GrblSetting("max_spindle_speed", float, "RPM"),
+    31: GrblSetting("min_spindle_speed", float, "RPM"),
+    32: GrblSetting("laser_mode", _grbl_bool, "boolean"),
+    }
+
+# Settings with a register for each axis. The register is the base plus the
+# axis' index. eg: $111 is the Y axis max_rate. {base_register: GrblSetting}
+GRBL_AXIS_SETTINGS: Dict[int, GrblSetting] = {
+    100: GrblSetting("steps_per_mm", float, "steps/mm"),
+    110: GrblSetting("max_rate", float, "mm/min"),
+    120: GrblSetting("acceleration", float, "mm/sec^2"),
+    130: GrblSetting("max_travel", float, "mm"),
+    }
+
+# Per axis settings that also set a state machine property.
+# {setting_name: property_name}
+GRBL_AXIS_SETTING_PROPERTIES: Dict[str, str] = {
+    "max_rate": "feed_rate_max",
+    "acceleration": "feed_rate_accel",
+    "max_travel": "machine_pos_max",
+    }
 
 
 class StateMachineGrbl(StateMachineBase):
@@ -660,11 +701,36 @@ class StateMachineGrbl(StateMachineBase):
     MACHINE_STATES = [
         b"Idle", b"Run", b"Hold", b"Jog", b"Alarm", b"Door", b"Check", b"Home", b"Sleep"]
 
-    def __init__(self, on_update_callback: Callable[[str, Any], None]) -> None:
-        super().__init__(on_update_callback)
+    # Status reports as Grbl sends them while running a job. Fields are in the
+    # order Grbl always sends them.
+    # eg: b"<Run|MPos:1.000,2.000,3.000|Bf:15,128|FS:500,0|WCO:0.000,0.000,0.000>"
+    # Reports with other fields take the slower `_parse_status_fields()`.
+    STATUS_REPORT = re.compile(
+        rb"<(\w+(?::\d)?)"                  # State, optional sub-state.
+        rb"\|(MPos|WPos):([-.,0-9]+)"        # Position.
+        rb"(?:\|Bf:\d+,\d+)?"                # Buffer state. Not used.
+        rb"(?:\|Ln:\d+)?"                    # Line number. Not used.
+        rb"(?:\|FS?:([.0-9]+)(?:,([.0-9]+))?)?"  # Feed, optional spindle.
+        rb"(?:\|WCO:([-.,0-9]+))?"           # Work coordinate offset.
+        rb"(?:\|Ov:([,0-9]+))?"              # Overrides.
+        rb">")
+
+    def __init__(self,
+                 on_update_callback: Callable[[str, Any], None],
+                 axes: Sequence[str] = AXES) -> None:
+        super().__init__(on_update_callback, axes)
 
         self.machine_state = b"Unknown"
 
+        self.__settings: Settings = Settings({})
+        # Every "$" setting as Grbl reported it. {register: value}
+        self.setting_registers: Dict[str, str] = {}
+        # Raw "$" settings received since the last "$$" report completed.
+        # {register: value}
+        self._pending_settings: Dict[bytes, bytes] = {}
+
+        self.__offsets: Offsets = Offsets({})
+
     def __str__(self) -> str:
         output = super().__str__()
 
@@ -697,31 +763,71 @@ class StateMachineGrbl(StateMachineBase):
 
     def _parse_incoming_status(self, incoming: bytes) -> None:
         """ "parse_incoming" determined a "status" message was received from the
-        Grbl controller. Parse the status message here. """
+        Grbl controller. Parse the status message here.
+        Sent several times a second so common reports are parsed in one pass
+        by a precompiled regular expression. """
+        match = self.STATUS_REPORT.fullmatch(incoming)
+        if match is None:
+            self._parse_status_fields(incoming)
+            return
+
+        state, position_type, position, feed, spindle, offset, overrides = match.groups()
+        with self.batch():
+            self._set_state(state)
+
+            # Coordinates are the same as the last report while the machine
+            # is idle so compare the bytes before parsing.
+            row = MACHINE_POS if position_type == b"MPos" else WORK_POS
+            if position != self._row_bytes[row]:
+                self._load_bytes(position)
+                if row == MACHINE_POS:
+                    self._update_machine_pos()
+                else:
+                    self._update_work_pos()
+                self._row_bytes[row] = position
+
+            if feed is not None:
+                self.feed_rate = int(float(feed))
+                if spindle is not None:
+                    self.spindle_rate = int(float(spindle))
+
+            if offset is not None and offset != self._row_bytes[WORK_OFFSET]:
+                self._load_bytes(offset)
+                self._update_work_offset()
+                self._row_bytes[WORK_OFFSET] = offset
+
+            if overrides is not None:
+                self._set_overrides(overrides)
+
+        self.changes_made = True
+
+    def _parse_status_fields(self, incoming: bytes) -> None:
+        """ Parse any status message one field at a time. """
         assert incoming.startswith(b"<") and incoming.endswith(b">")
 
         incoming = incoming.strip(b"<>")
 
         fields = incoming.split(b"|")
 
-        machine_state = fields[0]
-        self._set_state(machine_state)
-
-        for field in fields[1:]:
-            identifier, value = field.split(b":")
-            assert identifier in self.GRBL_STATUS_HEADERS
-            if identifier in [b"MPos", b"WPos", b"WCO"]:
-                self._set_coordinates(identifier, value)
-            elif identifier == b"Ov":
-                self._set_overrides(value)
-            elif identifier == b"FS":
-                feed, spindle = value.split(b",")
-                self.feed_rate = int(float(feed))
-                self.spindle_rate = int(float(spindle))
-            elif identifier == b"F":
-                self.feed_rate = int(float(value))
-            else:
-                print("TODO. Unparsed status field: ", identifier, value)
+        with self.batch():
+            machine_state = fields[0]
+            self._set_state(machine_state)
+
+            for field in fields[1:]:
+                identifier, value = field.split(b":")
+                assert identifier in self.GRBL_STATUS_HEADERS
+                if identifier in [b"MPos", b"WPos", b"WCO"]:
+                    self._set_coordinates(identifier, value)
+                elif identifier == b"Ov":
+                    self._set_overrides(value)
+                elif identifier == b"FS":
+                    feed, spindle = value.split(b",")
+                    self.feed_rate = int(float(feed))
+                    self.spindle_rate = int(float(spindle))
+                elif identifier == b"F":
+                    self.feed_rate = int(float(value))
+                else:
+                    print("TODO. Unparsed status field: ", identifier, value)
 
         self.changes_made = True
 
@@ -740,21 +846,22 @@ class StateMachineGrbl(StateMachineBase):
             units: Dict[str, Any] = self.MODAL_GROUPS["units"]
             if modal.decode() in units:
                 modal_group = self.MODAL_COMMANDS[modal]
-                if modal_group in self.gcode_modal and \
-                        self.gcode_modal[modal_group] != modal:
+                if modal_group in self._modal and \
+                        self._modal[modal_group] != modal:
                     # Grbl has changed from mm to inches or vice versa.
                     update_units = True
 
             if modal in self.MODAL_COMMANDS:
                 modal_group = self.MODAL_COMMANDS[modal]
-                self.gcode_modal[modal_group] = modal
+                self._modal[modal_group] = modal
             elif chr(modal[0]).encode('utf-8') in self.MODAL_COMMANDS:
                 modal_group = self.MODAL_COMMANDS[chr(modal[0]).encode('utf-8')]
-                self.gcode_modal[modal_group] = modal
+                self._modal[modal_group] = modal
             else:
                 assert False, "Gcode word does not match any mmodal group: %s" % \
                               modal.decode('utf-8')
-        self.on_update_callback("gcode_modal", self.gcode_modal)
+        # Always published so activating the controller can replay it.
+        self._publish_modal(force=True)
 
         assert not update_units, \
                "TODO: Units have changed. Lots of things will need recalculated."
@@ -766,7 +873,7 @@ class StateMachineGrbl(StateMachineBase):
 
         incoming = incoming.strip(b"[]")
 
-        msg_type, msg = incoming.split(b":")
+        msg_type, msg = incoming.split(b":", 1)
 
         if msg_type == b"MSG":
             print(msg_type, incoming, "TODO")
@@ -778,7 +885,7 @@ class StateMachineGrbl(StateMachineBase):
         elif msg_type in [b"G54", b"G55", b"G56", b"G57", b"G58", b"G59", b"G28",
                           b"G30", b"G92", b"TLO", b"PRB"]:
             # Response to a "$#" command.
-            print(msg_type, incoming, "TODO")
+            self._parse_offset(msg_type, msg)
         elif msg_type == b"VER":
             if len(self.version) < 1:
                 self.version.append("")
@@ -790,6 +897,10 @@ class StateMachineGrbl(StateMachineBase):
         elif msg_type == b"echo":
             # May be enabled when building GRBL as a debugging option.
             pass
+        elif msg_type == b"sentSettings":
+            # Not sent by Grbl. The controller adds this when a "$$" report is
+            # acknowledged.
+            self._apply_settings()
         else:
             assert False, "Unexpected feedback packet type: %s" % msg_type.decode('utf-8')
 
@@ -799,123 +910,102 @@ class StateMachineGrbl(StateMachineBase):
         Grbl controller. Parse the alarm here. """
         print("ALARM:", incoming)
 
+    @property
+    def offsets(self) -> Offsets:
+        """ Coordinate systems and offsets from Grbl's "$#" report.
+        {"G54": Position, ..., "TLO": float, "PRB": Position} """
+        return self.__offsets
+
+    def _parse_offset(self, name: bytes, msg: bytes) -> None:
+        """ One line of a "$#" report. eg: "G54:4.000,0.000,0.000", "TLO:0.000",
+        "PRB:0.000,0.000,0.000:0". The probe's success flag is not kept. """
+        values = msg.split(b":", 1)[0].split(b",")
+        value: Any
+        if len(values) == 1:
+            value = float(values[0])
+        else:
+            value = Position([float(value) for value in values], self.axes)
+
+        key = name.decode('utf-8')
+        if self.__offsets.get(key) != value:
+            offsets = dict(self.__offsets)
+            offsets[key] = value
+            self.__offsets = Offsets(offsets)
+            self._publish("offsets", self.__offsets)
+
+    @property
+    def identity(self) -> Optional[str]:
+        """ Identifies the machine by the build info Grbl reports in response
+        to "$I". None until it has been received. """
+        if not self.version or not self.version[0]:
+            return None
+        return "|".join(self.version)
+
+    def load_settings(self, registers: Mapping[str, str]) -> None:
+        """ Apply settings as if Grbl had sent them in a "$$" report.
+        Args:
+            registers: {register: value} as in `setting_registers`. """
+        for register, value in registers.items():
+            self._pending_settings[register.encode('utf-8')] = value.encode('utf-8')
+        self._apply_settings()
+
+    @property
+    def settings(self) -> Settings:
+        """ Grbl's "$" settings. {name: value} See GRBL_SETTINGS.
+        Per axis settings are named "name:axis". eg: "max_travel:x". """
+        return self.__settings
+
     def _parse_setting(self, incoming: bytes) -> None:
         """ "parse_incoming" determined one of the EPROM registers is being displayed.
-        Parse and save the value here. """
-        incoming = incoming.lstrip(b"$")
-        setting, value = incoming.split(b"=")
-
-        if setting == b"0":
-            # Step pulse, microseconds
-            pass
-        elif setting == b"1":
-            # Step idle delay, milliseconds
-            pass
-        elif setting == b"2":
-            # Step port invert, mask
-            pass
-        elif setting == b"3":
-            # Direction port invert, mask
-            pass
-        elif setting == b"4":
-            # Step enable invert, boolean
-            pass
-        elif setting == b"5":
-            # Limit pins invert, boolean
-            pass
-        elif setting == b"6":
-            # Probe pin invert, boolean
-            pass
-        elif setting == b"10":
-            # Status report, mask
-            pass
-        elif setting == b"11":
-            # Junction deviation, mm
-            pass
-        elif setting == b"12":
-            # Arc tolerance, mm
-            pass
-        elif setting == b"13":
-            # Report inches, boolean
-            pass
-        elif setting == b"20":
-            # Soft limits, boolean
-            pass
-        elif setting == b"21":
-            # Hard limits, boolean
-            pass
-        elif setting == b"22":
-            # Homing cycle, boolean
-            pass
-        elif setting == b"23":
-            # Homing dir invert, mask
-            pass
-        elif setting == b"24":
-            # Homing feed, mm/min
-            pass
-        elif setting == b"25":
-            # Homing seek, mm/min
-            pass
-        elif setting == b"26":
-            # Homing debounce, milliseconds
-            pass
-        elif setting == b"27":
-            # Homing pull-off, mm
-            pass
-        elif setting == b"30":
-            # Max spindle speed, RPM
-            pass
-        elif setting == b"31":
-            # Min spindle speed, RPM
-            pass
-        elif setting == b"32":
-            # Laser mode, boolean
-            pass
-        elif setting == b"100":
-            # X steps/mm
-            pass
-        elif setting == b"101":
-            # Y steps/mm
-            pass
-        elif setting == b"102":
-            # Z steps/mm
-            pass
-        elif setting == b"110":
-            # X Max rate, mm/min
-            value_int = int(float(value))
-            self.feed_rate_max = {"x": value_int}
-        elif setting == b"111":
-            # Y Max rate, mm/min
-            value_int = int(float(value))
-            self.feed_rate_max = {"y": value_int}
-        elif setting == b"112":
-            # Z Max rate, mm/min
-            value_int = int(float(value))
-            self.feed_rate_max = {"z": value_int}
-        elif setting == b"120":
-            # X Acceleration, mm/sec^2
-            value_int = int(float(value))
-            self.feed_rate_accel = {"x": value_int}
-        elif setting == b"121":
-            # Y Acceleration, mm/sec^2
-            value_int = int(float(value))
-            self.feed_rate_accel = {"y": value_int}
-        elif setting == b"122":
-            # Z Acceleration, mm/sec^2
-            value_int = int(float(value))
-            self.feed_rate_accel = {"z": value_int}
-        elif setting == b"130":
-            # X Max travel, mm
-            pass
-        elif setting == b"131":
-            # Y Max travel, mm
-            pass
-        elif setting == b"132":
-            # Z Max travel, mm
-            pass
-        else:
-            assert False, "Unexpected setting: %s %s" % (
-                setting.decode('utf-8'), value.decode('utf-8'))
+        Held until the whole "$$" report has arrived. See `_apply_settings()`. """
+        register, value = incoming[1:].split(b"=", 1)
+        self._pending_settings[register] = value
+
+    def _decode_setting(self, register: bytes, value: bytes) -> Tuple[str, Any]:
+        """ Name and value of a "$" setting.
+        Registers not in GRBL_SETTINGS or GRBL_AXIS_SETTINGS are named after
+        the register and keep the value as a string. eg: Startup blocks, "$N0". """
+        if register.isdigit():
+            number = int(register)
+            setting = GRBL_SETTINGS.get(number)
+            if setting is not None:
+                return setting.name, setting.parse(value)
+
+            base, index = number - number % 10, number % 10
+            setting = GRBL_AXIS_SETTINGS.get(base)
+            if setting is not None and index < len(self.axes):
+                return "%s:%s" % (setting.name, self.axes[index]), setting.parse(value)
+
+        return "$%s" % register.decode('utf-8'), value.decode('utf-8')
+
+    def _apply_settings(self) -> None:
+        """ A "$$" report has been received. Store every setting in it and
+        update the properties derived from them, then publish the lot as a
+        single "settings" event. """
+        pending = self._pending_settings
+        if not pending:
+            return
+        self._pending_settings = {}
+
+        settings = dict(self.__settings)
+        # {property_name: {axis: value}}
+        axis_properties: Dict[str, Dict[str, float]] = {}
+        for register, value in pending.items():
+            self.setting_registers[register.decode('utf-8')] = value.decode('utf-8')
+            name, parsed = self._decode_setting(register, value)
+            settings[name] = parsed
+
+            setting_name, _, axis = name.partition(":")
+            if axis and setting_name in GRBL_AXIS_SETTING_PROPERTIES:
+                prop = GRBL_AXIS_SETTING_PROPERTIES[setting_name]
+                axis_properties.setdefault(prop, {})[axis] = parsed
+
+        with self.batch():
+            for prop, values in axis_properties.items():
+                setattr(self, prop, values)
+            if settings != self.__settings:
+                self.__settings = Settings(settings)
+                self._publish("settings", self.__settings)
 
     @staticmethod
     def _parse_startup(incoming: bytes) -> None:
@@ -940,43 +1030,31 @@ class StateMachineGrbl(StateMachineBase):
         rapid_override_int = int(float(rapid_override))
         spindle_override_int = int(float(spindle_override))
 
+        overrides = self.overrides
         if 10 <= feed_override_int <= 200:
             self.feed_override = feed_override_int
         if rapid_override_int in [100, 50, 20]:
             self.rapid_override = rapid_override_int
         if 10 <= spindle_override_int <= 200:
             self.spindle_override = spindle_override_int
+        if self.overrides != overrides:
+            self._publish("overrides", self.overrides)
 
     def _set_coordinates(self, identifier: bytes, value: bytes) -> None:
         """ Set machine position according to message received from Grbl controller. """
         if identifier == b"MPos":
-            self.machine_pos = self._parse_coordinates(value)
+            self._load_bytes(value)
+            self._update_machine_pos()
         elif identifier == b"WPos":
-            self.work_pos = self._parse_coordinates(value)
+            self._load_bytes(value)
+            self._update_work_pos()
         elif identifier == b"WCO":
-            self.work_offset = self._parse_coordinates(value)
+            self._load_bytes(value)
+            self._update_work_offset()
         else:
             print("Invalid format: %s  Expected one of [MPos, WPos, WCO]" %
                   identifier.decode('utf-8'))
 
-    @staticmethod
-    def _parse_coordinates(string: bytes) -> Dict[str, float]:
-        """ Parse bytes for coordinate information. """
-        parts = string.split(b",")
-        if len(parts) < 3:
-            print(string, parts)
-        assert len(parts) >= 3, \
-               "Malformed coordinates: %s" % string.decode('utf-8')
-        assert len(parts) <= 4, \
-               "TODO: Handle more than 4 coordinates. %s" % string.decode('utf-8')
-        coordinates = {}
-        coordinates["x"] = float(parts[0])
-        coordinates["y"] = float(parts[1])
-        coordinates["z"] = float(parts[2])
-        if len(parts) > 3:
-            coordinates["a"] = float(parts[3])
-        return coordinates
-
     def _set_state(self, state: bytes) -> None:
         """ Apply State. State has been reported by Grbl controller. """
         states = state.split(b":")
@@ -0,0 +1,110 @@
+""" A Coordinator that runs on an asyncio event loop.
+Component methods may be plain functions, as used by the regular Coordinator,
+or coroutines. Coroutines are awaited; plain functions are called as normal so
+existing plugins work unchanged. """
+
+from typing import Any, Optional
+import asyncio
+import inspect
+import threading
+import time
+
+from core.coordinator import Coordinator
+
+
+class AsyncCoordinator(Coordinator):
+    """ A Coordinator that runs on an asyncio event loop.
+    Serial port controllers run their I/O as tasks on the same loop rather
+    than in a thread per serial port. """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup_async: Optional[asyncio.Event] = None
+
+    def _on_wake(self) -> None:
+        """ Called by `wake()`, possibly from another thread. """
+        if self._loop and self._wakeup_async:
+            self._loop.call_soon_threadsafe(self._wakeup_async.set)
+
+    async def update_components_async(self) -> bool:
+        """ Iterate through all components, delivering and acting upon events.
+        Any component methods that return coroutines are awaited. """
+        if self._wakeup_async:
+            self._wakeup_async.clear()
+
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.start_tick()
+
+        steps = self._update_steps()
+        result = None
+        try:
+            while True:
+                label, phase, function = steps.send(result)
+                if instrumentation is None:
+                    result = function()
+                    if inspect.isawaitable(result):
+                        result = await result
+                else:
+                    start = time.perf_counter()
+                    result = function()
+                    if inspect.isawaitable(result):
+                        result = await result
+                    instrumentation.record_phase(label, phase, time.perf_counter() - start)
+        except StopIteration:
+            pass
+
+        if instrumentation is not None:
+            instrumentation.end_tick()
+
+        return self.running
+
+    async def wait_async(self) -> None:
+        """ Sleep until there is work to do, letting other tasks run meanwhile.
+        Returns when a component calls `wake()`, when the soonest update
+        requested by `next_update_in()` or `call_later()` is due or after
+        MAX_IDLE_WAIT. """
+        assert self._wakeup_async, "Not running."
+        timeout = self._wait_timeout()
+        if timeout <= 0 or self._wakeup.is_set():
+            # Still give other tasks a chance to run.
+            await asyncio.sleep(0)
+            return
+
+        if self._clock[0].virtual:
+            # Simulated time. Skip straight to the next update.
+            self._clock[0].wait(self._wakeup, timeout)
+            await asyncio.sleep(0)
+            return
+
+        try:
+            await asyncio.wait_for(self._wakeup_async.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup_async.clear()
+
+    async def close_async(self) -> None:
+        """ Cleanup components on shutdown. """
+        for controller in self.controllers.values():
+            result = controller.disconnect()
+            if inspect.isawaitable(result):
+                await result
+        for terminal in self.terminals.values():
+            result = terminal.close()
+            if inspect.isawaitable(result):
+                await result
+
+    async def run(self) -> None:
+        """ Main program loop. Runs until a terminal requests exit. """
+        self._loop = asyncio.get_running_loop()
+        self._consumer_thread[0] = threading.get_ident()
+        self._wakeup_async = asyncio.Event()
+        self._wakeup_callbacks.append(self._on_wake)
+        try:
+            while await self.update_components_async():
+                await self.wait_async()
+        finally:
+            self._wakeup_callbacks.remove(self._on_wake)
+            await self.close_async()
@@ -0,0 +1,76 @@
+""" Clocks shared by every component and controller.
+`_ComponentBase.set_clock()` replaces the clock for the whole system. """
+
+from typing import Optional
+import threading
+import time
+
+
+class Clock:
+    """ Real time. """
+
+    # True for clocks that don't follow the wall clock.
+    virtual = False
+
+    def time(self) -> float:
+        """ Seconds since the epoch. """
+        return time.time()
+
+    def monotonic(self) -> float:
+        """ Seconds from an arbitrary reference point. Never goes backwards. """
+        return time.monotonic()
+
+    def perf_counter(self) -> float:
+        """ High resolution `monotonic()`. """
+        return time.perf_counter()
+
+    def sleep(self, seconds: float) -> None:
+        """ Block for `seconds`. """
+        time.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: Optional[float]) -> bool:
+        """ Block until `event` is set or `timeout` seconds have passed.
+        Returns:
+            True if `event` was set. """
+        return event.wait(timeout)
+
+
+class VirtualClock(Clock):
+    """ Simulated time. Only moves when advanced.
+    Sleeping and waiting advance the clock instantly rather than blocking so
+    a Coordinator's main loop runs as fast as possible while components see
+    time pass as if it were running in real time. """
+
+    virtual = True
+
+    def __init__(self, now: float = 0.0, epoch: Optional[float] = None) -> None:
+        # Seconds since the clock started.
+        self.now = now
+        # `time()` when the clock started.
+        self.epoch = time.time() if epoch is None else epoch
+
+    def time(self) -> float:
+        return self.epoch + self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        """ Move time forward by `seconds`. """
+        if seconds > 0:
+            self.now += seconds
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    def wait(self, event: threading.Event, timeout: Optional[float]) -> bool:
+        """ Return immediately. If `event` is not yet set, time moves forward
+        by `timeout` as if nothing happened in the meantime. """
+        if event.is_set():
+            return True
+        if timeout is not None:
+            self.advance(timeout)
+        return event.is_set()
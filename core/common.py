@@ -1,8 +1,9 @@
 """ Misc library methods. """
 
-from typing import Any, Set, Iterator
-import pkgutil
+from typing import Any, Set, Iterator, Dict, List, Optional, Tuple
+import ast
 import importlib
+import json
 import os
 import sys
 import inspect
@@ -24,13 +25,207 @@ def get_component_from_module(module: Any) -> Iterator[_ComponentBase]:
             if is_valid_plugin:
                 yield object_
 
+# Simple class attributes read from plugin source without importing it.
+MANIFEST_ATTRIBUTES = ("is_valid_plugin", "active_by_default", "plugin_type",
+                       "label", "description")
+
+# Discovered plugins are cached in this file in each plugin directory's
+# __pycache__. Bump PLUGIN_CACHE_VERSION if the cache format changes.
+PLUGIN_CACHE = "plugins.json"
+PLUGIN_CACHE_VERSION = 1
+
+class PluginSpec:
+    """ A plugin class that has been found but not yet imported.
+    The module containing the plugin is only imported when the class is
+    needed. eg: When instantiating it or reading an attribute that could not be
+    determined from the source. """
+
+    def __init__(self,
+                 module_name: str,
+                 class_name: str,
+                 plugin_type: str,
+                 attributes: Dict[str, Any]) -> None:
+        self._module_name = module_name
+        self._class_name = class_name
+        self.plugin_type = plugin_type
+        self._attributes = attributes
+        self._class: Optional[Any] = None
+
+    def load(self) -> Any:
+        """ Import the plugin's module and return the plugin class. """
+        if self._class is None:
+            module = importlib.import_module(self._module_name)
+            self._class = getattr(module, self._class_name)
+        return self._class
+
+    def get_classname(self) -> str:
+        """ Return class name. """
+        return self._class_name
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        """ Instantiate the plugin. """
+        return self.load()(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name in self._attributes:
+            return self._attributes[name]
+        return getattr(self.load(), name)
+
+    def __eq__(self, other: Any) -> bool:
+        return (isinstance(other, PluginSpec) and
+                (self._module_name, self._class_name) ==
+                (other._module_name, other._class_name))
+
+    def __hash__(self) -> int:
+        return hash((self._module_name, self._class_name))
+
+    def __repr__(self) -> str:
+        return "PluginSpec(%s.%s)" % (self._module_name, self._class_name)
+
+def read_classes(filename: str) -> Dict[str, Tuple[List[str], Dict[str, Any]]]:
+    """ Parse a source file without importing it.
+    Returns:
+        {class_name: ([base_class_names], {attribute: value})} for every class
+        in the file. Attributes are those in MANIFEST_ATTRIBUTES that are set
+        to a literal value in the class body. """
+    with open(filename) as source_file:
+        tree = ast.parse(source_file.read(), filename)
+
+    classes = {}
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = []
+        for base in node.bases:
+            if isinstance(base, ast.Name):
+                bases.append(base.id)
+            elif isinstance(base, ast.Attribute):
+                bases.append(base.attr)
+        attributes = {}
+        for statement in node.body:
+            if isinstance(statement, ast.Assign):
+                targets = statement.targets
+            elif isinstance(statement, ast.AnnAssign) and statement.value:
+                targets = [statement.target]
+            else:
+                continue
+            for target in targets:
+                if isinstance(target, ast.Name) and target.id in MANIFEST_ATTRIBUTES:
+                    try:
+                        value = ast.literal_eval(statement.value)
+                    except ValueError:
+                        continue
+                    # Only keep values that survive a round trip through the cache.
+                    if isinstance(value, (str, bool, int, float, type(None))):
+                        attributes[target.id] = value
+        classes[node.name] = (bases, attributes)
+    return classes
+
+def _inherited_attributes(class_name: str,
+                          classes: Dict[str, Tuple[List[str], Dict[str, Any]]],
+                          seen: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """ Attributes of a class including those set on base classes we know of. """
+    seen = seen or set()
+    seen.add(class_name)
+    bases, attributes = classes[class_name]
+    resolved: Dict[str, Any] = {}
+    for base in reversed(bases):
+        if base in classes and base not in seen:
+            resolved.update(_inherited_attributes(base, classes, seen))
+    resolved.update(attributes)
+    return resolved
+
+def read_manifest(filename: str,
+                  base_classes: Optional[Dict[str, Tuple[List[str], Dict[str, Any]]]] = None
+                  ) -> Dict[str, Dict[str, Any]]:
+    """ Find plugin classes in a source file without importing it.
+    Args:
+        filename: Source file.
+        base_classes: Classes from other files, as returned by read_classes(),
+            whose attributes may be inherited by classes in this file.
+    Returns:
+        {class_name: {attribute: value}} for every class in the file that sets
+        or inherits `is_valid_plugin = True`. """
+    file_classes = read_classes(filename)
+    classes = dict(base_classes or {})
+    classes.update(file_classes)
+
+    manifest = {}
+    for class_name in file_classes:
+        attributes = _inherited_attributes(class_name, classes)
+        if attributes.get("is_valid_plugin") is True:
+            manifest[class_name] = attributes
+    return manifest
+
+def _fingerprint(full_dir: str) -> Dict[str, List[int]]:
+    """ Modification time and size of every source file in a directory. """
+    files = {}
+    for entry in os.scandir(full_dir):
+        if entry.name.endswith(".py") and entry.is_file():
+            stat = entry.stat()
+            files[entry.name] = [stat.st_mtime_ns, stat.st_size]
+    return files
+
+def discover_plugins(full_dir: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """ Find plugin classes in a directory.
+    Results are cached on disk and only recalculated when a source file in the
+    directory is added, removed or modified.
+    Plugins whose filename starts with "_" will be ignored but their classes
+    may still be used as base classes.
+    Returns:
+        {module_name: {class_name: {attribute: value}}} """
+    try:
+        fingerprint = _fingerprint(full_dir)
+    except OSError:
+        return {}
+
+    cache_filename = os.path.join(full_dir, "__pycache__", PLUGIN_CACHE)
+    try:
+        with open(cache_filename) as cache_file:
+            cache = json.load(cache_file)
+        if cache["version"] == PLUGIN_CACHE_VERSION and cache["files"] == fingerprint:
+            return cache["plugins"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    classes_by_file = {filename: read_classes(os.path.join(full_dir, filename))
+                       for filename in fingerprint}
+    all_classes: Dict[str, Tuple[List[str], Dict[str, Any]]] = {}
+    for classes in classes_by_file.values():
+        all_classes.update(classes)
+
+    plugins: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for filename in sorted(fingerprint):
+        if filename.startswith("_"):
+            continue
+        manifest = read_manifest(os.path.join(full_dir, filename), all_classes)
+        if manifest:
+            plugins[filename[:-len(".py")]] = manifest
+
+    try:
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+        with open(cache_filename, "w") as cache_file:
+            json.dump({"version": PLUGIN_CACHE_VERSION,
+                       "files": fingerprint,
+                       "plugins": plugins},
+                      cache_file, indent=1, sort_keys=True)
+    except OSError:
+        # Read only install. Not caching is only a little slower.
+        pass
+
+    return plugins
+
 def load_plugins(directory: str) -> Set[Any]:
-    """ Load plugins.
+    """ Find plugins.
     Plugins whose filename starts with "_" will be ignored.
+    Plugin modules are not imported here. Instead a PluginSpec is returned
+    for each plugin class which imports it on first use.
     Args:
         directory: Directory relative to main.py.
     Returns:
-        A Set of plugins. """
+        A Set of (active_by_default, PluginSpec) tuples. """
 
     print("Loading %s plugins:" % directory)
     plugins: Set[Any] = set([])
@@ -38,27 +233,17 @@ def load_plugins(directory: str) -> Set[Any]:
     full_dir = os.path.join(BASEDIR, directory)
     full_mod_path = full_dir.replace("/", ".").strip(".")
 
-    # for finder, name, ispkg in pkgutil.iter_modules([full_dir]):
-    #    print(finder, name, ispkg, full_mod_path + "." + name)
-
-    discovered_plugins = [
-        importlib.import_module(full_mod_path + "." + name)
-        for finder, name, ispkg in pkgutil.iter_modules([full_mod_path])
-        if name and not name.startswith('_')
-        ]
-    # print(discovered_plugins)
-
-    for module in discovered_plugins:
-        for thing in get_component_from_module(module):
-            if(isinstance(thing.plugin_type, str) and
-               directory.startswith(thing.plugin_type)):
-                active_by_default: bool = True
-                if "active_by_default" in dir(thing):
-                    active_by_default = getattr(thing, "active_by_default")
-
-                if (active_by_default, thing) not in plugins:
-                    print("  type: %s\tname: %s\tactive_by_default: %s\t" %
-                          (thing.plugin_type, thing.get_classname(), active_by_default))
-                    plugins.add((active_by_default, thing))
+    for name, manifest in discover_plugins(full_dir).items():
+        for class_name, attributes in manifest.items():
+            spec = PluginSpec(full_mod_path + "." + name,
+                              class_name,
+                              attributes.get("plugin_type", directory),
+                              attributes)
+            active_by_default: bool = attributes.get("active_by_default", True)
+
+            if (active_by_default, spec) not in plugins:
+                print("  type: %s\tname: %s\tactive_by_default: %s\t" %
+                      (spec.plugin_type, class_name, active_by_default))
+                plugins.add((active_by_default, spec))
 
     return plugins
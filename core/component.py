@@ -1,7 +1,83 @@
 """ Code required by all components. """
 
-from typing import Dict, Any, Tuple, Deque, Optional
+from typing import Dict, Any, Tuple, Deque, Optional, List, Callable
 from collections import deque
+import heapq
+import inspect
+import itertools
+import threading
+import time
+
+from core.clock import Clock
+from core.event_registry import EventRegistry
+from core.inbox import Inbox
+
+
+# Standard values for `_ComponentBase.update_interval`. (seconds)
+# Every iteration of the main loop. eg: Controller I/O.
+UPDATE_REALTIME = 0.0
+# Interactive user interfaces.
+UPDATE_GUI = 1 / 30
+# Slow rendering work. eg: Redrawing the canvas.
+UPDATE_CANVAS = 1 / 5
+# Background tasks.
+UPDATE_HOUSEKEEPING = 1.0
+
+
+class _CoalescableEvent(tuple):  # type: ignore
+    """ A queued (event_name, event_value) that was published with
+    `coalesce=True`. Only these are dropped by the Coordinator when a more
+    recent event of the same name is queued. """
+
+    __slots__ = ()
+
+
+class _Subscriptions(dict):  # type: ignore
+    """ A Dict of event subscriptions that records when it has been modified.
+    The Coordinator uses this to know when it's index of event subscribers needs
+    rebuilt and the owning component when it's dispatch table does. """
+
+    __slots__ = ("_owner",)
+
+    def __init__(self, value: Dict[str, Any], owner: "_ComponentBase") -> None:
+        super().__init__(value)
+        self._owner = owner
+
+    def _changed(self) -> None:
+        self._owner._dispatch.clear()
+        _ComponentBase.subscriptions_changed()
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self._changed()
+
+    def pop(self, *args: Any) -> Any:
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self) -> Tuple[str, Any]:
+        value = super().popitem()
+        self._changed()
+        return value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        value = super().setdefault(key, default)
+        self._changed()
+        return value
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def clear(self) -> None:
+        super().clear()
+        self._changed()
+
 
 class _ComponentBase:
     """ General methods required by all components. """
@@ -10,11 +86,54 @@ class _ComponentBase:
     # Single shared instance for all components.
     _delayed_event_queue: Deque[Event] = deque()
     _event_queue: Deque[Event] = deque()
+    # Events published from threads other than the one running the Coordinator.
+    # Drained into the `_event_queue` by the Coordinator once per update.
+    _inbox = Inbox()
+    # Thread the Coordinator runs on.
+    _consumer_thread = [threading.get_ident(),]
+    # Safety critical events. (event_name, event_value, time.perf_counter() at publish)
+    # Delivered ahead of everything in `_event_queue`.
+    _priority_event_queue: Deque[Tuple[str, Any, float]] = deque()
     _delay_events = [False,]
+    # Incremented whenever any component's event_subscriptions change.
+    _subscriptions_version = [0,]
+    # Number of "state" events published since the queue was last coalesced.
+    _coalesce_pending = [0,]
+    # Set to wake the Coordinator's main loop early.
+    _wakeup = threading.Event()
+    # Additional functions to call on `wake()`. Used by the AsyncCoordinator.
+    _wakeup_callbacks: List[Callable[[], None]] = []
+    # Callbacks scheduled with `call_later()`. Heap of (due_time, sequence, callback).
+    _timers: List[Tuple[float, int, Callable[[], Any]]] = []
+    _timer_sequence = itertools.count()
+    # Time as seen by the Coordinator, components and controllers.
+    # Replaced with a core.clock.VirtualClock when simulating or replaying a
+    # Journal.
+    _clock: List[Clock] = [Clock(),]
+    # Set to a core.journal.Journal to record every published event.
+    _journal: List[Any] = [None,]
+    # The Coordinator's active controller. Read by `poll_state()`.
+    _active_controller: List[Any] = [None,]
+    # The Coordinator's core.instrumentation.Instrumentation, if enabled.
+    # Counts every published event.
+    _instrumentation: List[Any] = [None,]
 
     # Unique copy per instance.
-    event_subscriptions: Dict[str, Any]
+    _event_subscriptions: Dict[str, Any]
     _delivered: Deque[Any]
+    # How to handle each subscribed event in `_update()`.
+    # {event_name: (callback, property_name, default_value, pass_event_name)}
+    _dispatch: Dict[str, Tuple[Optional[Callable[..., None]], str, Any, bool]]
+
+    # Minimum time between calls to `early_update()` and `update()`. (seconds)
+    # Events are still delivered every iteration of the main loop; `on_receive()`
+    # is called straight away but `_update()` runs with the next `update()`.
+    update_interval: float = UPDATE_REALTIME
+
+    # Set False for components that only need `_update()` and `update()` called
+    # when events have been delivered to them or `dirty` is set.
+    # Idle components then cost nothing per iteration of the main loop.
+    needs_tick: bool = True
 
     # Set this True for any derived class that is to be used as a plugin.
     is_valid_plugin = False
@@ -24,10 +143,11 @@ class _ComponentBase:
 
     def __init__(self, label: str) -> None:
         self.label: str = label
+        self._dispatch = {}
 
         # Events to be delivered to this class with callback as value.
         if not hasattr(self, "event_subscriptions"):
-            self.event_subscriptions: Dict[str, Any] = {
+            self.event_subscriptions = {
                 # "$COMPONENTNAME:$DESCRIPTION": ("$CALLBACK", None),
                 # "$COMPONENTNAME:$DESCRIPTION": ("$CALLBACK", $DEFAULTVALUE),
                 # "$COMPONENTNAME:$DESCRIPTION": ("$PROPERTYNAME", $DEFAULTVALUE)
@@ -35,8 +155,44 @@ class _ComponentBase:
 
         self._delivered = deque()
 
+        # Set to have `update()` called at the next opportunity even if no
+        # events arrive. Cleared by the component.
+        self.dirty: bool = False
+
+        # Used by the Coordinator to schedule updates.
+        self._next_update_at: float = 0.0
+        self._due: bool = True
+        self._receive_count: int = -1
+
         self.debug_show_events = False
 
+    @property
+    def event_subscriptions(self) -> Dict[str, Any]:
+        """ Events to be delivered to this class with callback as value. """
+        return self._event_subscriptions
+
+    @event_subscriptions.setter
+    def event_subscriptions(self, value: Dict[str, Any]) -> None:
+        """ Setter. """
+        self._dispatch = {}
+        self._event_subscriptions = _Subscriptions(value, self)
+        self.subscriptions_changed()
+
+    @classmethod
+    def subscriptions_changed(cls) -> None:
+        """ Flag that the event subscriptions of some component have changed or
+        a component has been added or removed. """
+        _ComponentBase._subscriptions_version[0] += 1
+
+    @classmethod
+    def set_clock(cls, clock: Clock) -> Clock:
+        """ Replace the clock shared by all components.
+        Returns:
+            The previous clock. """
+        previous = _ComponentBase._clock[0]
+        _ComponentBase._clock[0] = clock
+        return previous
+
     @classmethod
     def get_classname(cls) -> str:
         """ Return class name. """
@@ -45,7 +201,7 @@ class _ComponentBase:
     def key_gen(self, tag: str) -> str:
         """ Return an event name prepended with the component name.
         eg: "componentName:event_name". """
-        return "%s:%s" % (self.label, tag)
+        return EventRegistry.key(self.label, tag)
 
     # pylint: disable=R0201 # Method could be a function (no-self-use)
     def early_update(self) -> bool:
@@ -53,13 +209,90 @@ class _ComponentBase:
         Any housekeeping tasks should happen here. """
         return True
 
-    def publish(self, event_name: str, event_value: Any) -> None:
-        """ Distribute an event to all subscribed components. """
+    def next_update_in(self) -> Optional[float]:
+        """ How long (in seconds) until this component needs updated even if no
+        events arrive for it.
+        Returns:
+            None if this component only needs updated in response to events or
+            to a call to `wake()`. """
+        return None
+
+    def wake(self) -> None:
+        """ Ask the Coordinator to perform an update as soon as possible.
+        Safe to call from any thread. """
+        self._wakeup.set()
+        for callback in self._wakeup_callbacks:
+            callback()
+
+    def call_later(self, delay: float, callback: Callable[[], Any]) -> None:
+        """ Have the Coordinator call `callback` after `delay` seconds.
+        The callback is called from the main loop, before any component's
+        `early_update()`. It may be a coroutine function when running under the
+        AsyncCoordinator.
+        Only call this from the main thread. """
+        heapq.heappush(self._timers,
+                       (self._clock[0].monotonic() + delay, next(self._timer_sequence), callback))
+
+    def publish(self,
+                event_name: str,
+                event_value: Any,
+                coalesce: bool = False,
+                priority: bool = False) -> None:
+        """ Distribute an event to all subscribed components.
+        Args:
+            event_name: Name of the event.
+            event_value: Value to be delivered.
+            coalesce: Set True for events that describe state rather than
+                      commands. Only the most recent value of such an event is
+                      delivered each update. Events published without this flag
+                      are always delivered, in order.
+            priority: Set True for safety critical events. eg: Feed hold.
+                      These skip the regular queue and are passed to
+                      subscribers' `receive_priority()` at the start of the
+                      next update, which is scheduled immediately.
+        Safe to call from any thread. """
+        if threading.get_ident() != self._consumer_thread[0]:
+            # Can't touch the event queues from here as the Coordinator may be
+            # iterating over them.
+            self._inbox.push((event_name, event_value, coalesce, priority, self.label))
+            self.wake()
+            return
+
+        self._enqueue(event_name, event_value, coalesce, priority, self.label)
+
+    def _enqueue(self,
+                 event_name: str,
+                 event_value: Any,
+                 coalesce: bool,
+                 priority: bool,
+                 source: str) -> None:
+        """ Put a published event in the right queue.
+        Only call this from the Coordinator's thread.
+        Args:
+            source: Label of the publishing component. """
+        journal = self._journal[0]
+        if journal is not None:
+            journal.record(event_name, event_value, coalesce, priority, source)
+        instrumentation = self._instrumentation[0]
+        if instrumentation is not None:
+            instrumentation.record_publish(event_name)
+
+        if priority:
+            self._priority_event_queue.append(
+                (event_name, event_value, time.perf_counter()))
+            self.wake()
+            return
+
+        event: Tuple[str, Any] = (event_name, event_value)
+        if coalesce:
+            event = _CoalescableEvent(event)
+            self._coalesce_pending[0] += 1
+
         if self._delay_events[0]:
-            print("##delayed", (event_name, event_value))
-            self._delayed_event_queue.append((event_name, event_value))
+            print("##delayed", event)
+            self._delayed_event_queue.append(event)
         else:
-            self._event_queue.append((event_name, event_value))
+            self._event_queue.append(event)
 
     def receive(self) -> None:
         """ Receive events this object is subscribed to. """
@@ -75,11 +308,94 @@ class _ComponentBase:
             if event in self.event_subscriptions:
                 self._delivered.append((event, value))
 
+        if self._delivered:
+            self.on_receive()
+
+    def receive_priority(self, event_name: str, event_value: Any, published_at: float) -> None:
+        """ Handle a priority event straight away, bypassing `_delivered`.
+        Args:
+            event_name: Name of the event.
+            event_value: Value to be delivered.
+            published_at: time.perf_counter() when the event was published. """
+        # pylint: disable=W0613  # Unused argument 'published_at'
+        entry = self._dispatch.get(event_name)
+        if entry is None:
+            entry = self._dispatch_entry(event_name)
+        callback, action, default_value, pass_event_name = entry
+
+        if event_value is None:
+            event_value = default_value
+
+        if callback is not None:
+            if pass_event_name:
+                callback(event_name, event_value)
+            else:
+                callback(event_value)
+        elif action:
+            setattr(self, action, event_value)
+
+    def on_receive(self) -> None:
+        """ Called as soon as events have been delivered to this component,
+        before any component's `_update()` is called. """
+
     def update(self) -> None:
         """ Called after events get delivered. """
         # for event in self._delivered:
         #     print(self.label, event)
 
+    def poll_state(self, revision: int) -> Optional[Any]:
+        """ The active controller's state machine properties for components
+        that only need the latest values once per update rather than every
+        "active_controller:..." event.
+        Args:
+            revision: `revision` of the last snapshot received. 0 for none.
+        Returns:
+            A core.payloads.StateSnapshot if the state has changed since
+            `revision`, otherwise None. """
+        controller = _ComponentBase._active_controller[0]
+        if controller is None:
+            return None
+        return controller.state.snapshot_if_changed(revision)
+
+    def _dispatch_entry(self, event_name: str
+                        ) -> Tuple[Optional[Callable[..., None]], str, Any, bool]:
+        """ Work out how `_update()` should handle `event_name` and cache the
+        result in the dispatch table until event_subscriptions next change. """
+        subscription = self.event_subscriptions[event_name]
+        if subscription is None:
+            # Handled elsewhere. eg: Gui widget keys.
+            entry: Tuple[Optional[Callable[..., None]], str, Any, bool] = \
+                    (None, "", None, False)
+            self._dispatch[event_name] = entry
+            return entry
+
+        action, default_value = subscription
+        if not isinstance(action, str):
+            raise AttributeError("Action (in self.event_subscriptions) should be a "
+                                 "string of the property name")
+        if not hasattr(self, action):
+            raise AttributeError("Property for event \"%s\" does not exist." % action)
+
+        callback = getattr(self, action)
+        if callable(callback):
+            # Refers to a class method.
+            # Callbacks take either (value) or (event_name, value).
+            pass_event_name = False
+            try:
+                inspect.signature(callback).bind(None)
+            except TypeError:
+                pass_event_name = True
+            except ValueError:
+                # No signature available. eg: some builtins.
+                pass
+            entry = (callback, action, default_value, pass_event_name)
+        else:
+            # Refers to a class variable.
+            entry = (None, action, default_value, False)
+
+        self._dispatch[event_name] = entry
+        return entry
+
     def _update(self) -> None:
         """ Populate class variables and callbacks in response to configured events. """
 
@@ -88,26 +404,21 @@ class _ComponentBase:
         # Some of the actions performed by this method will cause new events to be
         # scheduled.
 
+        dispatch = self._dispatch
         for event_name, event_value in self._delivered:
-            action, default_value = self.event_subscriptions[event_name]
+            entry = dispatch.get(event_name)
+            if entry is None:
+                entry = self._dispatch_entry(event_name)
+            callback, action, default_value, pass_event_name = entry
 
             if event_value is None:
                 # Use the one configured in this class.
                 event_value = default_value
 
-            if not isinstance(action, str):
-                raise AttributeError("Action (in self.event_subscriptions) should be a "
-                                     "string of the property name")
-            if not hasattr(self, action):
-                raise AttributeError("Property for event \"%s\" does not exist." % action)
-
-            callback = getattr(self, action)
-            if callable(callback):
-                # Refers to a class method.
-                try:
-                    callback(event_value)
-                except TypeError:
+            if callback is not None:
+                if pass_event_name:
                     callback(event_name, event_value)
-            else:
-                # Refers to a class variable.
+                else:
+                    callback(event_value)
+            elif action:
                 setattr(self, action, event_value)
@@ -3,21 +3,33 @@ Coordinator polls all components for published events and delivers them to
 subscribers. """
 
 
-from typing import List, Dict, Optional, Deque, Tuple, Any, Type
+from typing import List, Dict, Optional, Deque, Tuple, Any, Type, Set, \
+                   Callable, Generator
 from collections import deque
+import heapq
+import inspect
 import sys
+import threading
+import time
 from pathlib import Path
 import pprint
 # pylint: disable=E1101  # Module 'PySimpleGUIQt' has no 'XXXX' member (no-member)
 from ruamel.yaml import YAML, YAMLError  # type: ignore
 
 import core.common
-from core.component import _ComponentBase
+from core.component import _ComponentBase, _CoalescableEvent
+from core.instrumentation import Instrumentation
 from terminals._terminal_base import _TerminalBase
 from interfaces._interface_base import _InterfaceBase
 from controllers._controller_base import _ControllerBase
 from core_components._core_component_base import _CoreComponentBase
 
+# Subscriptions to events starting with this are bound to the active controller.
+ACTIVE_CONTROLLER = "active_controller:"
+
+# Longest time the main loop will sleep when no component needs updated.
+MAX_IDLE_WAIT = 0.5  # seconds
+
 class Coordinator(_ComponentBase):
     """ Coordinator handles interactions between components.
     Coordinator polls all components for published events and delivers them to
@@ -35,6 +47,9 @@ class Coordinator(_ComponentBase):
         """
         super().__init__("__coordinator__")
 
+        # Events published from any other thread go via the `_inbox`.
+        self._consumer_thread[0] = threading.get_ident()
+
         self.terminals: Dict[str, _TerminalBase] = \
                 {terminal.label:terminal for terminal in terminals}
         self.interfaces: Dict[str, _InterfaceBase] = \
@@ -49,7 +64,10 @@ class Coordinator(_ComponentBase):
 
         self.debug_show_events = debug_show_events
 
-        self.active_controller: Optional[_ControllerBase] = None
+        # Not profiled unless set to an Instrumentation instance.
+        self.instrumentation = None
+
+        self.active_controller = None
         self.config: Dict[str, Any] = {}
 
         self.all_components: List[_ComponentBase] = []
@@ -59,12 +77,39 @@ class Coordinator(_ComponentBase):
 
         self.event_subscriptions = {}
 
+        # Map of event names to the components subscribed to them and the
+        # name the event should be delivered as if aliased.
+        self._subscribers: Dict[str, List[Tuple[_ComponentBase, Optional[str]]]] = {}
+        self._subscribers_version: int = -1
+        self._subscribers_active: Optional[_ControllerBase] = None
+        self._route_count: int = 0
+
         self._load_config("config.yaml")
         self._setup_controllers()
         self._setup_terminals()
 
         self.running = True
 
+    @property
+    def instrumentation(self) -> Optional[Instrumentation]:
+        """ Set to an Instrumentation instance to profile the main loop.
+        Shared with all components so every publish is counted. """
+        return self._instrumentation[0]
+
+    @instrumentation.setter
+    def instrumentation(self, instrumentation: Optional[Instrumentation]) -> None:
+        _ComponentBase._instrumentation[0] = instrumentation
+
+    @property
+    def active_controller(self) -> Optional[_ControllerBase]:
+        """ The controller "active_controller:..." events are routed to.
+        Shared with all components for `poll_state()`. """
+        return self._active_controller[0]
+
+    @active_controller.setter
+    def active_controller(self, controller: Optional[_ControllerBase]) -> None:
+        _ComponentBase._active_controller[0] = controller
+
     def _load_core_components(self) -> None:
         """ Load and instantiate core_component plugins. """
         core_components = core.common.load_plugins("core_components")
@@ -77,6 +122,8 @@ class Coordinator(_ComponentBase):
             filter(lambda i: isinstance(i, _ControllerBase) is False,
                    self.all_components))
 
+        self.subscriptions_changed()
+
         if "DebugController" in self.controller_classes:
             instance = self.controller_classes["DebugController"]("debug")
             self.controllers[instance.label] = instance
@@ -98,6 +145,9 @@ class Coordinator(_ComponentBase):
                               "[controller, property, value]: %s, %s, %s" %
                               (label, property_, value))
 
+                if label in self.controllers:
+                    # Replaces the default "debug" controller created above.
+                    self.all_components.remove(self.controllers[label])
                 self.controllers[label] = instance
                 self.all_components.append(instance)
 
@@ -144,6 +194,7 @@ class Coordinator(_ComponentBase):
                 self.terminal_sub_components[label] = sub_component
 
         self.all_components += list(self.terminal_sub_components.values())
+        self.subscriptions_changed()
 
     def _clear_events(self) -> None:
         """ Clear the event queue after all events have been delivered. """
@@ -156,7 +207,7 @@ class Coordinator(_ComponentBase):
         # Move any events that arrived during `self.receive()` to the main queue.
         while True:
             try:
-                event = self._delayed_event_queue.pop()
+                event = self._delayed_event_queue.popleft()
             except IndexError:
                 break
             print("#####copying delayed event.", event)
@@ -234,6 +285,7 @@ class Coordinator(_ComponentBase):
         # This is a new controller.
         self.controllers[controller.label] = controller
         self.all_components.append(controller)
+        self.subscriptions_changed()
         self.active_controller = controller
         _only_one_active()
 
@@ -268,51 +320,190 @@ class Coordinator(_ComponentBase):
         for controller_name, controller in self.controllers.items():
             self.publish("%s:active" % controller_name, controller.active)
 
-    def _copy_active_controller_events(self) -> None:
-        """ Copy the active controller's events into the "active_controller:xxxx"
-        namespace.
-        All controllers publish events under their own name. Subscribers
-        are usually only interested in the active controller.
-        Here we make copies of the active controller's events under the name
-        "active_controller:xxxx" to save working this out on every consumer."""
-        assert self.active_controller, "No active controller."
-
-        active = self.active_controller.label
-        tmp_event_queue: Deque[Tuple[str, Any]] = deque()
-        for event_name, event_value in self._event_queue:
-            if not isinstance(event_name, str):
-                continue
-            if event_name.find(":") < 0:
-                continue
-            component, event = event_name.split(":", maxsplit=1)
-            if component != active:
+    def _coalesce_events(self) -> None:
+        """ Drop "state" events (those published with `coalesce=True`) that are
+        followed by a more recent event of the same name. Events published
+        without `coalesce` are never dropped and ordering is preserved. """
+        if self._coalesce_pending[0] < 2:
+            self._coalesce_pending[0] = 0
+            return
+        self._coalesce_pending[0] = 0
+
+        seen: Set[str] = set()
+        kept: Deque[Tuple[str, Any]] = deque()
+        for event in reversed(self._event_queue):
+            event_name = event[0]
+            if event_name in seen and type(event) is _CoalescableEvent:
                 continue
-            tmp_event_queue.append(("active_controller:%s" % event, event_value))
+            seen.add(event_name)
+            kept.appendleft(event)
 
-        self._event_queue.extend(tmp_event_queue)
+        if len(kept) != len(self._event_queue):
+            self._event_queue.clear()
+            self._event_queue.extend(kept)
+
+    def _index_subscriptions(self) -> None:
+        """ Rebuild the map of event names to subscribed components.
+        Only needs done when a component's event_subscriptions change,
+        components are added or removed or the active controller changes.
+
+        All controllers publish events under their own name. Subscribers
+        are usually only interested in the active controller so subscriptions
+        to "active_controller:xxxx" are bound here to the active controller's
+        "label:xxxx" events. Those events are delivered to such subscribers
+        as "active_controller:xxxx". """
+        active = self.active_controller.label if self.active_controller else None
+        subscribers: Dict[str, List[Tuple[_ComponentBase, Optional[str]]]] = {}
+        for component in [self] + self.all_components:
+            for event_name in component.event_subscriptions:
+                subscribers.setdefault(event_name, []).append((component, None))
+
+                if active is not None and event_name.startswith(ACTIVE_CONTROLLER):
+                    source_name = active + event_name[len(ACTIVE_CONTROLLER) - 1:]
+                    subscribers.setdefault(source_name, []).append((component, event_name))
+
+        self._subscribers = subscribers
+        self._subscribers_version = self._subscriptions_version[0]
+        self._subscribers_active = self.active_controller
+
+    def _route_events(self) -> List[_ComponentBase]:
+        """ Deliver each event in the queue directly to the components
+        subscribed to it.
+        Returns:
+            The components that received events. """
+        if (self._subscribers_version != self._subscriptions_version[0] or
+                self._subscribers_active is not self.active_controller):
+            self._index_subscriptions()
+
+        # Put any events that arrive from now on in the `_delayed_event_queue`
+        # instead of the regular `_event_queue`.
+        self._delay_events[0] = True
+
+        subscribers = self._subscribers
+        if self.instrumentation is not None:
+            self.instrumentation.record_events(self._event_queue, subscribers)
+
+        self._route_count += 1
+        route_count = self._route_count
+        receivers: List[_ComponentBase] = []
+        for event in self._event_queue:
+            for component, alias in subscribers.get(event[0], ()):
+                if component._receive_count != route_count:
+                    component._receive_count = route_count
+                    receivers.append(component)
+                if alias is None:
+                    component._delivered.append(event)
+                else:
+                    component._delivered.append((alias, event[1]))
+
+        return receivers
+
+    def _drain_inbox(self) -> None:
+        """ Publish events that other threads put in the `_inbox`. """
+        for event_name, event_value, coalesce, priority, source in self._inbox.drain():
+            self._enqueue(event_name, event_value, coalesce, priority, source)
+
+    def _deliver_priority_events(self) -> None:
+        """ Pass events from the `_priority_event_queue` straight to subscribers. """
+        if not self._priority_event_queue:
+            return
+
+        if (self._subscribers_version != self._subscriptions_version[0] or
+                self._subscribers_active is not self.active_controller):
+            self._index_subscriptions()
+
+        instrumentation = self.instrumentation
+        while self._priority_event_queue:
+            event_name, event_value, published_at = self._priority_event_queue.popleft()
+            subscribers = self._subscribers.get(event_name, ())
+            if instrumentation is not None:
+                instrumentation.record_delivered(event_name, len(subscribers))
+            for component, alias in subscribers:
+                component.receive_priority(alias or event_name, event_value, published_at)
+
+    def _deliver_events(self) -> None:
+        """ Deliver each event in the queue directly to the components
+        subscribed to it. """
+        for component in self._route_events():
+            component.on_receive()
+
+    def _due_timers(self) -> List[Callable[[], Any]]:
+        """ Remove and return callbacks scheduled with `call_later()` that are
+        now due. """
+        due: List[Callable[[], Any]] = []
+        now = self._clock[0].monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            due.append(heapq.heappop(self._timers)[2])
+        return due
+
+    def _schedule_updates(self) -> None:
+        """ Work out which components get `early_update()` and `update()`
+        called this iteration of the main loop, according to their
+        `update_interval`. """
+        now = self._clock[0].monotonic()
+        for component in self.all_components:
+            interval = component.update_interval
+            if interval <= 0:
+                component._due = True
+            elif now >= component._next_update_at:
+                component._due = True
+                component._next_update_at = now + interval
+            else:
+                component._due = False
+
+    def _update_steps(self) -> Generator[Tuple[str, str, Callable[[], Any]], Any, None]:
+        """ The stages of one iteration of the main loop.
+        Yields a (component_label, phase, function) tuple for every call to be
+        made to a component. The caller calls `function` and sends its result
+        back in.
+        This lets the same sequence be driven synchronously by
+        `update_components()` or by the AsyncCoordinator, which awaits any
+        results that are coroutines. """
+        # Anything calling `wake()` from here on will cause the next `wait()`
+        # to return immediately.
+        self._wakeup.clear()
+
+        journal = self._journal[0]
+        if journal is not None:
+            journal.start_tick(self._clock[0].monotonic())
+
+        # Events published by other threads since last time.
+        self._drain_inbox()
+
+        # Safety critical events first.
+        self._deliver_priority_events()
+
+        for callback in self._due_timers():
+            yield (self.label, "timer", callback)
+
+        self._schedule_updates()
 
-    def update_components(self) -> bool:
-        """ Iterate through all components, delivering and acting upon events. """
         for terminal in self.terminals.values():
-            self.running = self.running and terminal.early_update()
+            if terminal._due:
+                running = yield (terminal.label, "early_update", terminal.early_update)
+                self.running = self.running and running
 
         for interface in self.interfaces.values():
-            interface.early_update()
+            if interface._due:
+                yield (interface.label, "early_update", interface.early_update)
 
         for core_component in self.core_components.values():
-            core_component.update()
+            if core_component._due:
+                yield (core_component.label, "update", core_component.update)
 
         for controller in self.controllers.values():
-            controller.early_update()
+            if controller._due:
+                yield (controller.label, "early_update", controller.early_update)
 
-        self._copy_active_controller_events()
+        self._coalesce_events()
 
         # Deliver all events to consumers.
-        self.receive()
-        for component in self.all_components:
-            component.receive()
+        for component in self._route_events():
+            yield (component.label, "receive", component.on_receive)
 
         self._debug_display_events()
+        if self.instrumentation is not None:
+            self.instrumentation.record_delayed(len(self._delayed_event_queue))
         self._clear_events()
 
         self._update()
@@ -325,12 +516,85 @@ class Coordinator(_ComponentBase):
             #else:
             #    print(component.label)
 
-            component._update()
-            component.update()
+            if not component._due:
+                # Events keep accumulating in `_delivered` until next update.
+                continue
+            if not (component.needs_tick or component._delivered or component.dirty):
+                # Idle.
+                continue
+            yield (component.label, "_update", component._update)
+            yield (component.label, "update", component.update)
             component._delivered.clear()
 
+        # Any published while updating components.
+        self._deliver_priority_events()
+
+        if journal is not None:
+            journal.end_tick()
+
+    def update_components(self) -> bool:
+        """ Iterate through all components, delivering and acting upon events. """
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.start_tick()
+
+        steps = self._update_steps()
+        result = None
+        try:
+            while True:
+                label, phase, function = steps.send(result)
+                if instrumentation is None:
+                    result = function()
+                else:
+                    start = time.perf_counter()
+                    result = function()
+                    instrumentation.record_phase(label, phase, time.perf_counter() - start)
+                assert not inspect.isawaitable(result), \
+                       "Coroutine in component needs the AsyncCoordinator: %s" % result
+        except StopIteration:
+            pass
+
+        if instrumentation is not None:
+            instrumentation.end_tick()
+
         return self.running
 
+    def _wait_timeout(self) -> float:
+        """ How long the main loop can sleep for before a component needs
+        updated. """
+        if self._event_queue or self._priority_event_queue or len(self._inbox):
+            return 0
+
+        now = self._clock[0].monotonic()
+        timeout = MAX_IDLE_WAIT
+        if self._timers:
+            timeout = min(timeout, self._timers[0][0] - now)
+        for component in self.all_components:
+            update_in = component.next_update_in()
+            if component._delivered or component.dirty:
+                # Has events or work waiting for it's next scheduled update.
+                update_in = 0
+            if update_in is not None and component.update_interval > 0:
+                # Can't be updated before it's next scheduled update.
+                update_in = max(update_in, component._next_update_at - now)
+            if update_in is not None and update_in < timeout:
+                timeout = update_in
+            if timeout <= 0:
+                return 0
+
+        return timeout
+
+    def wait(self) -> None:
+        """ Sleep until there is work to do.
+        Returns when a component calls `wake()`, when the soonest update
+        requested by `next_update_in()` or `call_later()` is due or after
+        MAX_IDLE_WAIT.
+        With a VirtualClock this returns immediately, having moved time forward
+        to when the next update is due. """
+        timeout = self._wait_timeout()
+        if timeout > 0:
+            self._clock[0].wait(self._wakeup, timeout)
+
     def close(self) -> None:
         """ Cleanup components on shutdown. """
         for controller in self.controllers.values():
@@ -343,6 +607,7 @@ class Coordinator(_ComponentBase):
         instance = self.controller_classes[controller_class]("new")
         self.controllers[instance.label] = instance
         self.all_components.append(instance)
+        self.subscriptions_changed()
         self.activate_controller(controller=instance)
         self.publish(self.key_gen("new_controller"), instance.label)
         self.event_subscriptions["new:set_active"] = \
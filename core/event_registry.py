@@ -0,0 +1,59 @@
+""" Registry of event names.
+Interns event names so they can be hashed and compared cheaply and assigns
+each a compact integer ID for use where a name would be too bulky. """
+
+from typing import Dict, List
+import sys
+
+
+class EventRegistry:
+    """ Registry of event names.
+    A single shared registry is used by all components. """
+
+    # Single shared instance for all components.
+    _ids: Dict[str, int] = {}
+    _names: List[str] = []
+    # Cache of names generated by `key()`. {label: {tag: name}}
+    _keys: Dict[str, Dict[str, str]] = {}
+
+    @classmethod
+    def intern(cls, event_name: str) -> str:
+        """ Return the canonical instance of `event_name`, registering it if
+        not seen before. """
+        event_id = cls._ids.get(event_name)
+        if event_id is None:
+            event_id = cls._register(event_name)
+        return cls._names[event_id]
+
+    @classmethod
+    def id_of(cls, event_name: str) -> int:
+        """ Return the ID for `event_name`, registering it if not seen before. """
+        event_id = cls._ids.get(event_name)
+        if event_id is None:
+            event_id = cls._register(event_name)
+        return event_id
+
+    @classmethod
+    def name_of(cls, event_id: int) -> str:
+        """ Return the event name for a previously registered ID. """
+        return cls._names[event_id]
+
+    @classmethod
+    def key(cls, label: str, tag: str) -> str:
+        """ Return the interned event name "label:tag".
+        Names are generated once then cached. """
+        try:
+            return cls._keys[label][tag]
+        except KeyError:
+            pass
+        name = cls.intern("%s:%s" % (label, tag))
+        cls._keys.setdefault(label, {})[tag] = name
+        return name
+
+    @classmethod
+    def _register(cls, event_name: str) -> int:
+        """ Assign the next ID to `event_name`. """
+        event_name = sys.intern(event_name)
+        cls._ids[event_name] = len(cls._names)
+        cls._names.append(event_name)
+        return cls._ids[event_name]
@@ -0,0 +1,70 @@
+""" Multi-producer, single-consumer inbox for passing data between threads. """
+
+from typing import Any, List
+import threading
+
+# Default number of preallocated slots.
+INBOX_SIZE = 1024
+
+
+class Inbox:
+    """ Multi-producer, single-consumer inbox for passing data between threads.
+    Backed by a preallocated ring buffer.
+    Producers (any thread) serialise on a lock when pushing. The single consumer
+    drains the ring without taking the lock, relying on the GIL to make reading
+    and writing an index or slot atomic.
+    If the ring fills, further data goes to an overflow list until the consumer
+    catches up so nothing is dropped and order is preserved. """
+
+    def __init__(self, size: int = INBOX_SIZE) -> None:
+        self._size = size
+        self._slots: List[Any] = [None] * size
+        # Total number of items ever written to / read from the ring.
+        # Only the producers modify _write and only the consumer modifies _read.
+        self._write: int = 0
+        self._read: int = 0
+        self._overflow: List[Any] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._write - self._read + len(self._overflow)
+
+    def push(self, item: Any) -> None:
+        """ Add an item. Safe to call from any thread. """
+        with self._lock:
+            if self._overflow or self._write - self._read >= self._size:
+                self._overflow.append(item)
+                return
+            self._slots[self._write % self._size] = item
+            # Publish the slot to the consumer only after it has been filled.
+            self._write += 1
+
+    def drain(self) -> List[Any]:
+        """ Remove and return everything in the inbox, oldest first.
+        Must only be called from the consumer thread. """
+        items: List[Any] = []
+        self._drain_ring(items)
+
+        if self._overflow:
+            with self._lock:
+                # Producers may have refilled the ring since it was drained
+                # and then spilled into the overflow. Their ring items are
+                # older so take them first.
+                self._drain_ring(items)
+                overflow, self._overflow = self._overflow, []
+            items += overflow
+
+        return items
+
+    def _drain_ring(self, items: List[Any]) -> None:
+        """ Move everything in the ring to `items`. """
+        write = self._write
+        read = self._read
+        slots = self._slots
+        size = self._size
+        while read < write:
+            index = read % size
+            items.append(slots[index])
+            slots[index] = None
+            read += 1
+        self._read = read
@@ -0,0 +1,162 @@
+""" Profiling and event bus statistics for the Coordinator's main loop.
+Enable by setting `Coordinator.instrumentation` to an Instrumentation instance.
+When left as None the main loop does no extra work. """
+
+from typing import Dict, Tuple, List, Any, Iterable, Optional
+import time
+
+# Upper bounds of the tick interval histogram buckets.
+TICK_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)  # seconds
+
+
+class PhaseStats:
+    """ Wall time spent by one component in one phase of the main loop. """
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def add(self, duration: float) -> None:
+        """ Record one call. """
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+
+class Instrumentation:
+    """ Profiling and event bus statistics for the Coordinator's main loop. """
+
+    def __init__(self, dump_interval: Optional[float] = None) -> None:
+        """
+        Args:
+            dump_interval: If set, print a summary and reset statistics every
+                           `dump_interval` seconds.
+        """
+        self.dump_interval = dump_interval
+        self._last_dump = time.monotonic()
+        self._tick_start: Optional[float] = None
+
+        self.phases: Dict[Tuple[str, str], PhaseStats] = {}
+        self.published: Dict[str, int] = {}
+        self.delivered: Dict[str, int] = {}
+        self.ticks: int = 0
+        self.tick_intervals: List[int] = [0] * (len(TICK_BUCKETS) + 1)
+        self.max_queue_depth: int = 0
+        self.total_queue_depth: int = 0
+        self.max_delayed_depth: int = 0
+        self.delayed_events: int = 0
+
+    def reset(self) -> None:
+        """ Clear all statistics. """
+        self.phases.clear()
+        self.published.clear()
+        self.delivered.clear()
+        self.ticks = 0
+        self.tick_intervals = [0] * (len(TICK_BUCKETS) + 1)
+        self.max_queue_depth = 0
+        self.total_queue_depth = 0
+        self.max_delayed_depth = 0
+        self.delayed_events = 0
+
+    def start_tick(self) -> None:
+        """ Called at the start of every iteration of the main loop. """
+        now = time.perf_counter()
+        if self._tick_start is not None:
+            interval = now - self._tick_start
+            bucket = 0
+            while bucket < len(TICK_BUCKETS) and interval > TICK_BUCKETS[bucket]:
+                bucket += 1
+            self.tick_intervals[bucket] += 1
+        self._tick_start = now
+        self.ticks += 1
+
+    def end_tick(self) -> None:
+        """ Called at the end of every iteration of the main loop. """
+        if self.dump_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_dump >= self.dump_interval:
+            self._last_dump = now
+            print(self.summary())
+            self.reset()
+
+    def record_phase(self, label: str, phase: str, duration: float) -> None:
+        """ Record time taken by one component method call. """
+        key = (label, phase)
+        stats = self.phases.get(key)
+        if stats is None:
+            stats = self.phases[key] = PhaseStats()
+        stats.add(duration)
+
+    def record_publish(self, event_name: str) -> None:
+        """ Count one published event. Called for every publish, including
+        priority events, events published from other threads and events later
+        merged by coalescing. """
+        self.published[event_name] = self.published.get(event_name, 0) + 1
+
+    def record_delivered(self, event_name: str, receivers: int) -> None:
+        """ Count an event delivered to `receivers` components. """
+        if receivers:
+            self.delivered[event_name] = self.delivered.get(event_name, 0) + receivers
+
+    def record_events(self,
+                      event_queue: Iterable[Tuple[str, Any]],
+                      subscribers: Dict[str, List[Any]]) -> None:
+        """ Count events about to be delivered, after coalescing. """
+        depth = 0
+        delivered = self.delivered
+        for event_name, _ in event_queue:
+            depth += 1
+            receivers = len(subscribers.get(event_name, ()))
+            if receivers:
+                delivered[event_name] = delivered.get(event_name, 0) + receivers
+
+        self.total_queue_depth += depth
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def record_delayed(self, depth: int) -> None:
+        """ Count events that were published while events were being delivered. """
+        self.delayed_events += depth
+        if depth > self.max_delayed_depth:
+            self.max_delayed_depth = depth
+
+    def summary(self, top: int = 10) -> str:
+        """ Human readable report of statistics gathered so far.
+        Args:
+            top: Number of entries to show in each table. """
+        lines = ["---- Instrumentation: %s ticks ----" % self.ticks]
+
+        lines.append("Slowest component phases (total ms, calls, max ms):")
+        phases = sorted(self.phases.items(), key=lambda item: item[1].total, reverse=True)
+        for (label, phase), stats in phases[:top]:
+            lines.append("  %-30s %-12s %9.3f %7s %9.3f" %
+                         (label, phase, 1000 * stats.total, stats.count, 1000 * stats.max))
+
+        lines.append("Most published events (published, delivered):")
+        published = sorted(self.published.items(), key=lambda item: item[1], reverse=True)
+        for event_name, count in published[:top]:
+            lines.append("  %-42s %7s %7s" %
+                         (event_name, count, self.delivered.get(event_name, 0)))
+
+        lines.append("Queue depth: max %s  mean %.1f  delayed: %s (max %s)" %
+                     (self.max_queue_depth,
+                      self.total_queue_depth / max(self.ticks, 1),
+                      self.delayed_events,
+                      self.max_delayed_depth))
+
+        lines.append("Tick intervals:")
+        lower = 0.0
+        for bucket, count in enumerate(self.tick_intervals):
+            upper = TICK_BUCKETS[bucket] if bucket < len(TICK_BUCKETS) else None
+            label = "%sms+" % int(1000 * lower) if upper is None else \
+                    "<= %sms" % int(1000 * upper)
+            lines.append("  %-10s %s" % (label, count))
+            if upper is not None:
+                lower = upper
+
+        return "\n".join(lines)
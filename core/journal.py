@@ -0,0 +1,399 @@
+""" Record every published event to a compact binary file and replay it.
+
+File format: MAGIC followed by records. Each record starts with a one byte type.
+    NAME:  id (varint), utf-8 name (varint length + bytes).
+           Written the first time an event name or component label is used.
+           Other records refer to names by id.
+    TICK:  tick number increment (varint), timestamp (float64).
+           Written before the first event of each tick that has any.
+    EVENT: name id (varint), source id (varint), flags (byte),
+           microseconds since the TICK timestamp (varint), value.
+Values are a one byte type followed by type specific data. Containers hold
+further values. pygcode Blocks are stored as their gcode text, numpy arrays
+as dtype, shape and raw data and core.payloads as their constructor arguments.
+Anything else unrecognised is stored as `str(value)`. """
+
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple, Union
+from collections import namedtuple
+from collections.abc import Mapping
+from enum import Enum
+import importlib
+import itertools
+import struct
+
+from pygcode import Block, Line
+
+from core.clock import VirtualClock
+from core.component import _ComponentBase
+from core.payloads import Payload
+from core.event_registry import EventRegistry
+
+MAGIC = b"CNCJ\x01"
+
+# Record types.
+RECORD_NAME = 1
+RECORD_TICK = 2
+RECORD_EVENT = 3
+
+# EVENT flags.
+FLAG_COALESCE = 1
+FLAG_PRIORITY = 2
+
+# Value types.
+VALUE_NONE = 0
+VALUE_TRUE = 1
+VALUE_FALSE = 2
+VALUE_INT = 3
+VALUE_FLOAT = 4
+VALUE_STR = 5
+VALUE_BYTES = 6
+VALUE_TUPLE = 7
+VALUE_LIST = 8
+VALUE_DICT = 9
+VALUE_ENUM = 10
+VALUE_BLOCK = 11
+VALUE_ARRAY = 12
+VALUE_REPR = 13
+VALUE_PAYLOAD = 14
+
+_DOUBLE = struct.Struct("<d")
+
+JournalEvent = namedtuple("JournalEvent", ["tick", "timestamp", "name", "value",
+                                           "coalesce", "priority", "source"])
+
+
+def _write_varint(out: bytearray, number: int) -> None:
+    """ Append an unsigned integer using 7 bits per byte. """
+    while number > 0x7f:
+        out.append((number & 0x7f) | 0x80)
+        number >>= 7
+    out.append(number)
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """ Returns: (number, position after it) """
+    number = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return number, pos
+        shift += 7
+
+def _write_str(out: bytearray, string: str) -> None:
+    encoded = string.encode("utf-8")
+    _write_varint(out, len(encoded))
+    out += encoded
+
+def _read_str(data: bytes, pos: int) -> Tuple[str, int]:
+    length, pos = _read_varint(data, pos)
+    return data[pos:pos + length].decode("utf-8"), pos + length
+
+def _import_class(class_name: str) -> Any:
+    """ Look up a class from it's "module:qualname". """
+    module_name, qualname = class_name.split(":", 1)
+    class_: Any = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        class_ = getattr(class_, part)
+    return class_
+
+def encode_value(out: bytearray, value: Any) -> None:
+    """ Append `value` to `out`. """
+    # pylint: disable=R0912  # Too many branches (too-many-branches)
+    type_ = type(value)
+    if value is None:
+        out.append(VALUE_NONE)
+    elif type_ is bool:
+        out.append(VALUE_TRUE if value else VALUE_FALSE)
+    elif type_ is int:
+        out.append(VALUE_INT)
+        # Zigzag encoding keeps small negative numbers small.
+        _write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif type_ is float:
+        out.append(VALUE_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif type_ is str:
+        out.append(VALUE_STR)
+        _write_str(out, value)
+    elif type_ is bytes:
+        out.append(VALUE_BYTES)
+        _write_varint(out, len(value))
+        out += value
+    elif isinstance(value, Enum):
+        out.append(VALUE_ENUM)
+        _write_str(out, "%s:%s" % (type_.__module__, type_.__qualname__))
+        _write_str(out, value.name)
+    elif isinstance(value, Payload):
+        out.append(VALUE_PAYLOAD)
+        _write_str(out, "%s:%s" % (type_.__module__, type_.__qualname__))
+        encode_value(out, value._args())  # pylint: disable=W0212
+    elif isinstance(value, tuple):
+        out.append(VALUE_TUPLE)
+        _write_varint(out, len(value))
+        for item in value:
+            encode_value(out, item)
+    elif isinstance(value, (list, set, frozenset)):
+        out.append(VALUE_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            encode_value(out, item)
+    elif isinstance(value, Mapping):
+        out.append(VALUE_DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            encode_value(out, key)
+            encode_value(out, item)
+    elif isinstance(value, Block):
+        out.append(VALUE_BLOCK)
+        _write_str(out, str(value))
+    elif type_.__module__ == "numpy" and hasattr(value, "tobytes"):
+        if value.shape == ():
+            # numpy scalar.
+            encode_value(out, value.item())
+            return
+        out.append(VALUE_ARRAY)
+        _write_str(out, value.dtype.str)
+        _write_varint(out, len(value.shape))
+        for dimension in value.shape:
+            _write_varint(out, dimension)
+        data = value.tobytes()
+        _write_varint(out, len(data))
+        out += data
+    elif isinstance(value, int):
+        # Subclass of int. (Enums were handled above.)
+        encode_value(out, int(value))
+    elif isinstance(value, float):
+        encode_value(out, float(value))
+    else:
+        out.append(VALUE_REPR)
+        _write_str(out, str(value))
+
+def decode_value(data: bytes, pos: int) -> Tuple[Any, int]:
+    """ Returns: (value, position after it) """
+    # pylint: disable=R0911,R0912  # Too many returns, branches.
+    value_type = data[pos]
+    pos += 1
+    if value_type == VALUE_NONE:
+        return None, pos
+    if value_type == VALUE_TRUE:
+        return True, pos
+    if value_type == VALUE_FALSE:
+        return False, pos
+    if value_type == VALUE_INT:
+        number, pos = _read_varint(data, pos)
+        return (number >> 1) if not number & 1 else -((number + 1) >> 1), pos
+    if value_type == VALUE_FLOAT:
+        return _DOUBLE.unpack_from(data, pos)[0], pos + _DOUBLE.size
+    if value_type in (VALUE_STR, VALUE_REPR):
+        return _read_str(data, pos)
+    if value_type == VALUE_BYTES:
+        length, pos = _read_varint(data, pos)
+        return bytes(data[pos:pos + length]), pos + length
+    if value_type in (VALUE_TUPLE, VALUE_LIST):
+        length, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(length):
+            item, pos = decode_value(data, pos)
+            items.append(item)
+        return (tuple(items) if value_type == VALUE_TUPLE else items), pos
+    if value_type == VALUE_DICT:
+        length, pos = _read_varint(data, pos)
+        dict_ = {}
+        for _ in range(length):
+            key, pos = decode_value(data, pos)
+            dict_[key], pos = decode_value(data, pos)
+        return dict_, pos
+    if value_type == VALUE_ENUM:
+        class_name, pos = _read_str(data, pos)
+        member, pos = _read_str(data, pos)
+        try:
+            return _import_class(class_name)[member], pos
+        except (ImportError, AttributeError, KeyError):
+            return member, pos
+    if value_type == VALUE_PAYLOAD:
+        class_name, pos = _read_str(data, pos)
+        args, pos = decode_value(data, pos)
+        try:
+            return _import_class(class_name)(*args), pos
+        except (ImportError, AttributeError):
+            return args, pos
+    if value_type == VALUE_BLOCK:
+        gcode, pos = _read_str(data, pos)
+        return Line(gcode).block, pos
+    if value_type == VALUE_ARRAY:
+        import numpy  # pylint: disable=C0415  # Only needed for journals containing arrays.
+        dtype, pos = _read_str(data, pos)
+        dimensions, pos = _read_varint(data, pos)
+        shape = []
+        for _ in range(dimensions):
+            dimension, pos = _read_varint(data, pos)
+            shape.append(dimension)
+        length, pos = _read_varint(data, pos)
+        array = numpy.frombuffer(data[pos:pos + length], dtype=dtype).reshape(shape)
+        return array.copy(), pos + length
+    raise ValueError("Unknown value type %s at %s" % (value_type, pos - 1))
+
+
+class Journal:
+    """ Records every published event to a file.
+    Install with `Journal.start()`. The Coordinator marks the start and end of
+    each tick. """
+
+    def __init__(self, filename: str) -> None:
+        self._file = open(filename, "wb")
+        self._file.write(MAGIC)
+        self._buffer = bytearray()
+        self._written_ids: Set[int] = set()
+        # Tick number and clock when it started.
+        self.tick = 0
+        self._tick_at = _ComponentBase._clock[0].monotonic()
+        self._tick_written = False
+        self._last_tick_written = 0
+
+    def start(self) -> "Journal":
+        """ Start recording events published by all components. """
+        _ComponentBase._journal[0] = self
+        return self
+
+    def stop(self) -> None:
+        """ Stop recording and close the file. """
+        if _ComponentBase._journal[0] is self:
+            _ComponentBase._journal[0] = None
+        self.end_tick()
+        self._file.close()
+
+    def start_tick(self, now: float) -> None:
+        """ Called by the Coordinator at the start of every tick. """
+        self.tick += 1
+        self._tick_at = now
+        self._tick_written = False
+
+    def end_tick(self) -> None:
+        """ Called by the Coordinator at the end of every tick.
+        Writes the tick's events to disk so they survive a crash. """
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._file.flush()
+            self._buffer.clear()
+
+    def _name_id(self, name: str) -> int:
+        """ Return the id for a name, writing a NAME record if it's new here. """
+        name_id = EventRegistry.id_of(name)
+        if name_id not in self._written_ids:
+            self._written_ids.add(name_id)
+            self._buffer.append(RECORD_NAME)
+            _write_varint(self._buffer, name_id)
+            _write_str(self._buffer, name)
+        return name_id
+
+    def record(self,
+               event_name: str,
+               event_value: Any,
+               coalesce: bool,
+               priority: bool,
+               source: str) -> None:
+        """ Record one published event. """
+        buffer = self._buffer
+        if not self._tick_written:
+            self._tick_written = True
+            buffer.append(RECORD_TICK)
+            _write_varint(buffer, self.tick - self._last_tick_written)
+            buffer += _DOUBLE.pack(self._tick_at)
+            self._last_tick_written = self.tick
+
+        name_id = self._name_id(event_name)
+        source_id = self._name_id(source)
+        offset = int((_ComponentBase._clock[0].monotonic() - self._tick_at) * 1000000)
+
+        buffer.append(RECORD_EVENT)
+        _write_varint(buffer, name_id)
+        _write_varint(buffer, source_id)
+        buffer.append((FLAG_COALESCE if coalesce else 0) | (FLAG_PRIORITY if priority else 0))
+        _write_varint(buffer, max(offset, 0))
+        encode_value(buffer, event_value)
+
+
+def read_journal(filename: str) -> Iterator[JournalEvent]:
+    """ Yield the events recorded in a journal file, in order. """
+    with open(filename, "rb") as journal_file:
+        data = journal_file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError("%s is not a journal file." % filename)
+
+    names: Dict[int, str] = {}
+    tick = 0
+    tick_at = 0.0
+    pos = len(MAGIC)
+    while pos < len(data):
+        record_type = data[pos]
+        pos += 1
+        if record_type == RECORD_NAME:
+            name_id, pos = _read_varint(data, pos)
+            names[name_id], pos = _read_str(data, pos)
+        elif record_type == RECORD_TICK:
+            increment, pos = _read_varint(data, pos)
+            tick += increment
+            tick_at = _DOUBLE.unpack_from(data, pos)[0]
+            pos += _DOUBLE.size
+        elif record_type == RECORD_EVENT:
+            name_id, pos = _read_varint(data, pos)
+            source_id, pos = _read_varint(data, pos)
+            flags = data[pos]
+            pos += 1
+            offset, pos = _read_varint(data, pos)
+            value, pos = decode_value(data, pos)
+            yield JournalEvent(tick,
+                               tick_at + offset / 1000000,
+                               names[name_id],
+                               value,
+                               bool(flags & FLAG_COALESCE),
+                               bool(flags & FLAG_PRIORITY),
+                               names[source_id])
+        else:
+            raise ValueError("Unknown record type %s at %s" % (record_type, pos - 1))
+
+
+def replay(filename: str,
+           coordinator: Any,
+           sources: Optional[Union[Set[str], Callable[[str], bool]]] = None) -> int:
+    """ Feed a journal back into a Coordinator one tick at a time.
+    Time as seen by the Coordinator's scheduling and timers follows the
+    timestamps in the journal rather than the wall clock so runs as fast as the
+    Coordinator can go and gives the same result every time.
+    Args:
+        filename: Journal file.
+        coordinator: Coordinator populated with the components to test.
+        sources: Labels of components whose events should be replayed.
+                 By default, events from components that are not part of
+                 `coordinator` are replayed. eg: The GUI when replaying
+                 headless. Components that are present publish their own events
+                 in response.
+    Returns:
+        Number of ticks replayed. """
+    if sources is None:
+        local = {component.label for component in coordinator.all_components}
+        local.add(coordinator.label)
+        wanted: Callable[[str], bool] = lambda source: source not in local
+    elif callable(sources):
+        wanted = sources
+    else:
+        wanted = sources.__contains__
+
+    clock = VirtualClock()
+    original_clock = _ComponentBase.set_clock(clock)
+    ticks = 0
+    try:
+        for _, events in itertools.groupby(read_journal(filename),
+                                           key=lambda event: event.tick):
+            for event in events:
+                clock.now = max(clock.now, event.timestamp)
+                if wanted(event.source):
+                    # pylint: disable=W0212  # Access to a protected member
+                    coordinator._enqueue(event.name, event.value, event.coalesce,
+                                         event.priority, event.source)
+            coordinator.update_components()
+            ticks += 1
+    finally:
+        _ComponentBase.set_clock(original_clock)
+    return ticks
@@ -0,0 +1,298 @@
+""" Typed values carried by events.
+Every subscriber receives the same object so payloads are immutable. Make a
+modified copy instead. eg: `position.replace({"x": 1.0})`.
+Payloads use `__slots__` so cost one small allocation each rather than a dict. """
+
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Tuple, Union
+from collections import abc
+
+# Axes reported by controllers, in order.
+AXES: Tuple[str, ...] = ("x", "y", "z", "a", "b")
+
+
+class Payload:
+    """ Base class for event payloads. """
+
+    __slots__: Tuple[str, ...] = ()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("%s is immutable." % type(self).__name__)
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("%s is immutable." % type(self).__name__)
+
+    def _args(self) -> Tuple[Any, ...]:
+        """ Arguments that recreate this payload when passed to the constructor. """
+        raise NotImplementedError
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (type(self), self._args())
+
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is type(self):
+            return self._args() == other._args()
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._args())
+
+
+class Position(Payload, abc.Mapping):
+    """ A value for each machine axis. eg: Machine position, maximum feed rate.
+    Behaves as a read only {axis: value} dict. """
+
+    __slots__ = ("axes", "values")
+
+    def __init__(self,
+                 values: Union[Mapping[str, float], Iterable[float]] = (),
+                 axes: Tuple[str, ...] = AXES) -> None:
+        """ Args:
+                values: {axis: value} or a value for each of `axes` in order.
+                        Missing axes are 0.
+                axes: Axis names. """
+        if isinstance(values, abc.Mapping):
+            values = tuple(values.get(axis, 0) for axis in axes)
+        else:
+            values = tuple(values)
+            if len(values) < len(axes):
+                values += (0,) * (len(axes) - len(values))
+            assert len(values) == len(axes), "Too many values for axes %s" % (axes,)
+        _set_axes(self, axes)
+        _set_values(self, values)
+
+    @classmethod
+    def _new(cls, values: Tuple[float, ...], axes: Tuple[str, ...]) -> "Position":
+        """ Construct without checking `values`. """
+        position = object.__new__(cls)
+        _set_axes(position, axes)
+        _set_values(position, values)
+        return position
+
+    def _args(self) -> Tuple[Any, ...]:
+        return (self.values, self.axes)
+
+    def __getitem__(self, axis: str) -> float:
+        try:
+            return self.values[self.axes.index(axis)]
+        except ValueError:
+            raise KeyError(axis)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.axes)
+
+    def __len__(self) -> int:
+        return len(self.axes)
+
+    def __contains__(self, axis: Any) -> bool:
+        return axis in self.axes
+
+    def items(self) -> Iterable[Tuple[str, float]]:  # type: ignore
+        return zip(self.axes, self.values)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Position):
+            return self.axes == other.axes and self.values == other.values
+        if isinstance(other, abc.Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = Payload.__hash__
+
+    def __repr__(self) -> str:
+        return "Position(%s)" % ", ".join(
+            "%s=%s" % (axis, value) for axis, value in self.items())
+
+    def changes(self, values: Mapping[str, Optional[float]]) -> Dict[str, float]:
+        """ The entries in `values` that differ from this position.
+        Axis names are case insensitive. Unknown axes and None are ignored. """
+        changes = {}
+        axes = self.axes
+        for axis, value in values.items():
+            if value is None:
+                continue
+            axis = axis.lower()
+            if axis in axes and self.values[axes.index(axis)] != value:
+                changes[axis] = value
+        return changes
+
+    def replace(self, values: Mapping[str, Optional[float]]) -> "Position":
+        """ A copy of this position with some axes changed.
+        Returns:
+            This position if nothing changed. """
+        changes = self.changes(values)
+        if not changes:
+            return self
+        return self.apply(changes)
+
+    def apply(self, changes: Mapping[str, float]) -> "Position":
+        """ A copy of this position with `changes` from `changes()` applied. """
+        return Position._new(
+            tuple(changes.get(axis, value) for axis, value in self.items()), self.axes)
+
+
+# Slot setters. Faster than object.__setattr__() and bypass Payload.__setattr__().
+_set_axes = Position.axes.__set__  # type: ignore
+_set_values = Position.values.__set__  # type: ignore
+
+
+class Move(Payload, abc.Mapping):
+    """ Parameters for a "command:move_absolute" or "command:move_relative" event.
+    Behaves as a read only dict of the parameters that were set so can be
+    passed to a handler as keyword arguments. """
+
+    __slots__ = ("x", "y", "z", "a", "b", "f")
+
+    # pylint: disable=C0103,R0913  # invalid-name, too-many-arguments
+    def __init__(self,
+                 x: Optional[float] = None,
+                 y: Optional[float] = None,
+                 z: Optional[float] = None,
+                 a: Optional[float] = None,
+                 b: Optional[float] = None,
+                 f: Optional[float] = None) -> None:
+        for name, value in zip(self.__slots__, (x, y, z, a, b, f)):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_dict(cls, values: Mapping[str, Optional[float]]) -> "Move":
+        """ Construct from a dict with case insensitive keys. """
+        return cls(**{key.lower(): value for key, value in values.items()})
+
+    def _args(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __getitem__(self, name: str) -> float:
+        value = getattr(self, name, None) if name in self.__slots__ else None
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name in self.__slots__ if getattr(self, name) is not None)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Move):
+            return self._args() == other._args()
+        if isinstance(other, abc.Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = Payload.__hash__
+
+    def __repr__(self) -> str:
+        return "Move(%s)" % ", ".join("%s=%s" % item for item in self.items())
+
+
+class Overrides(Payload):
+    """ Feed, rapid and spindle overrides as percentages. """
+
+    __slots__ = ("feed", "rapid", "spindle")
+
+    def __init__(self, feed: float = 100, rapid: float = 100, spindle: float = 100) -> None:
+        object.__setattr__(self, "feed", feed)
+        object.__setattr__(self, "rapid", rapid)
+        object.__setattr__(self, "spindle", spindle)
+
+    def _args(self) -> Tuple[Any, ...]:
+        return (self.feed, self.rapid, self.spindle)
+
+    def __repr__(self) -> str:
+        return "Overrides(feed=%s, rapid=%s, spindle=%s)" % self._args()
+
+
+class _MappingPayload(Payload, abc.Mapping):
+    """ A read only dict. """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, values: Mapping[str, Any]) -> None:
+        object.__setattr__(self, "_values", dict(values))
+
+    def _args(self) -> Tuple[Any, ...]:
+        return (self._values,)
+
+    def __getitem__(self, name: str) -> Any:
+        return self._values[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, abc.Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(tuple(self._values.items()))
+
+    def __repr__(self) -> str:
+        return "%s(%r)" % (type(self).__name__, self._values)
+
+
+class StateDelta(_MappingPayload):
+    """ Every state machine property that changed while processing one status
+    report. {property_name: new_value} """
+
+    __slots__ = ()
+
+
+class Settings(_MappingPayload):
+    """ Configuration read from a controller. {setting_name: value} """
+
+    __slots__ = ()
+
+
+class ModalGroups(_MappingPayload):
+    """ The gcode last used in each modal group. {group: gcode}
+    eg: {b"motion": b"G0", b"units": b"G21"} """
+
+    __slots__ = ()
+
+
+class Offsets(_MappingPayload):
+    """ Coordinate systems and other offsets read from a controller.
+    {name: value} eg: {"G54": Position(...), "TLO": 0.0} """
+
+    __slots__ = ()
+
+
+class StateSnapshot(Payload, abc.Mapping):
+    """ Every state machine property at one revision. {property_name: value}
+    See `StateMachineBase.snapshot_if_changed()`. """
+
+    __slots__ = ("revision", "_values")
+
+    def __init__(self, revision: int, values: Mapping[str, Any]) -> None:
+        object.__setattr__(self, "revision", revision)
+        object.__setattr__(self, "_values", dict(values))
+
+    def _args(self) -> Tuple[Any, ...]:
+        return (self.revision, self._values)
+
+    def __getitem__(self, name: str) -> Any:
+        return self._values[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, StateSnapshot):
+            return self.revision == other.revision and self._values == other._values
+        if isinstance(other, abc.Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.revision)
+
+    def __repr__(self) -> str:
+        return "StateSnapshot(%s, %r)" % (self.revision, self._values)
@@ -7,3 +7,6 @@ class _CoreComponentBase(_ComponentBase):
 
     is_valid_plugin = False
     plugin_type = "core_components"
+
+    # Only act in response to events.
+    needs_tick = False
@@ -0,0 +1,230 @@
+""" GUI presentation of controllers.
+Kept apart from the controllers themselves so they can run without any GUI
+libraries being loaded. """
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple, Type
+
+# pylint: disable=E1101  # Module 'PySimpleGUIQt' has no 'XXXX' member (no-member)
+from PySimpleGUI_loader import sg
+
+from controllers._controller_base import _ControllerBase
+
+
+class ControllerView:
+    """ GUI widgets for viewing and editing any controller. """
+
+    # Controller events (minus the "<label>:" prefix) this view reacts to.
+    # These are passed to `on_event()`.
+    events: Tuple[str, ...] = ("edit_pending",)
+
+    def __init__(self, controller: _ControllerBase) -> None:
+        self.controller = controller
+        self._edit_buttons: List[sg.Button] = []
+
+    def key_gen(self, tag: str) -> str:
+        """ Widget keys match the controller's event names. """
+        return self.controller.key_gen(tag)
+
+    def layout_view(self) -> List[List[sg.Element]]:
+        """ Layout information for the PySimpleGUI interface. """
+        return []
+
+    def layout_edit(self) -> List[List[sg.Element]]:
+        """ Layout information for the PySimpleGUI interface. """
+        return []
+
+    def layout(self) -> List[List[sg.Element]]:
+        """ Layout information for the PySimpleGUI interface. """
+        tabs = []
+        if self.controller.label != "new":
+            tabs.append(sg.Tab("View", self.layout_view(), key=self.key_gen("view")))
+
+        tabs.append(sg.Tab("Edit", self.layout_edit(), key=self.key_gen("edit")))
+
+        return [[sg.TabGroup([tabs], key="controller_%s_tabs" % self.controller.label)]]
+
+    def layout_components(self) -> Dict[str, List[sg.Element]]:
+        """ Return a dict of GUI widgets to be included in controller related pages. """
+        button_col = sg.LOOK_AND_FEEL_TABLE[sg.theme()]["BUTTON"]
+        disabled_button_col = ("grey", button_col[1])
+
+        components = {}
+        components["view_label"] = [
+            sg.Text("Title:", size=(12, 1)),
+            sg.Text(self.controller.label, key=self.key_gen("label"), size=(20, 1)),
+            ]
+        components["edit_label"] = [
+            sg.Text("Title:", size=(12, 1)),
+            sg.InputText(self.controller.label, key=self.key_gen("label_edit"), size=(20, 1)),
+            ]
+        components["view_buttons"] = [
+            sg.Button("Connect", key=self.key_gen("connect"), size=(10, 1), pad=(2, 2)),
+            sg.Button('Disconnect', key=self.key_gen("disconnect"), size=(10, 1), pad=(2, 2)),
+            ]
+        components["edit_buttons"] = [
+            sg.Button("Save",
+                      key=self.key_gen("save_edit"),
+                      size=(10, 1),
+                      pad=(2, 2),
+                      disabled=True,
+                      button_color=disabled_button_col),
+            sg.Button("Cancel",
+                      key=self.key_gen("cancel_edit"),
+                      size=(10, 1),
+                      pad=(2, 2),
+                      disabled=True,
+                      button_color=disabled_button_col),
+            sg.Button("Delete", size=(10, 1), pad=(2, 2)),
+            ]
+        components["view_connection"] = [
+            sg.Text("Connection state (desired/actual):", size=(24, 1)),
+            sg.Text(key=self.key_gen("desired_connection_status"), size=(15, 1), pad=(0, 0)),
+            sg.Text(key=self.key_gen("connection_status"), size=(15, 1), pad=(0, 0), justification="left"),
+            ]
+
+        self._edit_buttons = components["edit_buttons"]
+
+        return components
+
+    def on_event(self, event_name: str, event_value: Any) -> None:
+        """ Update widgets in response to one of the events listed in `events`. """
+        tag = event_name.split(":", 1)[1]
+        getattr(self, "_on_%s" % tag)(event_value)
+
+    def _on_edit_pending(self, pending: bool) -> None:
+        """ Enable the Save and Cancel buttons while there are unsaved edits. """
+        if not self._edit_buttons:
+            return
+        button_col = sg.LOOK_AND_FEEL_TABLE[sg.theme()]["BUTTON"]
+        if not pending:
+            button_col = ("grey", button_col[1])
+        self._edit_buttons[0].Update(button_color=button_col, disabled=not pending)
+        self._edit_buttons[1].Update(button_color=button_col, disabled=not pending)
+
+
+class SerialControllerView(ControllerView):
+    """ GUI widgets for controllers that use a serial port to connect. """
+
+    events = ControllerView.events + ("ports",)
+
+    def __init__(self, controller: _ControllerBase) -> None:
+        super().__init__(controller)
+        self.device_picker: sg.Combo = None
+
+    def layout_components(self) -> Dict[str, List[sg.Element]]:
+        """ GUI layout common to all serial controllers. """
+        components = super().layout_components()
+
+        self.controller.search_device()
+
+        self.device_picker = sg.Combo(values=self.controller.ports,
+                                      size=(25, 1),
+                                      key=self.key_gen("device_picker"),
+                                      default_value=self.controller.serial_port,
+                                      enable_events=True,
+                                      )
+        device_scan = sg.Button("Scan",
+                                size=(5, 1),
+                                key=self.key_gen("device_scan"),
+                                tooltip="Scan for serial ports.",
+                                )
+
+        components["view_serial_port"] = [sg.Text("Serial port:",
+                                                  size=(12, 1)),
+                                          sg.Text(self.controller.serial_port,
+                                                  key=self.key_gen("serial_port"))]
+        components["edit_serial_port"] = [sg.Text("Serial port:",
+                                                  size=(12, 1)),
+                                          self.device_picker, device_scan]
+
+        return components
+
+    def _on_ports(self, ports: List[str]) -> None:
+        """ Repopulate the device picker after a scan for serial ports. """
+        if not self.device_picker:
+            return
+        try:
+            self.device_picker.Update(values=ports, value=self.controller.serial_port)
+        except AttributeError:
+            # self.device_picker not configured.
+            pass
+
+
+class DebugControllerView(ControllerView):
+    """ GUI widgets for the DebugController. """
+
+    def layout_view(self) -> List[List[sg.Element]]:
+        """ Layout information for the PySimpleGUI interface. """
+        components = self.layout_components()
+        layout = [
+            components["view_label"],
+            [sg.Multiline(default_text="gcode",
+                          size=(60, 10),
+                          key=self.key_gen("gcode"),
+                          autoscroll=True,
+                          disabled=True,
+                          enable_events=False,
+                          ),],
+            components["view_connection"],
+            components["view_buttons"],
+            ]
+        return layout
+
+    def layout_edit(self) -> List[List[sg.Element]]:
+        """ Layout information for the PySimpleGUI interface. """
+        components = self.layout_components()
+        layout = [
+            components["edit_label"],
+            components["edit_buttons"],
+            ]
+        return layout
+
+
+class Grbl1p1ControllerView(SerialControllerView):
+    """ GUI widgets for the Grbl1p1Controller. """
+
+    def layout_view(self) -> List[List[sg.Element]]:
+        """ Layout information for the PySimpleGUI interface. """
+        components = self.layout_components()
+        layout: List[Any] = [
+            components["view_label"],
+            components["view_serial_port"],
+            [sg.Multiline(default_text="Machine state",
+                          size=(60, 10),
+                          key=self.key_gen("state"),
+                          autoscroll=True,
+                          disabled=True,
+                          ),],
+            components["view_connection"],
+            components["view_buttons"],
+            ]
+        return layout
+
+    def layout_edit(self) -> List[List[sg.Element]]:
+        """ Layout information for the PySimpleGUI interface. """
+        components = self.layout_components()
+        layout = [
+            components["edit_label"],
+            components["edit_serial_port"],
+            components["edit_buttons"],
+            ]
+        return layout
+
+
+# Views by controller class name.
+# Looked up by name so building a view never imports a controller module.
+CONTROLLER_VIEWS: Dict[str, Type[ControllerView]] = {
+    "_ControllerBase": ControllerView,
+    "_SerialControllerBase": SerialControllerView,
+    "DebugController": DebugControllerView,
+    "Grbl1p1Controller": Grbl1p1ControllerView,
+    }
+
+def view_for(controller: _ControllerBase) -> ControllerView:
+    """ Return a view for the controller's most specific class that has one. """
+    for class_ in type(controller).__mro__:
+        if class_.__name__ in CONTROLLER_VIEWS:
+            return CONTROLLER_VIEWS[class_.__name__](controller)
+    raise TypeError("No GUI view for %s" % controller)
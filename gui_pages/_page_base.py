@@ -10,6 +10,9 @@ class _GuiPageBase(_ComponentBase):
     is_valid_plugin = False
     plugin_type = "gui_pages"
 
+    # Only act in response to events or when `dirty`.
+    needs_tick = False
+
     def __init__(self,
                  controllers: Dict[str, _ControllerBase],
                  controller_classes: Dict[str, Type[_ControllerBase]]) -> None:
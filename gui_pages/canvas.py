@@ -2,7 +2,7 @@
 
 """ Display Gcode and machine movement in the GUI. """
 
-from typing import List, Tuple, Dict, Union, Optional, Any, Type
+from typing import List, Tuple, Dict, Union, Optional, Any, Type, Mapping
 
 import numpy as np
 from PySide2.QtCore import Qt, QRectF
@@ -10,6 +10,7 @@ from PySide2.QtGui import QPainter
 from PySimpleGUI_loader import sg
 from pygcode import GCodeRapidMove
 
+from core.component import UPDATE_CANVAS
 from controllers._controller_base import _ControllerBase
 from gui_pages._page_base import _GuiPageBase
 
@@ -227,6 +228,11 @@ class CanvasWidget(_GuiPageBase):
 
     label = "canvasWidget"
 
+    # Redrawing is slow so don't do it every iteration of the main loop.
+    update_interval = UPDATE_CANVAS
+    # Polls the active controller's machine position. See `update()`.
+    needs_tick = True
+
     def __init__(self,
                  controllers: Dict[str, _ControllerBase],
                  controller_classes: Dict[str, Type[_ControllerBase]]) -> None:
@@ -257,7 +263,6 @@ class CanvasWidget(_GuiPageBase):
         self.center: Tuple[float, float, float] = self.calculate_center()
 
         self.event_subscriptions = {
-            "active_controller:machine_pos": ("_machine_pos_handler", None),
             "gui:keypress": ("_keypress_handler", None),
             "gui:restart": ("redraw", None),
             "gui:has_restarted": ("_startup", None),
@@ -265,6 +270,9 @@ class CanvasWidget(_GuiPageBase):
             }
 
         self.dirty: bool = True
+        # `revision` of the last state snapshot received.
+        self._state_revision: int = 0
+        self._last_machine_pos: Optional[Mapping[str, float]] = None
 
     def _startup(self, _: Any) -> None:
         try:
@@ -286,9 +294,8 @@ class CanvasWidget(_GuiPageBase):
 
         self.dirty = True
 
-    def _machine_pos_handler(self, pos: Dict[str, float]) -> None:
-        """ Event handler for "active_controller:machine_pos".
-            Called when the machine position is updated."""
+    def _machine_pos_handler(self, pos: Mapping[str, float]) -> None:
+        """ Called from `update()` when the machine position has changed. """
         machine_position = self.structures["machine_position"]
         machine_position.add_nodes([(pos["x"], pos["y"], pos["z"])])
 
@@ -465,6 +472,15 @@ class CanvasWidget(_GuiPageBase):
         """ Update all Geometry objects. """
         super().update()
 
+        # Only the latest position is drawn so poll for it once per update
+        # rather than receiving every "active_controller:machine_pos" event.
+        snapshot = self.poll_state(self._state_revision)
+        if snapshot is not None:
+            if snapshot["machine_pos"] != self._last_machine_pos:
+                self._last_machine_pos = snapshot["machine_pos"]
+                self._machine_pos_handler(self._last_machine_pos)
+            self._state_revision = snapshot.revision
+
         if self.dirty:
             self.redraw()
 
@@ -3,6 +3,7 @@
 from typing import List, Dict, Type, Any
 from controllers._controller_base import _ControllerBase
 from gui_pages._page_base import _GuiPageBase
+from gui_pages._controller_views import ControllerView, view_for
 
 # pylint: disable=E1101  # Module 'PySimpleGUIQt' has no 'XXXX' member (no-member)
 from PySimpleGUI_loader import sg
@@ -19,6 +20,7 @@ class ControllerPicker(_GuiPageBase):
         super().__init__(controllers, controller_classes)
         self.controller_widgets: Dict[str, sg.Frame] = {}
         self.controller_buttons: Dict[str, sg.Button] = {}
+        self.controller_views: Dict[str, ControllerView] = {}
         self.enabled: str = ""
 
         # Repopulate GUI fields after a GUI restart.
@@ -62,9 +64,14 @@ class ControllerPicker(_GuiPageBase):
         """ Return a widget for viewing/configuring a controller. """
         visible = bool(label == self.enabled)
 
+        view = view_for(controller)
+        self.controller_views[label] = view
+        for event in view.events:
+            self.event_subscriptions[controller.key_gen(event)] = ("_on_view_event", None)
+
         key = self.key_gen("view_%s" % label)
         widget = sg.Frame(label,
-                          controller.gui_layout(),
+                          view.layout(),
                           key=key,
                           visible=visible,
                           )
@@ -96,6 +103,7 @@ class ControllerPicker(_GuiPageBase):
         view_elements = []
         self.controller_widgets = {}
         self.controller_buttons = {}
+        self.controller_views = {}
 
         # TODO: Make the enabled value persistent.
         if not self.enabled:
@@ -121,6 +129,12 @@ class ControllerPicker(_GuiPageBase):
             ]
         return output
 
+    def _on_view_event(self, event_name: str, event_value: Any) -> None:
+        """ Pass controller events on to the view displaying that controller. """
+        label = event_name.split(":", 1)[0]
+        if label in self.controller_views:
+            self.controller_views[label].on_event(event_name, event_value)
+
     def _on_activated_controller(self, event_name: str, event_value: str) -> None:
         """ Display GUI for a particular controller. """
         #print("gui_pages._on_activated_controller", event_name, event_value)
@@ -1,5 +1,7 @@
 """ Plugin providing interface to control of some aspect of the active controller. """
 
+from __future__ import annotations
+
 from typing import List
 from PySimpleGUI_loader import sg
 from core.component import _ComponentBase
@@ -10,6 +12,9 @@ class _InterfaceBase(_ComponentBase):
     # Type of component. Used by the plugin loader.
     plugin_type = "interface"
 
+    # Only act in response to events.
+    needs_tick = False
+
     def gui_layout(self) -> List[List[sg.Element]]:
         """ Layout information for the PySimpleGUI interface. """
         assert False, "gui_layout() not implemented."
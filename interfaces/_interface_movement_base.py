@@ -1,9 +1,10 @@
 """ Plugin providing interface to control of some aspect of the active controller. """
 
-from typing import Union
+from typing import Union, Any
 
 from pygcode import block, GCodeCoordSystemOffset
 
+from core.payloads import Move
 from interfaces._interface_base import _InterfaceBase
 
 
@@ -11,33 +12,31 @@ class _InterfaceMovementBase(_InterfaceBase):
     """ A base class for user input objects used for controlling movement aspects
     of the machine. """
 
-    def move_relative(self, **argkv: Union[str, float]) -> None:
+    def move_relative(self, **argkv: float) -> None:
         """ Move the machine head relative to it's current position.
         Note this may or may not be translated to gcode by the controller later
         depending on the controller's functionality.
         Args:
-            argkv: A dict containing one or more of the following parameters:
-                command: The gcode command as a string. Defaults to "G01".
+            argkv: One or more of the following parameters:
                 x: The x coordinate.
                 y: The y coordinate.
                 z: The z coordinate.
                 f: The feed rate.
         """
-        self.publish("command:move_relative", argkv)
+        self.publish("command:move_relative", Move.from_dict(argkv))
 
-    def move_absolute(self, **argkv: Union[str, float]) -> None:
+    def move_absolute(self, **argkv: float) -> None:
         """ Move the machine head to a absolute position.
         Note this may or may not be translated to gcode by the controller later
         depending on the controller's functionality.
         Args:
-            argkv: A dict containing one or more of the following parameters:
-                command: The gcode command as a string. Defaults to "G01".
+            argkv: One or more of the following parameters:
                 x: The x coordinate.
                 y: The y coordinate.
                 z: The z coordinate.
                 f: The feed rate.
         """
-        self.publish("command:move_absolute", argkv)
+        self.publish("command:move_absolute", Move.from_dict(argkv))
 
     def g92_offsets(self, **argkv: Union[str, float]) -> None:
         """ Set work position offset.
@@ -46,3 +45,15 @@ class _InterfaceMovementBase(_InterfaceBase):
         gcode = block.Block()
         gcode.gcodes.append(GCodeCoordSystemOffset(**argkv))
         self.publish("command:gcode", gcode)
+
+    def feed_hold(self, _: Any = None) -> None:
+        """ Pause machine motion as quickly as possible. """
+        self.publish("command:feed_hold", None, priority=True)
+
+    def jog_cancel(self, _: Any = None) -> None:
+        """ Stop any jog in progress. """
+        self.publish("command:jog_cancel", None, priority=True)
+
+    def soft_reset(self, _: Any = None) -> None:
+        """ Stop all motion and reset the controller. """
+        self.publish("command:soft_reset", None, priority=True)
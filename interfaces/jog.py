@@ -3,6 +3,8 @@
 
 """ Send Gcode to active controller in response to GUI button presses. """
 
+from __future__ import annotations
+
 from typing import Dict, List
 from math import log10, floor
 
@@ -21,6 +23,10 @@ class JogWidget(_InterfaceMovementBase):
     # Set this True for any derived class that is to be used as a plugin.
     is_valid_plugin = True
 
+    # Polls the active controller's work position. See `update()`.
+    # Cheap when nothing has changed.
+    needs_tick = True
+
     def __init__(self, label: str = "jogWidget") -> None:
         super().__init__(label)
 
@@ -42,9 +48,9 @@ class JogWidget(_InterfaceMovementBase):
             self.key_gen("dr"): ("_move_handler", (1, -1, 0)),
             self.key_gen("uz"): ("_move_handler", (0, 0, 1)),
             self.key_gen("dz"): ("_move_handler", (0, 0, -1)),
-            "active_controller:work_pos:x": ("_wpos_handler_x", None),
-            "active_controller:work_pos:y": ("_wpos_handler_y", None),
-            "active_controller:work_pos:z": ("_wpos_handler_z", None),
+            self.key_gen("feed_hold"): ("feed_hold", None),
+            self.key_gen("jog_cancel"): ("jog_cancel", None),
+            self.key_gen("soft_reset"): ("soft_reset", None),
             self.key_gen("work_pos:x"): ("_wpos_handler_x_update", None),
             self.key_gen("work_pos:y"): ("_wpos_handler_y_update", None),
             self.key_gen("work_pos:z"): ("_wpos_handler_z_update", None),
@@ -53,6 +59,8 @@ class JogWidget(_InterfaceMovementBase):
         self._xy_jog_step: float = 10
         self._z_jog_step: float = 10
         self._w_pos: Dict[str, float] = {}
+        # `revision` of the last state snapshot received.
+        self._state_revision: int = 0
 
     def _xy_jog_step_multiply(self, multiplier: float) -> None:
         self._xy_jog_step = round_1_sf(self._xy_jog_step * multiplier)
@@ -72,20 +80,22 @@ class JogWidget(_InterfaceMovementBase):
                            z=self._z_jog_step * values[2],
                            )
 
-    def _wpos_handler_x(self, value: float) -> None:
-        """ Called in response to an active_controller:work_pos:x event. """
-        self._w_pos["x"] = value
-        self.publish(self.key_gen("work_pos:x"), value)
-
-    def _wpos_handler_y(self, value: float) -> None:
-        """ Called in response to an active_controller:work_pos:y event. """
-        self._w_pos["y"] = value
-        self.publish(self.key_gen("work_pos:y"), value)
+    def update(self) -> None:
+        """ Mirror the active controller's work position in the GUI.
+        Only the latest position is needed so poll for it rather than
+        subscribing to every "active_controller:work_pos:..." event. """
+        super().update()
+        snapshot = self.poll_state(self._state_revision)
+        if snapshot is None:
+            return
+        self._state_revision = snapshot.revision
 
-    def _wpos_handler_z(self, value: float) -> None:
-        """ Called in response to an active_controller:work_pos:z event. """
-        self._w_pos["z"] = value
-        self.publish(self.key_gen("work_pos:z"), value)
+        work_pos = snapshot["work_pos"]
+        for axis in ("x", "y", "z"):
+            value = work_pos[axis]
+            if self._w_pos.get(axis) != value:
+                self._w_pos[axis] = value
+                self.publish(self.key_gen("work_pos:%s" % axis), value)
 
     def _wpos_handler_x_update(self, value: float) -> None:
         """ Called in response to a local :work_pos:x event. """
@@ -238,6 +248,11 @@ class JogWidget(_InterfaceMovementBase):
             [sg.Column(layout_xy, pad=(0, 0), size=(1, 1)),
              sg.Column(layout_z, pad=(0, 0), size=(1, 1)),
              sg.Stretch()
+             ],
+            [but("Hold", "feed_hold"),
+             but("Stop jog", "jog_cancel"),
+             but("Reset", "soft_reset"),
+             sg.Stretch()
              ]
             ]
         return layout
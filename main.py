@@ -8,12 +8,19 @@ Uses plugins for different operating modes. (Eg. Jog, run GCode file, etc.)
 
 from typing import List, Type
 import argparse
+import asyncio
 
 import core.common
+from core.clock import VirtualClock
+from core.component import _ComponentBase
 from core.coordinator import Coordinator
+from core.async_coordinator import AsyncCoordinator
+from core.instrumentation import Instrumentation
+from core.journal import Journal
 from terminals._terminal_base import _TerminalBase
 from controllers._controller_base import _ControllerBase
 from interfaces._interface_base import _InterfaceBase
+from terminals.socket_api import SOCKET_PATH
 
 
 def main() -> None:
@@ -29,9 +36,8 @@ def main() -> None:
         []
     controllers: List[Type[_ControllerBase]] = \
         [controller for active, controller in class_controllers if active]
-    # Instantiate the interfaces here.
     interfaces: List[_InterfaceBase] = \
-        [interface() for active, interface in class_interfaces if active]
+        []
 
     # Command line arguments.
     parser = argparse.ArgumentParser(description="A UI for CNC machines.")
@@ -40,6 +46,34 @@ def main() -> None:
                         action="store_true",
                         help="Display events.")
 
+    parser.add_argument("-instrumentation",
+                        type=float,
+                        nargs="?",
+                        const=10.0,
+                        metavar="SECONDS",
+                        help="Profile the main loop. "
+                             "Print a summary every SECONDS (default 10).")
+
+    parser.add_argument("-asyncio",
+                        action="store_true",
+                        help="Run components on an asyncio event loop.")
+
+    parser.add_argument("-journal",
+                        metavar="FILENAME",
+                        help="Record every event to FILENAME for later replay.")
+
+    parser.add_argument("-simulate",
+                        action="store_true",
+                        help="Run on a simulated clock, as fast as possible. "
+                             "Controller and component delays pass instantly.")
+
+    parser.add_argument("-daemon",
+                        nargs="?",
+                        const=SOCKET_PATH,
+                        metavar="SOCKET",
+                        help="Run headless with only controllers and core components. "
+                             "Serve the socket API on SOCKET (default %s)." % SOCKET_PATH)
+
     for active_by_default, terminal in class_terminals:
         if active_by_default:
             parser.add_argument("-no_%s" % terminal.get_classname(),
@@ -55,23 +89,58 @@ def main() -> None:
     args = parser.parse_args()
     print(args)
 
+    if args.simulate:
+        _ComponentBase.set_clock(VirtualClock())
+
+    journal = None
+    if args.journal:
+        journal = Journal(args.journal).start()
+
+    if args.daemon:
+        # No GUI, so no terminals other than the socket API and no interfaces.
+        for _, terminal in class_terminals:
+            setattr(args, terminal.get_classname(),
+                    terminal.get_classname() == "SocketApi")
+    else:
+        # Instantiate the interfaces here.
+        interfaces = [interface() for active, interface in class_interfaces if active]
+
     # Instantiate terminals according to command line flags.
     for _, terminal in class_terminals:
         if getattr(args, terminal.get_classname()):
             terminal_instance = terminal()
             terminal_instance.debug_show_events = args.debug_show_events
+            if args.daemon and terminal.get_classname() == "SocketApi":
+                terminal_instance.socket_path = args.daemon
             terminals.append(terminal_instance)
 
+    if args.asyncio:
+        async_coordinator = AsyncCoordinator(
+            terminals, interfaces, controllers, args.debug_show_events)
+        if args.instrumentation:
+            async_coordinator.instrumentation = Instrumentation(args.instrumentation)
+        asyncio.run(async_coordinator.run())
+        if journal:
+            journal.stop()
+        print("done")
+        return
+
     # Populate and start the coordinator.
     coordinator = Coordinator(terminals, interfaces, controllers, args.debug_show_events)
+    if args.instrumentation:
+        coordinator.instrumentation = Instrumentation(args.instrumentation)
 
     # Main program loop.
     while True:
         if not coordinator.update_components():
             break
+        # Sleep until a component has something to do.
+        coordinator.wait()
 
     # Cleanup and exit.
     coordinator.close()
+    if journal:
+        journal.stop()
     print("done")
 
 if __name__ == "__main__":
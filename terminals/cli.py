@@ -12,6 +12,8 @@ import curses
 
 from terminals._terminal_base import _TerminalBase
 
+KEYBOARD_INTERVAL = 0.05  # seconds
+
 class Cli(_TerminalBase):
     """ Plugin to provide command line IO using curses library. """
 
@@ -93,6 +95,10 @@ class Cli(_TerminalBase):
             self.win_mainout.refresh()
             self.win_stdout.refresh()
 
+    def next_update_in(self) -> Optional[float]:
+        """ Poll for key presses periodically. """
+        return KEYBOARD_INTERVAL
+
     def early_update(self) -> bool:
         """ To be called once per frame.
         Returns:
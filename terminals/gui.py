@@ -1,12 +1,13 @@
 """ Plugin to provide GUI using PySimpleGUI. """
 
-from typing import List, Dict, Any, Type
+from typing import List, Dict, Any, Type, Optional
 from enum import Enum
 
 # pylint: disable=E1101  # Module 'PySimpleGUIQt' has no 'XXXX' member (no-member)
 from PySimpleGUI_loader import sg
 
 import core.common
+from core.component import UPDATE_GUI
 from terminals._terminal_base import _TerminalBase, diff_dicts
 from interfaces._interface_base import _InterfaceBase
 from controllers._controller_base import _ControllerBase
@@ -23,6 +24,9 @@ class Gui(_TerminalBase):
     # Set this True for any derived class that is to be used as a plugin.
     is_valid_plugin = True
 
+    # Poll the GUI for user input at this rate.
+    update_interval = UPDATE_GUI
+
     def __init__(self, label: str = "gui") -> None:
         super().__init__(label)
         self.layout: List[List[sg.Element]] = []
@@ -150,7 +154,9 @@ class Gui(_TerminalBase):
         if not self._setup_done:
             return False
 
-        event, values = self.window.read(timeout=10)
+        # The Coordinator schedules calls to this at `update_interval` so
+        # don't block waiting for GUI events here.
+        event, values = self.window.read(timeout=0)
         if event is None or values in [None, "_EXIT_"]:
             print("Quitting via %s" % self.label)
             return False
@@ -176,6 +182,11 @@ class Gui(_TerminalBase):
 
         return event not in (None, ) and not event.startswith("Exit")
 
+    def next_update_in(self) -> Optional[float]:
+        """ The GUI must be polled continually.
+        The Coordinator limits this to once every `update_interval`. """
+        return 0
+
     def update(self) -> None:
         super().update()
 
@@ -193,10 +204,8 @@ class Gui(_TerminalBase):
             #    value = value.strip()
             self.publish(event_, value)
 
-    def receive(self) -> None:
-        """ Receive events this object is subscribed to. """
-        super().receive()
-
+    def on_receive(self) -> None:
+        """ Called as soon as events have been delivered to this component. """
         # Since latency is important in the GUI, lets update the screen as soon
         # as possible after receiving the event.
         # This also helps with event loops when multiple things update a widget
@@ -0,0 +1,407 @@
+""" Plugin to control CNCtastic over a local socket.
+Used when running headless. eg: `main.py -daemon`.
+
+Clients send and receive newline delimited JSON objects:
+    {"subscribe": "<event_name>"}       Start receiving an event.
+    {"unsubscribe": "<event_name>"}     Stop receiving an event.
+    {"publish": "<event_name>", "value": <value>, "priority": <bool>}
+                                        Publish an event. "value" and
+                                        "priority" are optional.
+Subscribed events are sent to the client as:
+    {"event": "<event_name>", "value": <value>}
+Only the user running CNCtastic can connect. See `default_socket_path()`.
+"""
+
+from typing import Any, Dict, Mapping, Optional, Set, Type
+
+from enum import Enum
+import errno
+import json
+import os
+import selectors
+import socket
+import stat
+import threading
+
+from core.payloads import Payload
+from terminals._terminal_base import _TerminalBase
+from interfaces._interface_base import _InterfaceBase
+from controllers._controller_base import _ControllerBase
+
+SOCKET_NAME = "cnctastic.sock"
+
+# Drop clients that can't keep up rather than buffer their output without limit.
+MAX_PENDING_OUTPUT = 1024 * 1024  # bytes
+
+
+def default_socket_path() -> str:
+    """ Where the socket is created unless told otherwise.
+    In $XDG_RUNTIME_DIR if set, otherwise ~/.cnctastic. Both are private to
+    the current user. """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        runtime_dir = os.path.join(os.path.expanduser("~"), ".cnctastic")
+    return os.path.join(runtime_dir, SOCKET_NAME)
+
+
+SOCKET_PATH = default_socket_path()
+
+def _json_default(value: Any) -> Any:
+    """ Encode values json doesn't know how to. """
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, Payload):
+        return {name: getattr(value, name) for name in value.__slots__}
+    return str(value)
+
+
+class SocketApi(_TerminalBase):
+    """ Plugin to control CNCtastic over a local (unix domain) socket. """
+
+    # Not active unless enabled with flag at runtime.
+    active_by_default = False
+
+    # Set this True for any derived class that is to be used as a plugin.
+    is_valid_plugin = True
+
+    def __init__(self, label: str = "socket_api") -> None:
+        super().__init__(label)
+        self.description = "Local socket API for headless operation."
+
+        self.socket_path: str = SOCKET_PATH
+        self._server: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # Connected clients. Added and removed by the socket thread.
+        self._clients: Dict[int, socket.socket] = {}
+        self._clients_lock = threading.Lock()
+        self._client_count = 0
+        # Data waiting to be written to each client by the socket thread.
+        # {client_id: data}
+        self._output: Dict[int, bytearray] = {}
+        # Clients the socket thread should disconnect.
+        self._dropping: Set[int] = set()
+        # Written to by the main thread to wake the socket thread.
+        self._wakeup_read: Optional[socket.socket] = None
+        self._wakeup_write: Optional[socket.socket] = None
+
+        # {event_name: {client_id}}
+        self._client_subscriptions: Dict[str, Set[int]] = {}
+        # Entries added to event_subscriptions on behalf of clients. Removed
+        # again once no client wants them.
+        self._client_events: Set[str] = set()
+
+        # Requests from clients and disconnections are passed from the socket
+        # thread to the main thread as events.
+        self.event_subscriptions[self.key_gen("request")] = None
+        self.event_subscriptions[self.key_gen("disconnected")] = None
+
+    def setup(self,
+              interfaces: Dict[str, _InterfaceBase],
+              controllers: Dict[str, _ControllerBase],
+              controller_classes: Dict[str, Type[_ControllerBase]]) -> None:
+        """ Start listening for clients. """
+        super().setup(interfaces, controllers, controller_classes)
+        if self._server:
+            return
+
+        socket_dir = os.path.dirname(self.socket_path)
+        if socket_dir:
+            os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+
+        if os.path.lexists(self.socket_path):
+            if not stat.S_ISSOCK(os.lstat(self.socket_path).st_mode):
+                raise OSError(errno.EEXIST, "Not a socket", self.socket_path)
+            if self._socket_in_use():
+                raise OSError(errno.EADDRINUSE, "Socket API already running", self.socket_path)
+            # Left over from a previous run.
+            os.unlink(self.socket_path)
+
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Anyone who can connect can move the machine so only the current
+        # user may. The umask covers the moment between bind() and chmod().
+        umask = os.umask(0o077)
+        try:
+            self._server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        self._server.listen()
+        print("Socket API listening on %s" % self.socket_path)
+
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _socket_in_use(self) -> bool:
+        """ Another process is listening on `socket_path`. """
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            return False
+        finally:
+            probe.close()
+        return True
+
+    def _serve(self) -> None:
+        """ Accept clients, read their requests and write their output.
+        Called from a separate thread. The only place client sockets are
+        read, written or closed. """
+        assert self._server and self._wakeup_read, "Socket not open."
+        selector = selectors.DefaultSelector()
+        selector.register(self._server, selectors.EVENT_READ)
+        selector.register(self._wakeup_read, selectors.EVENT_READ)
+        buffers: Dict[int, bytes] = {}
+
+        while self._running:
+            for key, events in selector.select(timeout=0.5):
+                if key.fileobj is self._server:
+                    try:
+                        client, _ = self._server.accept()
+                    except OSError:
+                        continue
+                    client.setblocking(False)
+                    with self._clients_lock:
+                        self._client_count += 1
+                        client_id = self._client_count
+                        self._clients[client_id] = client
+                    buffers[client_id] = b""
+                    selector.register(client, selectors.EVENT_READ, client_id)
+                    continue
+
+                if key.fileobj is self._wakeup_read:
+                    try:
+                        while self._wakeup_read.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                client_id = key.data
+                if events & selectors.EVENT_WRITE:
+                    self._flush(client_id)
+
+                if events & selectors.EVENT_READ:
+                    try:
+                        data = key.fileobj.recv(4096)  # type: ignore
+                    except BlockingIOError:
+                        continue
+                    except OSError:
+                        data = b""
+                    if not data:
+                        with self._clients_lock:
+                            self._dropping.add(client_id)
+                        continue
+
+                    buffers[client_id] += data
+                    *lines, buffers[client_id] = buffers[client_id].split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            self.publish(self.key_gen("request"), (client_id, line))
+
+            self._update_selector(selector, buffers)
+
+        selector.close()
+
+    def _update_selector(self, selector: selectors.BaseSelector,
+                         buffers: Dict[int, bytes]) -> None:
+        """ Disconnect clients marked for dropping and watch clients with
+        output waiting for when they can be written to.
+        Called from the socket thread. """
+        with self._clients_lock:
+            dropping = self._dropping
+            self._dropping = set()
+            clients = [(client_id, client, bool(self._output.get(client_id)))
+                       for client_id, client in self._clients.items()]
+
+        for client_id, client, writing in clients:
+            if client_id in dropping:
+                selector.unregister(client)
+                buffers.pop(client_id, None)
+                self._drop_client(client_id)
+                continue
+            events = selectors.EVENT_READ
+            if writing:
+                events |= selectors.EVENT_WRITE
+            if selector.get_key(client).events != events:
+                selector.modify(client, events, client_id)
+
+    def _flush(self, client_id: int) -> None:
+        """ Write as much of a client's output as it will take without blocking.
+        Called from the socket thread. """
+        with self._clients_lock:
+            client = self._clients.get(client_id)
+            output = self._output.get(client_id)
+            if client is None or not output:
+                return
+            data = bytes(output)
+        try:
+            sent = client.send(data)
+        except BlockingIOError:
+            return
+        except OSError:
+            with self._clients_lock:
+                self._dropping.add(client_id)
+            return
+        with self._clients_lock:
+            # Only ever appended to by other threads.
+            del output[:sent]
+
+    def _drop_client(self, client_id: int) -> None:
+        """ Close a client's connection. The main thread then drops its
+        subscriptions. See `_on_disconnected()`. """
+        with self._clients_lock:
+            client = self._clients.pop(client_id, None)
+            self._output.pop(client_id, None)
+        if client:
+            client.close()
+            self.publish(self.key_gen("disconnected"), client_id)
+
+    def _on_disconnected(self, client_id: int) -> None:
+        """ Remove a client's subscriptions once it has disconnected. """
+        for event_name in list(self._client_subscriptions):
+            self._unsubscribe(client_id, event_name)
+
+    def _subscribe(self, client_id: int, event_name: str) -> None:
+        """ Start sending an event to a client. """
+        self._client_subscriptions.setdefault(event_name, set()).add(client_id)
+        if event_name not in self.event_subscriptions:
+            self.event_subscriptions[event_name] = None
+            self._client_events.add(event_name)
+
+    def _unsubscribe(self, client_id: int, event_name: str) -> None:
+        """ Stop sending an event to a client. Stop receiving it altogether
+        once no client wants it. """
+        clients = self._client_subscriptions.get(event_name)
+        if clients is None:
+            return
+        clients.discard(client_id)
+        if clients:
+            return
+        del self._client_subscriptions[event_name]
+        if event_name in self._client_events:
+            self._client_events.discard(event_name)
+            del self.event_subscriptions[event_name]
+
+    def _on_request(self, client_id: int, line: bytes) -> None:
+        """ Act on a request from a client. """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request is not a JSON object.")
+        except ValueError as error:
+            self._send(client_id, {"error": str(error)})
+            return
+
+        error = self._check_request(request)
+        if error:
+            self._send(client_id, {"error": error})
+            return
+
+        if "subscribe" in request:
+            self._subscribe(client_id, request["subscribe"])
+        elif "unsubscribe" in request:
+            self._unsubscribe(client_id, request["unsubscribe"])
+        elif "publish" in request:
+            self.publish(request["publish"],
+                         request.get("value"),
+                         priority=request.get("priority", False))
+        else:
+            self._send(client_id, {"error": "Unknown request: %s" % line.decode()})
+
+    @staticmethod
+    def _check_request(request: Dict[str, Any]) -> Optional[str]:
+        """ Check the fields of a request have the right types.
+        Returns:
+            A description of the problem or None if there isn't one. """
+        for field in ("subscribe", "unsubscribe", "publish"):
+            if field not in request:
+                continue
+            event_name = request[field]
+            if not isinstance(event_name, str) or ":" not in event_name:
+                return "\"%s\" must be an event name. eg: \"component:event\"" % field
+        if not isinstance(request.get("priority", False), bool):
+            return "\"priority\" must be true or false."
+        return None
+
+    def _send(self, client_id: int, message: Dict[str, Any]) -> None:
+        """ Queue a message for a client. The socket thread writes it so a slow
+        client can't stall the main loop. """
+        data = json.dumps(message, default=_json_default).encode() + b"\n"
+        with self._clients_lock:
+            if client_id not in self._clients or client_id in self._dropping:
+                return
+            output = self._output.setdefault(client_id, bytearray())
+            wake = not output
+            output += data
+            if len(output) > MAX_PENDING_OUTPUT:
+                print("Socket API client %s is not keeping up. Disconnecting." % client_id)
+                self._dropping.add(client_id)
+                wake = True
+        if wake:
+            self._wake_socket_thread()
+
+    def _wake_socket_thread(self) -> None:
+        """ Have the socket thread return from select(). """
+        if not self._wakeup_write:
+            return
+        try:
+            self._wakeup_write.send(b"\0")
+        except BlockingIOError:
+            # Already plenty of wakeups waiting.
+            pass
+
+    def early_update(self) -> bool:
+        """ Nothing to poll. Requests arrive as events. """
+        return True
+
+    def next_update_in(self) -> Optional[float]:
+        """ Only needs to run when events arrive. """
+        return None
+
+    def on_receive(self) -> None:
+        """ Called as soon as events have been delivered to this component. """
+        while self._delivered:
+            event, value = self._delivered.popleft()
+
+            if event == self.key_gen("request"):
+                self._on_request(*value)
+                continue
+            if event == self.key_gen("disconnected"):
+                self._on_disconnected(value)
+                continue
+
+            for client_id in list(self._client_subscriptions.get(event, ())):
+                self._send(client_id, {"event": event, "value": value})
+
+    def close(self) -> None:
+        """ Stop listening and disconnect all clients. """
+        self._running = False
+        if self._thread:
+            self._wake_socket_thread()
+            self._thread.join()
+            self._thread = None
+        if self._server:
+            self._server.close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        for wakeup in (self._wakeup_read, self._wakeup_write):
+            if wakeup:
+                wakeup.close()
+        self._wakeup_read = self._wakeup_write = None
+        with self._clients_lock:
+            client_ids = list(self._clients)
+        for client_id in client_ids:
+            self._drop_client(client_id)
@@ -5,15 +5,33 @@
 
 #pylint: disable=protected-access
 
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import threading
 import unittest
 import loader  # pylint: disable=E0401,W0611
+import core.common
 from core.coordinator import Coordinator
+from core.async_coordinator import AsyncCoordinator
+from core.event_registry import EventRegistry
+from core.instrumentation import Instrumentation
+from core.inbox import Inbox
+from core.clock import VirtualClock
+from core.journal import Journal, read_journal, replay, encode_value, decode_value
+from core.component import _ComponentBase
+from core.payloads import Move, Overrides, Position
 from controllers.debug import DebugController
 from controllers.mock_controller import MockController
+from controllers.state_machine import StateMachineBase
 from interfaces.jog import JogWidget
 from definitions import ConnectionState
 
 from controllers import debug
+import numpy
+from pygcode import Line
 
 
 
@@ -389,7 +407,8 @@ class TestCoordinator(unittest.TestCase):
         self.coordinator.update_components()  # Push event from queue to mock_controller.
 
         self.assertEqual(len(self.mock_controller.log), 1)
-        self.assertEqual(self.mock_controller.log[-1], ("command", "move_absolute", data))
+        self.assertEqual(self.mock_controller.log[-1],
+                         ("command", "move_absolute", Move(x=10, y=20, f=100)))
 
         # Send more data to controller.
         data = {"X": 1.2345, "Y": -6.7889, "F": 1000}
@@ -398,7 +417,8 @@ class TestCoordinator(unittest.TestCase):
         self.coordinator.update_components()  # Push event from queue to mock_controller.
 
         self.assertEqual(len(self.mock_controller.log), 2)
-        self.assertEqual(self.mock_controller.log[-1], ("command", "move_absolute", data))
+        self.assertEqual(self.mock_controller.log[-1],
+                         ("command", "move_absolute", Move(x=1.2345, y=-6.7889, f=1000)))
 
     def test_swap_controllers(self):
         """ Push to one controller, set a different controller active, push there
@@ -589,6 +609,62 @@ class TestEvents(unittest.TestCase):
         # No value specified by `publish(...)` so use the one in `event_subscriptions`.
         self.assertIn("default", callback_received_2)
 
+    def test_publish_event_to_callback_with_name(self):
+        """ Callbacks taking 2 arguments are passed the event name too. """
+        callback_received = []
+        self.mock_widget.callback = \
+                lambda name, value: callback_received.append((name, value))
+        self.mock_widget.event_subscriptions = {"pubSub1": ("callback", None)}
+
+        self.mock_controller.publish("pubSub1", "root")
+        self.mock_widget.receive()
+        self.mock_widget._update()
+
+        self.assertEqual(callback_received, [("pubSub1", "root")])
+
+    def test_publish_event_callback_type_error(self):
+        """ A TypeError raised inside a callback is not hidden. """
+        def callback(value):
+            raise TypeError("Bug in callback: %s" % value)
+        self.mock_widget.callback = callback
+        self.mock_widget.event_subscriptions = {"pubSub1": ("callback", None)}
+
+        self.mock_controller.publish("pubSub1", "root")
+        self.mock_widget.receive()
+        with self.assertRaises(TypeError):
+            self.mock_widget._update()
+
+    def test_dispatch_table_rebuilt(self):
+        """ Changing event_subscriptions takes effect on the next `_update()`. """
+        self.mock_widget.value_1 = None
+        self.mock_widget.value_2 = None
+        self.mock_widget.event_subscriptions = {"pubSub1": ("value_1", None)}
+
+        self.mock_controller.publish("pubSub1", "root")
+        self.mock_widget.receive()
+        self.mock_widget._update()
+        self.mock_widget._delivered.clear()
+        self.mock_widget._event_queue.clear()
+        self.mock_widget._delay_events[0] = False
+        self.assertEqual(self.mock_widget.value_1, "root")
+
+        self.mock_widget.event_subscriptions["pubSub1"] = ("value_2", None)
+        self.mock_controller.publish("pubSub1", "toot")
+        self.mock_widget.receive()
+        self.mock_widget._update()
+        self.assertEqual(self.mock_widget.value_1, "root")
+        self.assertEqual(self.mock_widget.value_2, "toot")
+
+    def test_event_registry(self):
+        """ Event names are interned and map to stable IDs. """
+        name = self.mock_widget.key_gen("registry_test")
+        self.assertEqual(name, "%s:registry_test" % self.mock_widget.label)
+        self.assertIs(name, self.mock_widget.key_gen("registry_test"))
+
+        event_id = EventRegistry.id_of(name)
+        self.assertEqual(event_id, EventRegistry.id_of("%s:registry_test" % self.mock_widget.label))
+        self.assertIs(EventRegistry.name_of(event_id), name)
+
     def test_publish_event_to_variable(self):
         """ Store in variable on receiving event. """
 
@@ -665,6 +741,898 @@ class TestEvents(unittest.TestCase):
         self.assertEqual(len(self.mock_widget._delayed_event_queue), 0)
         self.assertEqual(self.mock_widget._event_queue[0], ("pubSub2", "toot"))
 
+    def test_indexed_delivery(self):
+        """ The coordinator delivers events only to subscribed components. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+        controller = self.coordinator.controllers["mockController"]
+        controller._delivered.clear()
+
+        self.mock_widget.event_subscriptions = {
+            "pubSub1": None,
+            "pubSub2": None,
+            }
+        self.coordinator.publish("pubSub1", "root")
+        self.coordinator.publish("pubSub2", "toot")
+        self.coordinator.publish("pubSub3", "boot")
+
+        self.coordinator._deliver_events()
+
+        self.assertEqual(list(self.mock_widget._delivered),
+                         [("pubSub1", "root"), ("pubSub2", "toot")])
+        self.assertEqual(len(controller._delivered), 0)
+
+        self.coordinator._clear_events()
+        self.mock_widget._delivered.clear()
+
+    def test_indexed_delivery_subscription_change(self):
+        """ Modifying event_subscriptions after the index was built takes effect
+        on the next delivery. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+
+        self.mock_widget.event_subscriptions = {"pubSub1": None}
+        self.coordinator.publish("pubSub2", "toot")
+        self.coordinator._deliver_events()
+        self.assertEqual(len(self.mock_widget._delivered), 0)
+        self.coordinator._clear_events()
+
+        # Mutating the dict in place is noticed.
+        version = self.coordinator._subscriptions_version[0]
+        self.mock_widget.event_subscriptions["pubSub2"] = None
+        self.assertNotEqual(version, self.coordinator._subscriptions_version[0])
+
+        self.coordinator.publish("pubSub2", "toot")
+        self.coordinator._deliver_events()
+        self.assertEqual(list(self.mock_widget._delivered), [("pubSub2", "toot")])
+
+        self.coordinator._clear_events()
+        self.mock_widget._delivered.clear()
+
+    def test_active_controller_alias(self):
+        """ Subscriptions to "active_controller:xxxx" receive the active
+        controller's events without them being copied in the queue. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'},
+                                                'owl': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator.activate_controller(label="mockController")
+        self.coordinator._event_queue.clear()
+
+        self.mock_widget.event_subscriptions = {"active_controller:work_pos:x": None}
+        self.coordinator.publish("mockController:work_pos:x", 1)
+        self.coordinator.publish("owl:work_pos:x", 2)
+        self.coordinator._deliver_events()
+
+        self.assertEqual(len(self.coordinator._event_queue), 2)
+        self.assertEqual(list(self.mock_widget._delivered),
+                         [("active_controller:work_pos:x", 1)])
+        self.coordinator._clear_events()
+        self.mock_widget._delivered.clear()
+
+        # Changing the active controller rebinds the subscription.
+        self.coordinator.activate_controller(label="owl")
+        self.coordinator.publish("mockController:work_pos:x", 3)
+        self.coordinator.publish("owl:work_pos:x", 4)
+        self.coordinator._deliver_events()
+
+        self.assertEqual(list(self.mock_widget._delivered),
+                         [("active_controller:work_pos:x", 4)])
+        self.coordinator._clear_events()
+        self.mock_widget._delivered.clear()
+
+    def test_update_interval(self):
+        """ Components are only updated at their `update_interval` but still
+        receive every event, in order. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+
+        updates = []
+        received = []
+        self.mock_widget.update_interval = 60
+        self.mock_widget.needs_tick = True
+        self.mock_widget.update = lambda: updates.append(list(received))
+        self.mock_widget.on_receive = lambda: received.append(len(self.mock_widget._delivered))
+        self.mock_widget.value = None
+        self.mock_widget.event_subscriptions = {"pubSub1": ("value", None)}
+
+        # First pass: component is due.
+        self.coordinator.update_components()
+        self.assertEqual(len(updates), 1)
+
+        # Not due again for a while but events are still delivered.
+        self.coordinator.publish("pubSub1", "root")
+        self.coordinator.update_components()
+        self.coordinator.publish("pubSub1", "toot")
+        self.coordinator.update_components()
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(received, [1, 2])
+        self.assertIsNone(self.mock_widget.value)
+        self.assertEqual(list(self.mock_widget._delivered),
+                         [("pubSub1", "root"), ("pubSub1", "toot")])
+
+        # When due, all accumulated events are processed.
+        self.mock_widget._next_update_at = 0
+        self.coordinator.update_components()
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.mock_widget.value, "toot")
+        self.assertEqual(len(self.mock_widget._delivered), 0)
+
+        # Other components were updated every pass.
+        self.assertEqual(self.coordinator.controllers["mockController"].update_interval, 0)
+
+    def test_idle_components(self):
+        """ Components that don't need ticks are only updated when events are
+        delivered to them or they are dirty. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+
+        updates = []
+        # JogWidget polls the controller state so normally needs ticks.
+        self.mock_widget.needs_tick = False
+        self.mock_widget.update = lambda: updates.append(self.mock_widget.value)
+        self.mock_widget.value = None
+        self.mock_widget.event_subscriptions = {"pubSub1": ("value", None)}
+
+        self.coordinator.update_components()
+        self.assertEqual(updates, [])
+
+        self.coordinator.publish("pubSub1", "root")
+        self.coordinator.update_components()
+        self.coordinator.update_components()
+        self.assertEqual(updates, ["root"])
+
+        self.mock_widget.dirty = True
+        self.coordinator.update_components()
+        self.assertEqual(updates, ["root", "root"])
+
+        self.mock_widget.dirty = False
+        self.mock_widget.needs_tick = True
+        self.coordinator.update_components()
+        self.assertEqual(updates, ["root", "root", "root"])
+
+    def test_priority_events(self):
+        """ Priority events are handled at the start of the next update, ahead
+        of the regular queue. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+
+        received = []
+        self.mock_widget.callback = lambda name, value: received.append((name, value))
+        self.mock_widget.event_subscriptions = {
+            "pubSub1": ("callback", None),
+            "pubSub2": ("callback", None),
+            }
+
+        self.coordinator._wakeup.clear()
+        self.coordinator.publish("pubSub1", "root")
+        self.coordinator.publish("pubSub2", "toot", priority=True)
+        self.assertTrue(self.coordinator._wakeup.is_set())
+        self.assertEqual(len(self.coordinator._event_queue), 1)
+        self.assertEqual(self.coordinator._wait_timeout(), 0)
+
+        self.coordinator.update_components()
+
+        self.assertEqual(received, [("pubSub2", "toot"), ("pubSub1", "root")])
+        self.assertEqual(len(self.coordinator._priority_event_queue), 0)
+
+    def test_publish_from_thread(self):
+        """ Events published from other threads are held in the inbox until the
+        Coordinator's next update. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+
+        self.mock_widget.value = None
+        self.mock_widget.event_subscriptions = {"pubSub1": ("value", None)}
+
+        thread = threading.Thread(
+            target=lambda: self.mock_controller.publish("pubSub1", "root"))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(len(self.coordinator._event_queue), 0)
+        self.assertEqual(len(self.coordinator._inbox), 1)
+
+        self.coordinator.update_components()
+
+        self.assertEqual(self.mock_widget.value, "root")
+        self.assertEqual(len(self.coordinator._inbox), 0)
+
+    def test_coalesce_state_events(self):
+        """ Only the most recent value of a "state" event is kept but all other
+        events are kept in order. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+
+        self.coordinator.publish("owl:machine_pos:x", 1, coalesce=True)
+        self.coordinator.publish("command:gcode", "G0 X1")
+        self.coordinator.publish("owl:machine_pos:x", 2, coalesce=True)
+        self.coordinator.publish("owl:machine_pos:y", 5, coalesce=True)
+        self.coordinator.publish("command:gcode", "G0 X2")
+        self.coordinator.publish("owl:machine_pos:x", 3, coalesce=True)
+        self.coordinator.publish("command:gcode", "G0 X2")
+
+        self.coordinator._coalesce_events()
+
+        self.assertEqual(list(self.coordinator._event_queue), [
+            ("command:gcode", "G0 X1"),
+            ("owl:machine_pos:y", 5),
+            ("command:gcode", "G0 X2"),
+            ("owl:machine_pos:x", 3),
+            ("command:gcode", "G0 X2"),
+            ])
+
+    def test_coalesce_only_coalescable(self):
+        """ Events published without coalesce are never dropped, even if the
+        same event name was published with coalesce=True earlier. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+
+        self.coordinator.publish("user_feedback:message", "a", coalesce=True)
+        self.coordinator.publish("user_feedback:message", "b", coalesce=True)
+        self.coordinator.publish("user_feedback:message", "c")
+        self.coordinator.publish("user_feedback:message", "d")
+        self.coordinator._coalesce_events()
+
+        self.assertEqual(list(self.coordinator._event_queue), [
+            ("user_feedback:message", "c"),
+            ("user_feedback:message", "d"),
+            ])
+
+        # Nothing left over from earlier publishes affects later ones.
+        self.coordinator._event_queue.clear()
+        self.coordinator.publish("user_feedback:message", "e")
+        self.coordinator.publish("user_feedback:message", "f")
+        self.coordinator.publish("owl:machine_pos:x", 1, coalesce=True)
+        self.coordinator.publish("owl:machine_pos:x", 2, coalesce=True)
+        self.coordinator._coalesce_events()
+
+        self.assertEqual(list(self.coordinator._event_queue), [
+            ("user_feedback:message", "e"),
+            ("user_feedback:message", "f"),
+            ("owl:machine_pos:x", 2),
+            ])
+
+    def test_delayed_events_keep_order(self):
+        """ Events published while events are being delivered are moved to the
+        main queue in the order they were published. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+
+        self.coordinator._deliver_events()
+        self.coordinator.publish("command:gcode", "G0 X1")
+        self.coordinator.publish("command:gcode", "G0 X2")
+        self.coordinator._clear_events()
+
+        self.assertEqual(list(self.coordinator._event_queue), [
+            ("command:gcode", "G0 X1"),
+            ("command:gcode", "G0 X2"),
+            ])
+
+
+    def test_wait_returns_on_pending_events(self):
+        """ Coordinator.wait() does not sleep when there is work queued. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+
+        self.coordinator.publish("command:gcode", "G0 X1")
+        start = time.time()
+        self.coordinator.wait()
+        self.assertLess(time.time() - start, 0.1)
+
+        self.coordinator._event_queue.clear()
+
+    def test_wait_returns_when_dirty(self):
+        """ Coordinator.wait() does not sleep while a component is dirty. """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+        self.coordinator._wakeup.clear()
+        for component in self.coordinator.all_components:
+            component.next_update_in = lambda: None
+        self.mock_widget.needs_tick = False
+
+        self.mock_widget.dirty = True
+        start = time.time()
+        self.coordinator.wait()
+        self.assertLess(time.time() - start, 0.1)
+
+    def test_wait_returns_on_wake(self):
+        """ Coordinator.wait() returns as soon as a component calls wake(). """
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+        self.coordinator._wakeup.clear()
+
+        # Nothing to do so the full idle period is waited.
+        for component in self.coordinator.all_components:
+            component.next_update_in = lambda: None
+        self.mock_widget.next_update_in = lambda: 0.05
+        start = time.time()
+        self.coordinator.wait()
+        self.assertGreaterEqual(time.time() - start, 0.04)
+
+        # A component calling wake() from another thread ends the wait early.
+        self.mock_widget.next_update_in = lambda: None
+        timer = threading.Timer(0.01, self.mock_controller.wake)
+        timer.start()
+        start = time.time()
+        self.coordinator.wait()
+        self.assertLess(time.time() - start, 0.25)
+        timer.join()
+        self.coordinator._wakeup.clear()
+
+
+class TestAsyncCoordinator(unittest.TestCase):
+    """ Running components on an asyncio event loop. """
+
+    def setUp(self):
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+
+        AsyncCoordinator._load_config = coordinator_load_config
+
+        self.mock_widget = JogWidget()
+        self.coordinator = AsyncCoordinator([], [self.mock_widget], [MockController])
+        self.mock_controller = self.coordinator.controllers["mockController"]
+        self.coordinator._event_queue.clear()
+
+    def tearDown(self):
+        self.coordinator._event_queue.clear()
+        self.coordinator._timers.clear()
+
+    def test_sync_and_async_components(self):
+        """ Plain methods are called and coroutines awaited. """
+        calls = []
+
+        async def early_update():
+            await asyncio.sleep(0)
+            calls.append("async")
+            return True
+
+        def update():
+            calls.append("sync")
+
+        self.mock_widget.early_update = early_update
+        self.mock_controller.update = update
+        self.mock_controller.needs_tick = True
+
+        asyncio.run(self.coordinator.update_components_async())
+
+        self.assertEqual(calls, ["async", "sync"])
+
+    def test_sync_coordinator_rejects_coroutines(self):
+        """ The synchronous Coordinator can not run coroutines. """
+        class Awaitable:
+            """ Something that needs awaited. """
+            def __await__(self):
+                yield
+                return True
+
+        self.mock_widget.early_update = Awaitable
+
+        with self.assertRaises(AssertionError):
+            self.coordinator.update_components()
+
+    def test_call_later(self):
+        """ Timers fire from the main loop once due. """
+        calls = []
+
+        self.mock_widget.call_later(0, lambda: calls.append("now"))
+        self.mock_widget.call_later(10, lambda: calls.append("later"))
+        asyncio.run(self.coordinator.update_components_async())
+
+        self.assertEqual(calls, ["now"])
+        self.assertEqual(len(self.coordinator._timers), 1)
+        self.assertGreater(self.coordinator._timers[0][0], time.monotonic())
+
+
+class TestInstrumentation(unittest.TestCase):
+    """ Profiling the main loop. """
+
+    def setUp(self):
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config =  {'controllers': {'mockController': {'type': 'MockController'}}}
+
+        Coordinator._load_config = coordinator_load_config
+
+        self.mock_widget = JogWidget()
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.mock_controller = self.coordinator.controllers["mockController"]
+        self.coordinator._event_queue.clear()
+
+    def tearDown(self):
+        self.coordinator._event_queue.clear()
+        self.coordinator.instrumentation = None
+
+    def test_disabled_by_default(self):
+        """ No instrumentation unless asked for. """
+        self.assertIsNone(self.coordinator.instrumentation)
+
+    def test_collect(self):
+        """ Phase timings, event counts and tick intervals are recorded. """
+        instrumentation = Instrumentation()
+        self.coordinator.instrumentation = instrumentation
+
+        self.mock_widget.event_subscriptions["pubSub1"] = None
+        self.coordinator.publish("pubSub1", "root")
+        self.coordinator.publish("pubSub1", "toot")
+        self.coordinator.publish("pubSub2", "boot")
+        self.coordinator.update_components()
+        self.coordinator.update_components()
+
+        self.assertEqual(instrumentation.ticks, 2)
+        self.assertEqual(sum(instrumentation.tick_intervals), 1)
+        self.assertEqual(instrumentation.phases[("mockController", "early_update")].count, 2)
+        # JogWidget polls the controller state so is updated every pass.
+        self.assertEqual(instrumentation.phases[(self.mock_widget.label, "update")].count, 2)
+        self.assertEqual(instrumentation.published["pubSub1"], 2)
+        self.assertEqual(instrumentation.delivered["pubSub1"], 2)
+        self.assertEqual(instrumentation.published["pubSub2"], 1)
+        self.assertNotIn("pubSub2", instrumentation.delivered)
+        self.assertGreaterEqual(instrumentation.max_queue_depth, 3)
+
+        self.assertIn("pubSub1", instrumentation.summary())
+
+        instrumentation.reset()
+        self.assertEqual(instrumentation.ticks, 0)
+        self.assertFalse(instrumentation.phases)
+
+    def test_count_every_publish(self):
+        """ Events merged by coalescing, priority events and events from other
+        threads are all counted as published. """
+        instrumentation = Instrumentation()
+        self.coordinator.instrumentation = instrumentation
+        self.mock_widget.event_subscriptions["pubSub1"] = None
+        self.mock_widget.event_subscriptions["pubSub2"] = None
+
+        self.coordinator.publish("pubSub1", "root", coalesce=True)
+        self.coordinator.publish("pubSub1", "toot", coalesce=True)
+        self.mock_widget.publish("pubSub2", "boot", priority=True)
+        thread = threading.Thread(target=self.mock_widget.publish, args=("pubSub1", "shoot"))
+        thread.start()
+        thread.join()
+        self.coordinator.update_components()
+
+        self.assertEqual(instrumentation.published["pubSub1"], 3)
+        self.assertEqual(instrumentation.published["pubSub2"], 1)
+        # Only the latest coalesced value is delivered. The priority event
+        # is delivered straight away.
+        self.assertEqual(instrumentation.delivered["pubSub1"], 1)
+        self.assertEqual(instrumentation.delivered["pubSub2"], 1)
+
+
+class TestJournal(unittest.TestCase):
+    """ Recording and replaying events. """
+
+    def setUp(self):
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config = {'controllers': {'mockController': {'type': 'MockController'}}}
+        Coordinator._load_config = coordinator_load_config
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.filename = os.path.join(temp_dir.name, "test.journal")
+
+        self.mock_widget = JogWidget()
+        self.coordinator = Coordinator([], [self.mock_widget], [MockController])
+        self.coordinator._event_queue.clear()
+        self.mock_widget.value = None
+        self.mock_widget.event_subscriptions = {"pubSub1": ("value", None)}
+
+    def test_encode_values(self):
+        """ Values survive being written and read back. """
+        values = [None, True, False, 0, -3, 2**70, 1.5, "text", b"bytes",
+                  (1, "a"), [1, [2.5]], {"x": 1.0, "y": -2}, ConnectionState.CONNECTED,
+                  Position((1.0, -2.5)), Move(x=1, f=100), Overrides(50, 100, 120)]
+        for value in values:
+            encoded = bytearray()
+            encode_value(encoded, value)
+            self.assertEqual(decode_value(bytes(encoded), 0), (value, len(encoded)))
+            self.assertIs(type(decode_value(bytes(encoded), 0)[0]), type(value))
+
+        array = numpy.arange(6, dtype=float).reshape((2, 3))
+        encoded = bytearray()
+        encode_value(encoded, array)
+        decoded, _ = decode_value(bytes(encoded), 0)
+        self.assertTrue(numpy.array_equal(decoded, array))
+        self.assertEqual(decoded.dtype, array.dtype)
+
+        block = Line("G01 X1.5 Y-2 F100").block
+        encoded = bytearray()
+        encode_value(encoded, block)
+        self.assertEqual(str(decode_value(bytes(encoded), 0)[0]), str(block))
+
+    def test_record(self):
+        """ Published events are recorded with the tick they were published in
+        and the component that published them. """
+        journal = Journal(self.filename).start()
+        gui = _ComponentBase("gui")
+        gui.publish("pubSub1", "root")
+        self.coordinator.update_components()
+        gui.publish("pubSub1", "branch", coalesce=True)
+        self.coordinator.update_components()
+        journal.stop()
+        self.assertIsNone(_ComponentBase._journal[0])
+
+        events = [event for event in read_journal(self.filename) if event.source == "gui"]
+        self.assertEqual([(event.tick, event.name, event.value, event.coalesce)
+                          for event in events],
+                         [(0, "pubSub1", "root", False), (1, "pubSub1", "branch", True)])
+        self.assertLessEqual(events[0].timestamp, events[1].timestamp)
+
+    def test_replay(self):
+        """ Only events from components missing from the Coordinator are
+        replayed, using a simulated clock. """
+        # Let the JogWidget mirror the initial machine state before recording.
+        self.coordinator.update_components()
+        journal = Journal(self.filename).start()
+        gui = _ComponentBase("gui")
+        gui.publish("pubSub1", "root")
+        self.mock_widget.publish("pubSub1", "not replayed")
+        self.coordinator.update_components()
+        journal.stop()
+
+        self.mock_widget.value = None
+        clocks = []
+        self.mock_widget.event_subscriptions = {"pubSub1": ("_record", None)}
+        self.mock_widget._record = lambda value: clocks.append(
+            (value, _ComponentBase._clock[0]))
+
+        clock = _ComponentBase._clock[0]
+        self.assertEqual(replay(self.filename, self.coordinator), 1)
+
+        self.assertEqual([value for value, _ in clocks], ["root"])
+        self.assertIsInstance(clocks[0][1], VirtualClock)
+        self.assertIs(_ComponentBase._clock[0], clock)
+
+
+class TestVirtualClock(unittest.TestCase):
+    """ Running the whole system on simulated time. """
+
+    def setUp(self):
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config = {'controllers': {'debug': {'type': 'DebugController'}}}
+        Coordinator._load_config = coordinator_load_config
+
+        self.clock = VirtualClock()
+        self.original_clock = _ComponentBase.set_clock(self.clock)
+
+        self.coordinator = Coordinator([], [], [DebugController])
+        self.coordinator._event_queue.clear()
+        self.controller = self.coordinator.controllers["debug"]
+
+    def tearDown(self):
+        _ComponentBase.set_clock(self.original_clock)
+        self.coordinator._event_queue.clear()
+        self.coordinator._timers.clear()
+        self.coordinator.close()
+
+    def _run(self, until, ticks=100):
+        """ Run the main loop until `until()` is True. """
+        for _ in range(ticks):
+            if until():
+                return
+            self.coordinator.update_components()
+            self.coordinator.wait()
+
+    def test_clock(self):
+        """ Time only moves when advanced, sleeping or waiting. """
+        event = threading.Event()
+        start = self.clock.time()
+        self.clock.advance(2)
+        self.clock.sleep(3)
+        self.assertFalse(self.clock.wait(event, 5))
+        self.assertEqual(self.clock.monotonic(), 10)
+        self.assertEqual(self.clock.time() - start, 10)
+
+        event.set()
+        self.assertTrue(self.clock.wait(event, 5))
+        self.assertEqual(self.clock.monotonic(), 10)
+
+    def test_controller_delays(self):
+        """ Controller delays pass in simulated time. """
+        started = time.monotonic()
+        self.controller.publish("debug:connect", None)
+        self._run(lambda: self.controller.connection_status is ConnectionState.CONNECTED)
+
+        self.assertIs(self.controller.connection_status, ConnectionState.CONNECTED)
+        self.assertGreaterEqual(self.clock.monotonic(), debug.CONNECT_DELAY)
+        self.assertLess(time.monotonic() - started, debug.CONNECT_DELAY)
+
+    def test_call_later(self):
+        """ Timers fire in simulated time. """
+        called = []
+        self.controller.call_later(60, lambda: called.append(self.clock.monotonic()))
+        self._run(lambda: called, ticks=1000)
+
+        self.assertEqual(len(called), 1)
+        self.assertGreaterEqual(called[0], 60)
+
+
+class TestPayloads(unittest.TestCase):
+    """ Typed, immutable event payloads. """
+
+    def test_position(self):
+        """ Positions behave as read only dicts. """
+        position = Position({"x": 1.0, "y": 2.0})
+        self.assertEqual(position, {"x": 1.0, "y": 2.0, "z": 0, "a": 0, "b": 0})
+        self.assertEqual(position["y"], 2.0)
+        self.assertEqual(list(position), ["x", "y", "z", "a", "b"])
+        with self.assertRaises(TypeError):
+            position["x"] = 3.0  # pylint: disable=E1137
+        with self.assertRaises(AttributeError):
+            position.values = (3.0,)
+
+        self.assertIs(position.replace({"X": 1.0, "q": 5, "y": None}), position)
+        moved = position.replace({"X": 3.0})
+        self.assertEqual(moved, Position((3.0, 2.0)))
+        self.assertEqual(position["x"], 1.0)
+
+    def test_move(self):
+        """ Moves only contain the parameters that were set. """
+        move = Move.from_dict({"X": 1, "f": 100})
+        self.assertEqual(dict(move), {"x": 1, "f": 100})
+        self.assertNotIn("y", move)
+        with self.assertRaises(AttributeError):
+            move.x = 2
+
+    def test_state_machine(self):
+        """ Subscribers receive payloads that can't change the state machine. """
+        published = {}
+        state = StateMachineBase(published.__setitem__)
+
+        state.work_offset = {"x": 1}
+        state.machine_pos = {"x": 5, "Y": 6}
+        self.assertIsInstance(published["machine_pos"], Position)
+        self.assertIs(published["machine_pos"], state.machine_pos)
+        self.assertEqual(published["work_pos"], {"x": 4, "y": 6, "z": 0, "a": 0, "b": 0})
+        self.assertEqual(published["work_pos:x"], 4)
+
+        published.clear()
+        state.machine_pos = {"x": 5}
+        self.assertEqual(published, {})
+
+    def test_snapshot(self):
+        """ Consumers polling for state only get a snapshot after a change. """
+        state = StateMachineBase(lambda name, value: None)
+        snapshot = state.snapshot_if_changed(0)
+        self.assertEqual(snapshot.revision, state.revision)
+        self.assertIsNone(state.snapshot_if_changed(snapshot.revision))
+
+        state.machine_pos = {"x": 5}
+        state.feed_rate = 100
+        changed = state.snapshot_if_changed(snapshot.revision)
+        self.assertGreater(changed.revision, snapshot.revision)
+        self.assertEqual(changed["machine_pos"]["x"], 5)
+        self.assertEqual(changed["feed_rate"], 100)
+        self.assertEqual(snapshot["machine_pos"]["x"], 0)
+        self.assertIs(state.snapshot(), changed)
+
+        # Revisions are unique across state machines.
+        other = StateMachineBase(lambda name, value: None)
+        self.assertIsNotNone(other.snapshot_if_changed(changed.revision))
+
+
+class RacingInbox(Inbox):
+    """ Pushes `racing` items, as another thread might, the moment the
+    consumer next checks for overflow. """
+
+    racing: list = []
+
+    @property  # type: ignore
+    def _overflow(self):
+        racing, self.racing = self.racing, []
+        for item in racing:
+            self.push(item)
+        return self._overflow_items
+
+    @_overflow.setter
+    def _overflow(self, value):
+        self._overflow_items = value
+
+
+class TestInbox(unittest.TestCase):
+    """ Passing data between threads. """
+
+    def test_order(self):
+        """ Items come out in the order they went in. """
+        inbox = Inbox(4)
+        for item in range(3):
+            inbox.push(item)
+        self.assertEqual(inbox.drain(), [0, 1, 2])
+        for item in range(3, 6):
+            inbox.push(item)
+        self.assertEqual(len(inbox), 3)
+        self.assertEqual(inbox.drain(), [3, 4, 5])
+        self.assertEqual(inbox.drain(), [])
+
+    def test_overflow(self):
+        """ Nothing is lost when the ring fills up. """
+        inbox = Inbox(4)
+        for item in range(10):
+            inbox.push(item)
+        self.assertEqual(len(inbox), 10)
+        self.assertEqual(inbox.drain(), list(range(10)))
+
+        # Ring is used again once the overflow has been drained.
+        inbox.push(10)
+        self.assertFalse(inbox._overflow)
+        self.assertEqual(inbox.drain(), [10])
+
+    def test_multiple_producers(self):
+        """ Many threads pushing at once. """
+        inbox = Inbox(16)
+        def producer(start):
+            for item in range(start, start + 1000):
+                inbox.push(item)
+
+        threads = [threading.Thread(target=producer, args=(start,))
+                   for start in range(0, 4000, 1000)]
+        received = []
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            received += inbox.drain()
+        for thread in threads:
+            thread.join()
+        received += inbox.drain()
+
+        self.assertEqual(sorted(received), list(range(4000)))
+        # Each producer's items arrive in order.
+        for start in range(0, 4000, 1000):
+            from_producer = [item for item in received if start <= item < start + 1000]
+            self.assertEqual(from_producer, list(range(start, start + 1000)))
+
+    def test_overflow_race(self):
+        """ A producer refills the ring and overflows after the consumer has
+        drained the ring but before it takes the overflow. """
+        inbox = RacingInbox(2)
+        inbox.push(0)
+        inbox.push(1)
+        inbox.racing = [2, 3, 4]
+        self.assertEqual(inbox.drain(), [0, 1, 2, 3, 4])
+        self.assertEqual(len(inbox), 0)
+
+    def test_overflow_order(self):
+        """ Order is kept when a producer refills the ring and overflows while
+        the consumer is draining. """
+        inbox = Inbox(2)
+        count = 20000
+
+        def producer():
+            for item in range(count):
+                inbox.push(item)
+
+        # Switch threads as often as possible to interleave push and drain.
+        switch_interval = sys.getswitchinterval()
+        self.addCleanup(sys.setswitchinterval, switch_interval)
+        sys.setswitchinterval(1e-6)
+
+        thread = threading.Thread(target=producer)
+        received = []
+        thread.start()
+        while thread.is_alive():
+            received += inbox.drain()
+        thread.join()
+        received += inbox.drain()
+
+        self.assertEqual(received, list(range(count)))
+
+
+class TestPluginManifest(unittest.TestCase):
+    """ Finding plugins without importing them. """
+
+    def test_read_manifest(self):
+        """ Plugin classes and their simple attributes are read from source. """
+        filename = os.path.join(loader.TESTDIR, "..", "terminals", "cli.py")
+        manifest = core.common.read_manifest(filename)
+
+        self.assertEqual(list(manifest), ["Cli"])
+        self.assertIs(manifest["Cli"]["is_valid_plugin"], True)
+        self.assertIs(manifest["Cli"]["active_by_default"], False)
+
+    def test_discover_plugins_cache(self):
+        """ Discovered plugins are cached until a source file changes. """
+        with tempfile.TemporaryDirectory() as plugin_dir:
+            with open(os.path.join(plugin_dir, "_base.py"), "w") as base_file:
+                base_file.write("class _Base:\n    plugin_type = 'test'\n")
+            plugin_filename = os.path.join(plugin_dir, "plugin.py")
+            with open(plugin_filename, "w") as plugin_file:
+                plugin_file.write("class Plugin(_Base):\n    is_valid_plugin = True\n")
+
+            plugins = core.common.discover_plugins(plugin_dir)
+            self.assertEqual(plugins, {"plugin": {"Plugin": {"is_valid_plugin": True,
+                                                             "plugin_type": "test"}}})
+            self.assertTrue(os.path.exists(
+                os.path.join(plugin_dir, "__pycache__", core.common.PLUGIN_CACHE)))
+
+            # Cached result is used while the files are unchanged.
+            original_read_classes = core.common.read_classes
+            self.addCleanup(setattr, core.common, "read_classes", original_read_classes)
+            core.common.read_classes = None
+            self.assertEqual(core.common.discover_plugins(plugin_dir), plugins)
+
+            # Modifying a file invalidates the cache.
+            core.common.read_classes = original_read_classes
+            with open(plugin_filename, "a") as plugin_file:
+                plugin_file.write("    active_by_default = False\n")
+            plugins = core.common.discover_plugins(plugin_dir)
+            self.assertIs(plugins["plugin"]["Plugin"]["active_by_default"], False)
+
+    def test_plugin_spec(self):
+        """ Plugin module is only imported when needed. """
+        original_module = sys.modules.pop("controllers.mock_controller")
+        self.addCleanup(sys.modules.__setitem__, "controllers.mock_controller", original_module)
+        spec = core.common.PluginSpec("controllers.mock_controller",
+                                      "MockController",
+                                      "controllers",
+                                      {"is_valid_plugin": True})
+
+        self.assertEqual(spec.get_classname(), "MockController")
+        self.assertTrue(spec.is_valid_plugin)
+        self.assertNotIn("controllers.mock_controller", sys.modules)
+
+        instance = spec("spec_test")
+        self.assertIn("controllers.mock_controller", sys.modules)
+        self.assertEqual(instance.get_classname(), "MockController")
+        self.assertEqual(instance.label, "spec_test")
+        # Attributes not in the manifest come from the class.
+        self.assertEqual(spec.plugin_type, "controllers")
+        self.assertEqual(spec.SUPPORTED_GCODE, MockController.SUPPORTED_GCODE)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -9,7 +9,8 @@ from pygcode import Block, Line
 import unittest
 import loader  # pylint: disable=E0401,W0611
 from definitions import ConnectionState
-from controllers.debug import DebugController
+from core.clock import VirtualClock
+from controllers.debug import DebugController, PUSH_DELAY, DEBUG_OUTPUT_LINES
 
 
 class MockTime:
@@ -115,6 +116,53 @@ class TestControllerSendData(unittest.TestCase):
         self.assertEqual(self.controller.state.machine_pos,
                          {"x": 10, "y": 20, "z": 0, "a": 0, "b": 0})
 
+    def test_commands_held_until_ready(self) -> None:
+        """ Commands that arrive within PUSH_DELAY of the last are processed
+        once the controller is ready rather than dropped. """
+        clock = VirtualClock()
+        self.controller._time = clock
+
+        for line in ("G0 X10", "G0 Y20"):
+            self.controller._delivered.append(("command:gcode", Line(line).block))
+            self.controller.early_update()
+            self.controller.update()
+            self.controller._delivered.clear()
+            clock.advance(0.5)
+
+        self.assertEqual(len(self.controller.log), 1)
+        self.assertFalse(self.controller.ready_for_data)
+        self.assertFalse(self.controller.dirty)
+
+        clock.advance(PUSH_DELAY)
+        self.controller.early_update()
+        self.assertTrue(self.controller.dirty)
+        self.controller.update()
+
+        self.assertEqual(len(self.controller.log), 2)
+        self.assertEqual(self.controller.state.machine_pos,
+                         {"x": 10, "y": 20, "z": 0, "a": 0, "b": 0})
+        self.assertFalse(self.controller.dirty)
+
+    def test_debug_output_bounded(self) -> None:
+        """ Only the most recent lines are published for display. """
+        self.controller._event_queue.clear()
+
+        for count in range(DEBUG_OUTPUT_LINES + 10):
+            fake_event = ("command:gcode", Line("G0 X%s" % count).block)
+            self.controller._delivered.append(fake_event)
+            self.controller.update()
+            self.controller._delivered.clear()
+
+        published = [value for event, value in self.controller._event_queue
+                     if event == "debug:gcode"]
+        self.controller._event_queue.clear()
+
+        self.assertEqual(len(published), DEBUG_OUTPUT_LINES + 10)
+        lines = published[-1].splitlines()
+        self.assertEqual(len(lines), DEBUG_OUTPUT_LINES)
+        self.assertIn("X10", lines[0])
+        self.assertIn("X%s" % (DEBUG_OUTPUT_LINES + 9), lines[-1])
+
     def test_incoming_gcode_g92(self) -> None:
         """ Local G92 implementation.
         G92: GCodeCoordSystemOffset is not handled by pygcode's VM so we manually
@@ -4,19 +4,31 @@
 
 #pylint: disable=protected-access
 
+import asyncio
+import os
+import tempfile
+import time
 import unittest
 import loader  # pylint: disable=E0401,W0611
+from pygcode import Line
 from definitions import ConnectionState
-from controllers.grbl_1_1 import Grbl1p1Controller, RX_BUFFER_SIZE, REPORT_INTERVAL
+from controllers.grbl_1_1 import Grbl1p1Controller, RX_BUFFER_SIZE, REPORT_INTERVAL, \
+        SETTINGS_CACHE_MAX_AGE, clear_queue, read_settings_cache
+from controllers.state_machine import StateMachineGrbl
 
 
 class MockSerial:
     """ Mock version of serial port. """
 
+    is_open = True
+
     def __init__(self):
         self.dummy_data = []
         self.written_data = []
 
+    def flush(self):
+        """ Mock version of method. """
+
     def readline(self):  # pylint: disable=C0103
         """ Do nothing or return specified value for method. """
         if self.dummy_data:
@@ -77,6 +89,49 @@ class TestControllerReceiveDataFromSerial(unittest.TestCase):
         self.assertEqual(self.controller._received_data.get(), b"test")
         self.assertEqual(self.controller._received_data.get(), b"test2")
 
+    def test_basic_async(self):
+        """ Serial port I/O as an asyncio task rather than a thread. """
+        async def run_io():
+            self.controller._io_wakeup_async = asyncio.Event()
+            await self.controller._periodic_io_async()
+
+        self.controller._serial.dummy_data = [b"test\r\n", b"test2\r\n"]
+        asyncio.run(run_io())
+        self.assertEqual(self.controller._received_data.qsize(), 2)
+
+        self.assertEqual(self.controller._received_data.get(), b"test")
+        self.assertEqual(self.controller._received_data.get(), b"test2")
+
+    def test_wake_while_draining(self):
+        """ A wake up that arrives while the queues are being drained is not
+        lost so the serial port thread goes straight round again. """
+        class WakeDuringIteration(Grbl1p1Controller):
+            """ Wakes itself from within the first I/O iteration. """
+            def __init__(self):
+                super().__init__()
+                self.woken_at_start = []
+
+            def _io_iteration(self):
+                self.woken_at_start.append(self._io_wakeup.is_set())
+                if len(self.woken_at_start) == 1:
+                    # eg: A realtime command published by the main thread.
+                    self._wake_io()
+                    return False
+                self.connection_status = ConnectionState.NOT_CONNECTED
+                return True
+
+        controller = WakeDuringIteration()
+        controller.connection_status = ConnectionState.CONNECTED
+        # Left over from before the thread started. Already acted upon.
+        controller._wake_io()
+
+        # Would block for SERIAL_INTERVAL if the wake up was lost.
+        controller._io_wakeup.wait = lambda timeout: \
+                self.assertTrue(controller._io_wakeup.is_set())
+        controller._periodic_io()
+
+        self.assertEqual(controller.woken_at_start, [False, False])
+
     def test_two_in_one(self):
         """ 2 input lines are received in a single cycle. """
         self.controller._serial.dummy_data = [b"test\r\ntest2\r\n", b"test3\r\n"]
@@ -240,6 +295,71 @@ class TestControllerSendDataToSerial(unittest.TestCase):
         self.assertEqual(self.controller._serial.written_data[-1], "test command 2")
         self.assertEqual(len(self.controller._serial.written_data), 2)
 
+    def test_realtime_first(self):
+        """ Safety critical commands are written ahead of anything else and the
+        time taken to send them recorded. """
+        self.controller._command_immediate.put(b"?")
+        self.controller._command_streaming.put(b"G0 X0 Y0 F10")
+        self.controller.connection_status = ConnectionState.CONNECTED
+        self.controller.active = True
+        self.controller.receive_priority("command:feed_hold", None, time.perf_counter())
+        self.controller._serial.written_data = []
+
+        self.controller._periodic_io()
+
+        self.assertEqual(self.controller._serial.written_data[0], b"!")
+        self.assertEqual(self.controller._serial.written_data[1], b"?")
+        self.assertEqual(len(self.controller.realtime_latency), 1)
+        self.assertGreaterEqual(self.controller.realtime_latency[0], 0)
+
+    def test_realtime_inactive(self):
+        """ Only the active controller acts on priority commands. """
+        self.controller.connection_status = ConnectionState.CONNECTED
+        self.controller.active = False
+        self.controller.receive_priority("command:feed_hold", None, time.perf_counter())
+
+        self.assertTrue(self.controller._command_realtime.empty())
+
+    def test_soft_reset(self):
+        """ Grbl discards it's buffers on soft reset so we should too. """
+        self.controller.connection_status = ConnectionState.CONNECTED
+        self.controller.active = True
+        self.controller.running_gcode = True
+        self.controller._send_buf_lens.append(10)
+        self.controller._send_buf_actns.append((b"G0 X10", None))
+        self.controller.receive_priority("command:soft_reset", None, time.perf_counter())
+
+        self.controller._write_realtime()
+
+        self.assertEqual(self.controller._serial.written_data[0], b"\x18")
+        self.assertFalse(self.controller.running_gcode)
+        self.assertEqual(len(self.controller._send_buf_lens), 0)
+        self.assertEqual(len(self.controller._send_buf_actns), 0)
+
+    def test_soft_reset_discards_commands(self):
+        """ Nothing queued before a soft reset is written after it. """
+        self.controller.active = True
+        self.controller.ready_for_data = True
+        # Requests queued by activating the controller.
+        clear_queue(self.controller._command_streaming)
+        for line in ("G0 X10", "G0 X20", "G0 X30"):
+            self.controller._delivered.append(("command:gcode", Line(line).block))
+        self.controller.update()
+        self.controller._delivered.clear()
+        self.controller._command_immediate.put(b"!")
+        self.assertFalse(self.controller._command_streaming.empty())
+
+        # Published before the reset but delivered along with it.
+        self.controller._delivered.append(("command:gcode", Line("G0 X40").block))
+        self.controller.receive_priority("command:soft_reset", None, time.perf_counter())
+        self.controller.update()
+        self.controller._delivered.clear()
+        for _ in range(5):
+            self.controller._io_iteration()
+
+        self.assertEqual(self.controller._serial.written_data, [b"\x18"])
+        self.assertEqual(len(self.controller._pending_commands), 0)
+
     def test_streaming_mode_fail(self):
         """ Controller may not be in both running_gcode and running_jog mode at
         the same time. """
@@ -515,5 +635,375 @@ class TestControllerSendDataToSerial(unittest.TestCase):
         self.assertEqual(len(self.controller._serial.written_data), 2)
         self.assertEqual(sum(self.controller._send_buf_lens), 4)
 
+
+class TestStatusReport(unittest.TestCase):
+    """ Publishing state parsed from Grbl status reports. """
+
+    def setUp(self):
+        self.published = []
+        self.deltas = []
+        self.state = StateMachineGrbl(lambda name, value: self.published.append(name))
+        self.state.parse_incoming(b"<Idle|MPos:1.000,2.000,3.000|FS:0,0>")
+        self.published.clear()
+
+    def test_changed_axes_only(self):
+        """ Only the axes that changed are published. """
+        self.state.parse_incoming(b"<Idle|MPos:1.000,2.000,4.000|FS:0,0>")
+
+        self.assertEqual(self.published,
+                         ["machine_pos:z", "machine_pos", "work_pos:z", "work_pos"])
+
+    def test_state_delta(self):
+        """ One StateDelta per status report when enabled. """
+        self.state.on_delta_callback = self.deltas.append
+        self.state.parse_incoming(b"<Idle|MPos:1.000,2.000,4.000|FS:500,0>")
+        self.state.parse_incoming(b"<Idle|MPos:1.000,2.000,4.000|FS:500,0>")
+
+        self.assertEqual(len(self.deltas), 1)
+        self.assertEqual(set(self.deltas[0]), {"machine_pos", "work_pos", "feed_rate"})
+        self.assertEqual(self.deltas[0]["machine_pos"]["z"], 4.0)
+        self.assertEqual(self.deltas[0]["feed_rate"], 500)
+
+    def test_work_offset(self):
+        """ Work position is derived from machine position and work offset. """
+        self.state.parse_incoming(b"<Idle|MPos:1.000,2.000,3.000|FS:0,0|WCO:0.500,0.000,1.000>")
+
+        self.assertEqual(self.published,
+                         ["work_offset:x", "work_offset:z", "work_offset",
+                          "work_pos:x", "work_pos:z", "work_pos"])
+        self.assertEqual(self.state.work_pos, {"x": 0.5, "y": 2, "z": 2, "a": 0, "b": 0})
+
+        self.state.parse_incoming(b"<Idle|WPos:0.000,0.000,0.000|FS:0,0>")
+        self.assertEqual(self.state.machine_pos, {"x": 0.5, "y": 0, "z": 1, "a": 0, "b": 0})
+
+    def test_immutable(self):
+        """ Published values don't change when later reports arrive. """
+        received = {}
+        state = StateMachineGrbl(received.__setitem__)
+        state.parse_incoming(b"[GC:G0 G54 G17 G21 G90 G94 M5 M9 T0 F0 S0]")
+        state.parse_incoming(b"<Hold:0|MPos:0.000,0.000,0.000|FS:0,0>")
+        modal = received["gcode_modal"]
+
+        state.parse_incoming(b"[GC:G1 G55 G17 G21 G91 G94 M5 M9 T0 F0 S0]")
+        state.parse_incoming(b"<Idle|MPos:0.000,0.000,0.000|FS:0,0>")
+
+        self.assertEqual(modal[b"motion"], b"G0")
+        self.assertEqual(modal[b"distance"], b"G90")
+        self.assertEqual(received["gcode_modal"][b"motion"], b"G1")
+        self.assertIsNot(received["gcode_modal"], modal)
+        with self.assertRaises(TypeError):
+            modal[b"motion"] = b"G2"
+        with self.assertRaises(AttributeError):
+            received["pause_reason"].clear()
+
+    def test_status_fast_path(self):
+        """ The single pass status parser publishes the same as parsing field
+        by field and falls back to it for reports it does not recognise. """
+        reports = [
+            b"<Idle|MPos:0.000,0.000,0.000|FS:0,0|WCO:1.000,2.000,0.000>",
+            b"<Run|MPos:5.000,2.500,-1.000|Bf:15,128|FS:500,8000|Ov:100,100,100>",
+            b"<Hold:0|WPos:5.000,0.500,-1.000|Bf:15,128|Ln:12|F:250|Ov:50,100,120>",
+            b"<Run|MPos:5.000,2.500,-1.000,90.000|FS:500,8000>",
+            b"<Alarm|MPos:6.000,2.500,-1.000|FS:0,0|Pn:X|Ov:100,100,100>",
+            ]
+        fast = []
+        fields = []
+        fast_state = StateMachineGrbl(lambda name, value: fast.append((name, value)))
+        fields_state = StateMachineGrbl(lambda name, value: fields.append((name, value)))
+        for report in reports:
+            fast_state.parse_incoming(report)
+            fields_state._parse_status_fields(report)
+
+        self.assertEqual(fast, fields)
+        self.assertEqual(fast_state.machine_state, b"Alarm")
+        self.assertEqual(fast_state.feed_override, 100)
+        self.assertIsNotNone(StateMachineGrbl.STATUS_REPORT.fullmatch(reports[2]))
+        self.assertIsNone(StateMachineGrbl.STATUS_REPORT.fullmatch(reports[4]))
+
+        # Unchanged coordinates are skipped unless changed some other way since.
+        fast.clear()
+        fast_state.parse_incoming(reports[0])
+        fast_state.parse_incoming(reports[0])
+        published = len(fast)
+        fast_state.parse_incoming(reports[0])
+        self.assertEqual(len(fast), published)
+        fast_state.machine_pos = {"x": 9}
+        fast_state.parse_incoming(reports[0])
+        self.assertEqual(fast_state.machine_pos["x"], 0)
+        self.assertEqual(fast_state.work_pos["x"], -1)
+
+    def test_six_axes(self):
+        """ Machines with more axes than the default. """
+        state = StateMachineGrbl(lambda name, value: self.published.append(name), axes="xyzabc")
+        self.published.clear()
+        state.parse_incoming(b"<Idle|MPos:1.000,2.000,3.000,4.000,5.000,6.000|FS:0,0>")
+
+        self.assertEqual(state.machine_pos.axes, ("x", "y", "z", "a", "b", "c"))
+        self.assertEqual(state.machine_pos["c"], 6.0)
+        self.assertIn("machine_pos:c", self.published)
+
+        # Too many coordinates for the configured axes.
+        with self.assertRaises(AssertionError):
+            self.state.parse_incoming(
+                b"<Idle|MPos:1.000,2.000,3.000,4.000,5.000,6.000|FS:0,0>")
+
+
+class TestSettings(unittest.TestCase):
+    """ Grbl "$$" settings reports. """
+
+    REPORT = [b"$0=10", b"$1=25", b"$2=0", b"$10=1", b"$11=0.010", b"$13=0",
+              b"$20=1", b"$22=1", b"$24=25.000", b"$32=0",
+              b"$100=250.000", b"$101=250.000", b"$102=250.000",
+              b"$110=500.000", b"$111=500.000", b"$112=500.000",
+              b"$120=10.000", b"$121=10.000", b"$122=10.000",
+              b"$130=200.000", b"$131=300.000", b"$132=50.000", b"$200=1"]
+
+    def setUp(self):
+        self.controller = Grbl1p1Controller()
+        self.published = []
+        self.controller.publish = \
+                lambda name, value, **_: self.published.append((name, value))
+        self.controller.connection_status = ConnectionState.CONNECTED
+
+    def test_report(self):
+        """ A whole report is applied and published as one event once Grbl
+        acknowledges the "$$" command. """
+        self.controller._send_buf_lens.append(3)
+        self.controller._send_buf_actns.append((b"$$", b"$$"))
+        for line in self.REPORT:
+            self.controller.parse_incoming(line + b"\r\n")
+        self.controller.early_update()
+        self.assertNotIn("grbl1.1:settings", dict(self.published))
+
+        self.controller.parse_incoming(b"ok\r\n")
+        self.controller.early_update()
+
+        settings = [value for name, value in self.published if name == "grbl1.1:settings"]
+        self.assertEqual(len(settings), 1)
+        self.assertEqual(settings[0]["step_pulse"], 10)
+        self.assertIs(settings[0]["soft_limits"], True)
+        self.assertEqual(settings[0]["steps_per_mm:y"], 250.0)
+        self.assertEqual(settings[0]["$200"], "1")
+        self.assertIs(self.controller.state.settings, settings[0])
+
+        state = self.controller.state
+        self.assertEqual(state.machine_pos_max, {"x": 200, "y": 300, "z": 50, "a": 0, "b": 0})
+        self.assertEqual(state.feed_rate_max["z"], 500)
+        self.assertEqual(state.feed_rate_accel["x"], 10)
+
+
+class TestSettingsCache(unittest.TestCase):
+    """ Grbl settings cached on disk for each machine. """
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.filename = os.path.join(temp_dir.name, "grbl_settings.json")
+
+    def identify(self) -> Grbl1p1Controller:
+        """ A connected, idle controller that has just received "$I". """
+        controller = Grbl1p1Controller(_time=MockTime())
+        controller.publish = lambda *_, **__: None
+        controller.settings_cache = self.filename
+        controller.connection_status = ConnectionState.CONNECTED
+        controller.desired_connection_status = ConnectionState.CONNECTED
+        controller.first_receive = False
+        controller.state.machine_state = b"Idle"
+
+        controller._send_buf_lens.append(3)
+        controller._send_buf_actns.append((b"$I", b"$I"))
+        for line in (b"[VER:1.1h.20190825:]", b"[OPT:V,15,128]", b"ok"):
+            controller.parse_incoming(line + b"\r\n")
+        controller.early_update()
+        return controller
+
+    def requested(self, controller: Grbl1p1Controller) -> list:
+        """ Commands queued for Grbl. """
+        commands = []
+        while not controller._command_streaming.empty():
+            commands.append(controller._command_streaming.get())
+        return commands
+
+    def test_cache(self):
+        """ "$$" is only sent when the machine's settings are not cached or stale. """
+        controller = self.identify()
+        self.assertEqual(self.requested(controller), [b"$$"])
+
+        controller._send_buf_lens.append(3)
+        controller._send_buf_actns.append((b"$$", b"$$"))
+        for line in TestSettings.REPORT + [b"ok"]:
+            controller.parse_incoming(line + b"\r\n")
+        controller.early_update()
+        self.assertTrue(os.path.exists(self.filename))
+
+        # Another session with the same machine.
+        controller = self.identify()
+        self.assertEqual(self.requested(controller), [])
+        self.assertEqual(controller.state.machine_pos_max["y"], 300)
+        self.assertEqual(controller.state.settings["homing_feed"], 25.0)
+
+        # Stale.
+        saved_at = read_settings_cache(self.filename)[controller.state.identity]["saved_at"]
+        controller._wall_time = lambda: saved_at + SETTINGS_CACHE_MAX_AGE + 1
+        controller._on_identified()
+        controller.early_update()
+        self.assertEqual(self.requested(controller), [b"$$"])
+
+        # Changing a setting invalidates the cache.
+        controller._send_buf_lens.append(9)
+        controller._send_buf_actns.append((b"$110=400", b"$110=400"))
+        controller.parse_incoming(b"ok\r\n")
+        controller.early_update()
+        self.assertEqual(self.requested(controller), [b"$$"])
+        self.assertEqual(read_settings_cache(self.filename), {})
+
+
+    def test_cache_age_wall_clock(self):
+        """ The cache age uses wall clock time, not the component's clock which
+        may be simulated. """
+        controller = self.identify()
+        controller._send_buf_lens.append(3)
+        controller._send_buf_actns.append((b"$$", b"$$"))
+        for line in TestSettings.REPORT + [b"ok"]:
+            controller.parse_incoming(line + b"\r\n")
+        controller.early_update()
+        saved_at = read_settings_cache(self.filename)[controller.state.identity]["saved_at"]
+        self.assertAlmostEqual(saved_at, time.time(), delta=60)
+
+        # A simulated clock far from the wall clock does not make it stale.
+        controller = self.identify()
+        controller._time.return_values = [saved_at + SETTINGS_CACHE_MAX_AGE + 1] * 10
+        controller._on_identified()
+        controller.early_update()
+        self.assertEqual(self.requested(controller), [])
+
+    def test_queries_do_not_stall(self):
+        """ "$I" and "$#" only read so do not block streaming. Writes do. """
+        controller = Grbl1p1Controller(_time=MockTime())
+        self.assertFalse(controller._complete_before_continue(b"$I"))
+        self.assertFalse(controller._complete_before_continue(b"$#"))
+        self.assertTrue(controller._complete_before_continue(b"$I=machine"))
+        self.assertTrue(controller._complete_before_continue(b"$$"))
+
+
+class TestReconnect(unittest.TestCase):
+    """ Reconnecting to Grbl without a soft reset. """
+
+    def setUp(self):
+        self.controller = Grbl1p1Controller(_time=MockTime())
+        self.controller.settings_cache = None
+        self.controller._serial = MockSerial()
+        self.controller.connection_status = ConnectionState.CONNECTING
+        self.controller.desired_connection_status = ConnectionState.CONNECTED
+        self.feedback = []
+        self.controller.publish = lambda name, value, **_: \
+                self.feedback.append(value) if name == "user_feedback:command_state" else None
+
+    def connect(self) -> list:
+        """ Call `on_connected()` as the AsyncCoordinator would. The I/O task
+        is cancelled before it runs so the test can play Grbl's part.
+        Returns:
+            Realtime commands queued for Grbl. """
+        async def connect():
+            self.controller.on_connected()
+            self.controller._serial_task.cancel()
+        asyncio.run(connect())
+
+        commands = []
+        while not self.controller._command_immediate.empty():
+            commands.append(self.controller._command_immediate.get())
+        return commands
+
+    def reply(self, *lines: bytes) -> None:
+        """ Answer each command Grbl has been sent from the streaming queue. """
+        replies = iter(lines)
+        while not self.controller._command_streaming.empty():
+            command = self.controller._command_streaming.get()
+            self.controller._send_buf_lens.append(len(command) + 1)
+            self.controller._send_buf_actns.append((command, command))
+            for line in next(replies):
+                self.controller.parse_incoming(line + b"\r\n")
+            self.controller.parse_incoming(b"ok\r\n")
+        self.controller.early_update()
+
+    def session(self, offset: bytes) -> None:
+        """ Grbl's replies to the commands sent after connecting. """
+        self.controller.parse_incoming(b"<Idle|MPos:1.000,2.000,3.000|FS:0,0>\r\n")
+        self.reply([b"[GC:G0 G54 G17 G21 G90 G94 M5 M9 T0 F0 S0]"],
+                   [b"[G54:%s,0.000,0.000]" % offset, b"[G92:0.000,0.000,0.000]",
+                    b"[TLO:0.000]", b"[PRB:0.000,0.000,0.000:0]"],
+                   [b"[VER:1.1h.20190825:]", b"[OPT:V,15,128]"])
+        # Settings are not cached so "$$" is queued. Not needed here.
+        while not self.controller._command_streaming.empty():
+            self.controller._command_streaming.get()
+
+    def test_first_connection(self):
+        """ State is unknown so Grbl is reset. """
+        self.assertEqual(self.connect(), [b"\x18"])
+        self.session(b"0.000")
+        self.assertEqual(self.controller.state.identity, "VER:1.1h.20190825:|OPT:V,15,128")
+        self.assertEqual(self.feedback, [])
+
+    def test_resume(self):
+        """ Grbl is probed rather than reset and differences reported. """
+        self.connect()
+        self.session(b"0.000")
+
+        self.assertEqual(self.connect(), [b"?"])
+        self.session(b"0.000")
+        self.assertEqual(self.controller.state.offsets["G54"]["x"], 0)
+        self.assertEqual(self.feedback, ["Reconnected without reset.\n"])
+
+        self.connect()
+        self.session(b"5.000")
+        self.assertEqual(self.controller.state.offsets["G54"]["x"], 5)
+        self.assertEqual(self.controller.state.offsets["TLO"], 0)
+        self.assertEqual(self.feedback[-1],
+                         "Reconnected without reset. Changed while disconnected: offsets\n")
+
+    def test_resume_in_flight(self):
+        """ Lines sent before the reconnect are still acknowledged after it.
+        Nothing more is streamed until Grbl reports Idle. """
+        self.connect()
+        self.session(b"0.000")
+        self.controller._command_streaming.put(b"G1 X10 F100")
+        self.controller._command_streaming.put(b"G1 X20")
+        self.controller._write_streaming()
+        self.controller._write_streaming()
+        self.assertEqual(len(self.controller._send_buf_lens), 2)
+
+        self.assertEqual(self.connect(), [b"?"])
+        self.controller._serial.written_data = []
+        ok_count = self.controller._ok_count
+        self.controller._command_streaming.put(b"G1 X30")
+        self.controller.parse_incoming(b"<Run|MPos:5.000,2.000,3.000|FS:100,0>\r\n")
+
+        # Grbl acknowledges the lines sent before the reconnect.
+        self.assertFalse(self.controller._write_streaming())
+        self.controller.parse_incoming(b"ok\r\n")
+        self.assertFalse(self.controller._write_streaming())
+        self.controller.parse_incoming(b"ok\r\n")
+        self.assertFalse(self.controller._write_streaming())
+        self.assertEqual(self.controller._ok_count, ok_count + 2)
+        self.assertEqual(len(self.controller._send_buf_lens), 0)
+        # A late "ok" for a line whose acknowledgement was lost.
+        self.controller.parse_incoming(b"ok\r\n")
+        self.assertEqual(self.controller._serial.written_data, [])
+
+        # Grbl has finished. Streaming starts again from an empty buffer.
+        self.controller.parse_incoming(b"<Idle|MPos:20.000,2.000,3.000|FS:0,0>\r\n")
+        self.assertTrue(self.controller._write_streaming())
+        self.assertEqual(self.controller._serial.written_data, [b"G1X30\n"])
+        self.assertEqual(list(self.controller._send_buf_lens), [6])
+        self.assertEqual(self.controller._send_buf_actns[0][0], b"G1 X30")
+
+    def test_resume_disabled(self):
+        """ Grbl is always reset if resuming is disabled. """
+        self.connect()
+        self.session(b"0.000")
+        self.controller.resume_on_reconnect = False
+        self.assertEqual(self.connect(), [b"\x18"])
+
+
 if __name__ == "__main__":
     unittest.main()
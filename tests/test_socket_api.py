@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+""" Testing the socket API terminal plugin. """
+
+#pylint: disable=protected-access
+
+import json
+import os
+import socket
+import stat
+import tempfile
+import time
+import unittest
+import loader  # pylint: disable=E0401,W0611
+from core.coordinator import Coordinator
+from definitions import ConnectionState
+from controllers.mock_controller import MockController
+from terminals import socket_api
+from terminals.socket_api import SocketApi
+
+
+class TestSocketApi(unittest.TestCase):
+    """ Controlling components over the socket API. """
+
+    def setUp(self):
+        def coordinator_load_config(instance: Coordinator, filename: str) -> None:
+            """ Override Coordinator._load_config for test. """
+            instance.config = {'controllers': {'mockController': {'type': 'MockController'}}}
+
+        Coordinator._load_config = coordinator_load_config
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_api = SocketApi()
+        self.socket_api.socket_path = os.path.join(self.temp_dir.name, "test.sock")
+        self.coordinator = Coordinator([self.socket_api], [], [MockController])
+        self.mock_controller = self.coordinator.controllers["mockController"]
+        self.coordinator.update_components()
+
+        self.client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.client.connect(self.socket_api.socket_path)
+        self.client.settimeout(1)
+
+    def tearDown(self):
+        self.client.close()
+        self.coordinator.close()
+        self.temp_dir.cleanup()
+        self.assertFalse(os.path.exists(self.socket_api.socket_path))
+
+    def _request(self, **request):
+        """ Send a request and wait for the main loop to act on it. """
+        self.client.sendall(json.dumps(request).encode() + b"\n")
+        timeout = time.time() + 1
+        while not len(self.socket_api._inbox) and time.time() < timeout:
+            time.sleep(0.001)
+        self.coordinator.update_components()
+
+    def _receive(self):
+        """ Read one message from the socket. """
+        line = b""
+        while not line.endswith(b"\n"):
+            line += self.client.recv(1)
+        return json.loads(line)
+
+    def test_publish(self):
+        """ Clients can publish events to components. """
+        self._request(publish="mockController:connect")
+        self.coordinator.update_components()
+
+        self.assertIs(self.mock_controller.desired_connection_status,
+                      ConnectionState.CONNECTED)
+
+    def test_subscribe(self):
+        """ Clients receive events they subscribe to. """
+        self._request(subscribe="mockController:connection_status")
+        self.mock_controller.connect()
+        self.coordinator.update_components()
+
+        self.assertEqual(self._receive(),
+                         {"event": "mockController:connection_status", "value": "CONNECTING"})
+
+    def test_bad_request(self):
+        """ Malformed requests are reported to the client. """
+        self._request(nonsense=True)
+
+        self.assertIn("error", self._receive())
+
+    def test_malformed_requests(self):
+        """ Requests with fields of the wrong type are reported to the client
+        rather than raising on the main loop. """
+        for request in ({"subscribe": ["x"]}, {"subscribe": {}}, {"unsubscribe": 5},
+                        {"publish": 5}, {"publish": "no_component"},
+                        {"publish": "mockController:connect", "priority": "yes"}):
+            self._request(**request)
+            self.assertIn("error", self._receive(), request)
+
+        self.assertIsNot(self.mock_controller.desired_connection_status,
+                         ConnectionState.CONNECTED)
+
+    def test_unsubscribe(self):
+        """ Events no client wants are no longer received. """
+        self._request(subscribe="mockController:connection_status")
+        self.assertIn("mockController:connection_status", self.socket_api.event_subscriptions)
+
+        self._request(unsubscribe="mockController:connection_status")
+        self.assertNotIn("mockController:connection_status", self.socket_api.event_subscriptions)
+        self.assertFalse(self.socket_api._client_subscriptions)
+
+        # The socket API's own subscriptions are kept.
+        self._request(subscribe="socket_api:request")
+        self._request(unsubscribe="socket_api:request")
+        self.assertIn("socket_api:request", self.socket_api.event_subscriptions)
+
+    def test_disconnect(self):
+        """ A client's subscriptions are removed when it disconnects. """
+        self._request(subscribe="mockController:connection_status")
+        self.client.close()
+
+        timeout = time.time() + 1
+        while not len(self.socket_api._inbox) and time.time() < timeout:
+            time.sleep(0.001)
+        self.coordinator.update_components()
+
+        self.assertFalse(self.socket_api._clients)
+        self.assertFalse(self.socket_api._client_subscriptions)
+        self.assertNotIn("mockController:connection_status", self.socket_api.event_subscriptions)
+
+    def test_private(self):
+        """ Only the current user may connect. """
+        mode = os.stat(self.socket_api.socket_path).st_mode
+        self.assertTrue(stat.S_ISSOCK(mode))
+        self.assertEqual(stat.S_IMODE(mode), 0o600)
+
+    def test_in_use(self):
+        """ A second server does not take over a socket that is in use. """
+        second = SocketApi()
+        second.socket_path = self.socket_api.socket_path
+        with self.assertRaises(OSError):
+            second.setup({}, {}, {})
+
+        # The first is still serving.
+        self._request(publish="mockController:connect")
+        self.coordinator.update_components()
+        self.assertIs(self.mock_controller.desired_connection_status,
+                      ConnectionState.CONNECTED)
+
+    def test_slow_client(self):
+        """ A client that stops reading doesn't block the main loop and is
+        dropped once too much output is waiting for it. """
+        self._request(subscribe="mockController:label")
+        client_id = next(iter(self.socket_api._clients))
+
+        value = "x" * 1000
+        start = time.time()
+        for _ in range(2 * socket_api.MAX_PENDING_OUTPUT // len(value)):
+            self.socket_api._send(client_id, {"event": "mockController:label",
+                                              "value": value})
+        self.assertLess(time.time() - start, 1)
+
+        timeout = time.time() + 1
+        while client_id in self.socket_api._clients and time.time() < timeout:
+            time.sleep(0.001)
+        self.assertNotIn(client_id, self.socket_api._clients)
+
+
+if __name__ == '__main__':
+    unittest.main()